@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException, Query
+from anyio import from_thread
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from services.matcher import match_control
-from services.summarizer import summarize_controls
-from services.batch import batch_harmonize_from_input
+from services.summarizer import summarize_controls, clear_summary_cache, get_summary_cache_stats, get_packing_stats, \
+    get_structured_output_stats
+from services.llm_client import get_llm_client_stats
+from services.batch import batch_harmonize_from_input, batch_response, iter_batch_harmonize
+from services.harmonization_state import incremental_harmonize
+from services.jobs import get_job_manager
+from services.ingest import IngestError, batch_harmonize_from_file
 from services.config import config
-from services.embedding import get_cache_stats, clear_cache
+from services.embedding import get_cache_stats, clear_cache, get_query_batching_stats
+from services.catalog_index import get_index_stats
+from services.model_registry import get_registry_stats
 from services.framework_recommender import generate_framework_recommendation
+import io
+import json
 import time
 
 router = APIRouter()
@@ -15,6 +27,9 @@ router = APIRouter()
 class ControlInput(BaseModel):
     description: str
     top_n: int = 3
+    exact_search: Optional[bool] = None  # bypass the approximate nearest-neighbour backend
+    frameworks: Optional[List[str]] = None  # e.g. ["ISO 27001", "PCI DSS"]; default: all frameworks
+    control_id_prefix: Optional[str] = None  # e.g. "AC-" to match only access control family
 
 # Request model for batch control input
 class ControlObject(BaseModel):
@@ -28,6 +43,14 @@ class BatchHarmonizeRequest(BaseModel):
     controls: List[ControlObject]
     fast_mode: Optional[bool] = None
     org_context: Optional[dict] = None
+    persist_state: Optional[bool] = False  # save clusters so controls can be added incrementally
+
+# Request model for adding controls to a persisted harmonization state
+class IncrementalHarmonizeRequest(BaseModel):
+    state_id: str
+    controls: List[ControlObject]
+    fast_mode: Optional[bool] = None
+    org_context: Optional[dict] = None  # defaults to the context stored with the state
 
 # Request model for framework recommendations
 class OrganizationData(BaseModel):
@@ -59,7 +82,10 @@ class OrganizationData(BaseModel):
 def harmonize_control(input_data: ControlInput):
     start_time = time.time()
     try:
-        similar_controls = match_control(input_data.description, top_n=input_data.top_n)
+        similar_controls = match_control(input_data.description, top_n=input_data.top_n,
+                                        exact=input_data.exact_search,
+                                        frameworks=input_data.frameworks,
+                                        control_id_prefix=input_data.control_id_prefix)
         if not similar_controls:
             raise HTTPException(status_code=404, detail="No similar controls found")
 
@@ -74,6 +100,8 @@ def harmonize_control(input_data: ControlInput):
                 "controls_processed": 1
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -86,26 +114,184 @@ def batch_harmonize(request: BatchHarmonizeRequest):
         fast_mode = request.fast_mode if request.fast_mode is not None else config.default_fast_mode
         
         control_dicts = [control.dict() for control in request.controls]
-        result = batch_harmonize_from_input(control_dicts, fast_mode=fast_mode, org_context=request.org_context)
-        
-        processing_time = time.time() - start_time
+        result = batch_harmonize_from_input(control_dicts, fast_mode=fast_mode, org_context=request.org_context,
+                                            persist_state=bool(request.persist_state))
         
-        return {
-            "unified_controls": result["unified_controls"],
-            "total_clusters": result["total_clusters"],
-            "organization_analysis": result["organization_analysis"],
-            "performance": {
-                "processing_time_seconds": round(processing_time, 3),
-                "controls_processed": len(request.controls),
-                "fast_mode": fast_mode,
-                "clusters_generated": result["total_clusters"],
-                "org_context_applied": request.org_context is not None
-            },
-            "org_context": request.org_context
-        }
+        return batch_response(result, len(request.controls), fast_mode, request.org_context, start_time)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class _RequestBodyReader(io.RawIOBase):
+    """Blocking file-like view of an async request body, for parsers running in the threadpool
+
+    Each read waits on the event loop for the next chunk, so the body is parsed as it
+    arrives and is never spooled or held whole.
+    """
+
+    def __init__(self, request: Request):
+        self._chunks = request.stream()
+        self._pending = b""
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    async def _next_chunk(self) -> bytes:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            self._pending = from_thread.run(self._next_chunk)
+            # The body ends with an empty chunk
+            self._done = not self._pending
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+# Endpoint: Batch harmonize a JSONL or CSV upload (raw request body), parsed and embedded as a stream
+@router.post("/batch-harmonize/upload")
+async def batch_harmonize_upload(request: Request,
+                                 format: Optional[str] = Query(None, pattern="^(jsonl|csv)$",
+                                                               description="jsonl or csv; default from Content-Type"),
+                                 fast_mode: Optional[bool] = None,
+                                 persist_state: bool = False,
+                                 strict: bool = Query(False, description="reject the upload on the first invalid row"),
+                                 org_context: Optional[str] = Query(None, description="organization context as JSON")):
+    start_time = time.time()
+    fast_mode = fast_mode if fast_mode is not None else config.default_fast_mode
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    try:
+        context = json.loads(org_context) if org_context else None
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"org_context is not valid JSON: {e}")
+
+    # Parse in the threadpool straight from the request body as it is received
+    try:
+        result = await run_in_threadpool(batch_harmonize_from_file, _RequestBodyReader(request), format, fast_mode,
+                                         context, persist_state, strict)
+    except IngestError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    response = batch_response(result, result["ingestion"]["valid_rows"], fast_mode, context, start_time)
+    response["ingestion"] = result["ingestion"]
+    return response
+
+# Endpoint: Batch harmonize, streaming each unified control as soon as its summary is ready
+@router.post("/batch-harmonize/stream")
+def batch_harmonize_stream(request: BatchHarmonizeRequest,
+                           format: str = Query("ndjson", pattern="^(ndjson|sse)$",
+                                               description="ndjson (one JSON object per line) or sse")):
+    fast_mode = request.fast_mode if request.fast_mode is not None else config.default_fast_mode
+    control_dicts = [control.dict() for control in request.controls]
+
+    def encode(event: dict) -> str:
+        if format == "sse":
+            return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+
+    def events():
+        try:
+            for event in iter_batch_harmonize(control_dicts, fast_mode=fast_mode, org_context=request.org_context,
+                                              persist_state=bool(request.persist_state)):
+                yield encode(event)
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            yield encode({"event": "error", "detail": str(e)})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+# Endpoint: Submit a batch harmonization as a background job
+@router.post("/jobs/batch-harmonize")
+def submit_batch_harmonize_job(request: BatchHarmonizeRequest):
+    try:
+        fast_mode = request.fast_mode if request.fast_mode is not None else config.default_fast_mode
+        return get_job_manager().submit(
+            [control.dict() for control in request.controls],
+            fast_mode=fast_mode,
+            org_context=request.org_context,
+            persist_state=bool(request.persist_state)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint: List recent jobs
+@router.get("/jobs")
+def list_jobs(status: Optional[str] = Query(None, description="queued, running, completed, failed or cancelled"),
+              limit: int = Query(50, ge=1, le=500)):
+    try:
+        return {"jobs": get_job_manager().list(status, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint: Job status and progress
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    try:
+        return get_job_manager().status(job_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint: Result of a completed job (same shape as /batch-harmonize)
+@router.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    try:
+        return get_job_manager().result(job_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint: Cancel a queued or running job
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    try:
+        return get_job_manager().cancel(job_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Endpoint: Add controls to a persisted harmonization state without re-clustering
+@router.post("/incremental-harmonize")
+def incremental_harmonize_controls(request: IncrementalHarmonizeRequest):
+    start_time = time.time()
+    try:
+        fast_mode = request.fast_mode if request.fast_mode is not None else config.default_fast_mode
+        control_dicts = [control.dict() for control in request.controls]
+        result = incremental_harmonize(request.state_id, control_dicts, fast_mode=fast_mode,
+                                       org_context=request.org_context)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    processing_time = time.time() - start_time
+    return {
+        "state_id": result["state_id"],
+        "unified_controls": result["unified_controls"],
+        "changed_unified_control_ids": result["changed_unified_control_ids"],
+        "total_clusters": result["total_clusters"],
+        "organization_analysis": result["organization_analysis"],
+        "performance": {
+            "processing_time_seconds": round(processing_time, 3),
+            "controls_processed": len(request.controls),
+            "fast_mode": fast_mode,
+            "clusters_resummarized": len(result["changed_unified_control_ids"])
+        }
+    }
+
 # Endpoint: Get system configuration and performance stats
 @router.get("/config")
 def get_config():
@@ -115,9 +301,16 @@ def get_config():
         return {
             "configuration": config.to_dict(),
             "cache_stats": cache_stats,
+            "catalog_index": get_index_stats(),
+            "query_batching": get_query_batching_stats(),
+            "summary_cache": get_summary_cache_stats(),
+            "llm_client": get_llm_client_stats(),
+            "prompt_packing": get_packing_stats(),
+            "structured_output": get_structured_output_stats(),
             "system_info": {
-                "embedding_model": "all-MiniLM-L6-v2",
-                "clustering_algorithm": "DBSCAN"
+                "embedding_model": config.embedding_model,
+                "clustering_algorithm": f"DBSCAN ({config.clustering_mode})",
+                "model_registry": get_registry_stats()
             }
         }
     except Exception as e:
@@ -125,11 +318,16 @@ def get_config():
 
 # Endpoint: Clear embedding cache
 @router.post("/clear-cache")
-def clear_embedding_cache():
+def clear_embedding_cache(include_store: bool = Query(False, description="Also delete persisted embeddings"),
+                          include_summaries: bool = Query(False, description="Also delete cached LLM summaries")):
     """Clear the embedding cache to free memory"""
     try:
-        clear_cache()
-        return {"message": "Cache cleared successfully", "cache_stats": get_cache_stats()}
+        clear_cache(include_store=include_store)
+        response = {"message": "Cache cleared successfully", "cache_stats": get_cache_stats()}
+        if include_summaries:
+            response["summaries_removed"] = clear_summary_cache()
+            response["summary_cache"] = get_summary_cache_stats()
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -141,11 +339,22 @@ def health_check():
         cache_stats = get_cache_stats()
         return {
             "status": "healthy",
+            "models_loaded": get_registry_stats()["loaded_models"],
             "cache_size": cache_stats["cache_size"],
+            "cache": {
+                "resident_bytes": cache_stats["resident_bytes"],
+                "hits": cache_stats["hits"],
+                "misses": cache_stats["misses"],
+                "evictions": cache_stats["evictions"],
+                "hit_rate": cache_stats["hit_rate"]
+            },
+            "summary_cache": get_summary_cache_stats(),
+            "llm_client": get_llm_client_stats(),
             "config": {
                 "fast_mode_default": config.default_fast_mode,
                 "parallel_processing": config.enable_parallel,
-                "max_workers": config.max_workers
+                "max_workers": config.max_workers,
+                "llm_max_concurrency": config.llm_max_concurrency
             }
         }
     except Exception as e:
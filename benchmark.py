@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the harmonization service
+
+Usage:
+    python benchmark.py search [--sizes 1000 10000 100000] [--k 10]
+    python benchmark.py quantization [--size 20000]
+    python benchmark.py backends [--corpus data/known_control.json] [--repeat 50]
+    python benchmark.py clustering [--sizes 1000 5000 20000 50000] [--max-exact 10000]
+    python benchmark.py encoding [--texts 20000] [--workers 1 2 4 8 16]
+    python benchmark.py ingest [--rows 100000]
+    python benchmark.py overlaps [--existing 2000] [--new 5000 20000 100000]
+    python benchmark.py packing [--clusters 300] [--max-tokens 2000]
+    python benchmark.py llm [--controls 500] [--concurrency 1 4 16] [--malformed-rate 0.05] [--packing]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import contextlib
+import json
+import numpy as np
+
+def _synthetic_embeddings(n: int, dim: int = 384, n_topics: int = 200, seed: int = 0) -> np.ndarray:
+    """Normalized vectors scattered around random topic centres, like a multi-framework catalog"""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def benchmark_search(args):
+    """Recall@k versus latency for exact and IVF search over growing catalogs"""
+    from services.vector_index import ExactIndex, IVFIndex, evaluate_search
+
+    rng = np.random.default_rng(1)
+    report = []
+    for size in args.sizes:
+        embeddings = _synthetic_embeddings(size)
+        queries = embeddings[rng.choice(size, size=args.queries)] + 0.3 * rng.standard_normal(
+            (args.queries, embeddings.shape[1])).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        report.append(evaluate_search(ExactIndex(embeddings), embeddings, queries, k=args.k))
+        ivf = IVFIndex(embeddings)
+        for n_probe in args.probes:
+            ivf.n_probe = min(n_probe, ivf.n_lists)
+            result = evaluate_search(ivf, embeddings, queries, k=args.k)
+            result["build_time_seconds"] = round(ivf.build_time, 3)
+            report.append(result)
+
+    for row in report:
+        print(json.dumps(row))
+    return report
+
+def benchmark_quantization(args):
+    """Memory saved and score / cluster drift of float16 and int8 storage versus float32"""
+    from sklearn.cluster import DBSCAN
+    from sklearn.metrics import adjusted_rand_score
+    from services.quantization import quantize, quantization_report
+
+    rng = np.random.default_rng(2)
+    embeddings = _synthetic_embeddings(args.size)
+    queries = embeddings[rng.choice(args.size, size=args.queries)]
+
+    # Cluster drift is measured on a subset small enough for brute-force DBSCAN
+    subset = embeddings[:args.cluster_size]
+    reference_labels = DBSCAN(eps=0.4, min_samples=2, metric="cosine").fit(subset).labels_
+
+    report = []
+    for dtype in ("float16", "int8"):
+        result = quantization_report(embeddings, queries, dtype)
+        labels = DBSCAN(eps=0.4, min_samples=2, metric="cosine").fit(quantize(subset, dtype).dequantize()).labels_
+        result["cluster_adjusted_rand_index"] = round(float(adjusted_rand_score(reference_labels, labels)), 4)
+        report.append(result)
+
+    for row in report:
+        print(json.dumps(row))
+    return report
+
+def benchmark_backends(args):
+    """Throughput, latency and cosine agreement of ONNX Runtime backends versus PyTorch"""
+    import time
+    from sentence_transformers import SentenceTransformer
+    from services.config import config
+    from services.onnx_encoder import OnnxSentenceEncoder
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        descriptions = [c["description"] for c in json.load(f)]
+    # Repeat the corpus with a suffix so every text is distinct
+    corpus = [f"{text} ({i})" for i in range(args.repeat) for text in descriptions]
+
+    encoders = {
+        "torch": SentenceTransformer(config.embedding_model, device="cpu"),
+        "onnx": OnnxSentenceEncoder(config.embedding_model, config.onnx_model_dir),
+        "onnx-int8": OnnxSentenceEncoder(config.embedding_model, config.onnx_model_dir, quantize=True)
+    }
+
+    reference = None
+    report = []
+    for name, encoder in encoders.items():
+        encoder.encode(corpus[:8])  # warm-up
+        start_time = time.perf_counter()
+        embeddings = np.asarray(encoder.encode(corpus, batch_size=args.batch_size, normalize_embeddings=True))
+        elapsed = time.perf_counter() - start_time
+
+        latencies = []
+        for text in corpus[:args.latency_samples]:
+            single_start = time.perf_counter()
+            encoder.encode([text])
+            latencies.append((time.perf_counter() - single_start) * 1000)
+
+        if reference is None:
+            reference = embeddings
+        agreement = np.sum(embeddings * reference, axis=1)
+        report.append({
+            "backend": name,
+            "texts": len(corpus),
+            "throughput_texts_per_second": round(len(corpus) / elapsed, 1),
+            "single_text_latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "single_text_latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "cosine_vs_torch_mean": round(float(agreement.mean()), 6),
+            "cosine_vs_torch_min": round(float(agreement.min()), 6)
+        })
+
+    for row in report:
+        print(json.dumps(row))
+    return report
+
+def benchmark_clustering(args):
+    """Time and peak memory of exact DBSCAN versus sparse-neighbourhood clustering by batch size
+
+    Below CLUSTERING_IVF_MIN_SIZE the sparse graph still scores all pairs (quadratic time,
+    chunk-bounded memory); the "graph" field says which graph each run built.
+    """
+    import time
+    import tracemalloc
+    from sklearn.metrics import adjusted_rand_score
+    from services.clustering import cluster_embeddings
+    from services.config import config
+
+    report = []
+    for size in args.sizes:
+        embeddings = _synthetic_embeddings(size, n_topics=max(10, size // 20))
+        reference = None
+        for mode in ("exact", "sparse"):
+            if mode == "exact" and size > args.max_exact:
+                continue
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            labels = cluster_embeddings(embeddings, mode=mode)
+            elapsed = time.perf_counter() - start_time
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if mode == "exact":
+                reference = labels
+            if mode == "exact":
+                graph = "dense_all_pairs"
+            else:
+                graph = "chunked_all_pairs" if size < config.clustering_ivf_min_size else "ivf"
+            report.append({
+                "mode": mode,
+                "graph": graph,
+                "batch_size": size,
+                "seconds": round(elapsed, 3),
+                "peak_memory_mb": round(peak / 1024 / 1024, 1),
+                "clusters": int(labels.max() + 1),
+                "outliers": int((labels == -1).sum()),
+                "adjusted_rand_index_vs_exact": (
+                    round(float(adjusted_rand_score(reference, labels)), 4) if reference is not None else None
+                )
+            })
+            print(json.dumps(report[-1]))
+    return report
+
+def benchmark_encoding(args):
+    """Throughput of single-process versus multi-process encoding by worker count"""
+    import time
+    from services.embedding import encode_texts
+    from services.encoding_pool import parallel_encode, shutdown_encoding_pool
+    from services.model_registry import get_model
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        descriptions = [c["description"] for c in json.load(f)]
+    corpus = [f"{descriptions[i % len(descriptions)]} ({i})" for i in range(args.texts)]
+    dimension = get_model().get_sentence_embedding_dimension()
+
+    report = []
+    baseline = None
+    for workers in args.workers:
+        if workers == 1:
+            encode_texts(corpus[:8])  # warm-up
+            start_time = time.perf_counter()
+            get_model().encode(corpus, convert_to_numpy=True, normalize_embeddings=True)
+        else:
+            parallel_encode(corpus[:workers * args.chunk_size], dimension, workers, args.chunk_size)  # start workers
+            start_time = time.perf_counter()
+            parallel_encode(corpus, dimension, workers, args.chunk_size)
+        elapsed = time.perf_counter() - start_time
+
+        throughput = len(corpus) / elapsed
+        baseline = baseline or throughput
+        report.append({
+            "workers": workers,
+            "texts": len(corpus),
+            "seconds": round(elapsed, 3),
+            "throughput_texts_per_second": round(throughput, 1),
+            "speedup_vs_first": round(throughput / baseline, 2)
+        })
+        print(json.dumps(report[-1]))
+    shutdown_encoding_pool()
+    return report
+
+def benchmark_ingest(args):
+    """Parse throughput and peak memory of streaming JSONL/CSV ingestion versus a pydantic JSON body"""
+    import csv
+    import io
+    import time
+    import tracemalloc
+    from typing import List
+    from pydantic import BaseModel
+    from services.ingest import ingest_controls
+
+    class ControlObject(BaseModel):
+        framework: str
+        control_id: str
+        name: str
+        description: str
+
+    class BatchBody(BaseModel):
+        controls: List[ControlObject]
+
+    rng = np.random.default_rng(0)
+    words = ["access", "account", "audit", "review", "encryption", "key", "backup", "incident", "policy", "vendor"]
+    rows = [
+        {"framework": "FW", "control_id": f"C-{i}", "name": f"Control {i}",
+         "description": " ".join(rng.choice(words, size=30))}
+        for i in range(args.rows)
+    ]
+    jsonl = "\n".join(json.dumps(row) for row in rows).encode()
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    payloads = {"jsonl": jsonl, "csv": text.getvalue().encode(), "json-body": json.dumps({"controls": rows}).encode()}
+    del rows
+
+    def parse(name, payload):
+        if name == "json-body":
+            return [control.model_dump() for control in BatchBody.model_validate_json(payload).controls]
+        return ingest_controls(io.BytesIO(payload), name, embed=False)["controls"]
+
+    report = []
+    for name, payload in payloads.items():
+        start_time = time.perf_counter()
+        controls = parse(name, payload)
+        elapsed = time.perf_counter() - start_time
+        del controls
+
+        # Memory is measured in a second pass; tracing slows parsing down
+        tracemalloc.start()
+        controls = parse(name, payload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report.append({
+            "input": name,
+            "rows": len(controls),
+            "megabytes": round(len(payload) / 1024 / 1024, 1),
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(len(controls) / elapsed, 1),
+            "peak_memory_mb": round(peak / 1024 / 1024, 1)
+        })
+        print(json.dumps(report[-1]))
+    return report
+
+def benchmark_overlaps(args):
+    """Time of organization overlap detection (existing controls x batch) by batch size"""
+    import time
+    from services.batch import _find_overlaps
+    from services.config import config
+
+    report = []
+    for size in args.new:
+        # Existing and new controls drawn around the same topics
+        vectors = _synthetic_embeddings(args.existing + size)
+        existing, new = vectors[:args.existing], vectors[args.existing:]
+        start_time = time.perf_counter()
+        overlaps = list(_find_overlaps(existing, new, config.org_overlap_top_k, config.org_overlap_threshold))
+        elapsed = time.perf_counter() - start_time
+        report.append({
+            "existing_controls": args.existing,
+            "batch_size": size,
+            "seconds": round(elapsed, 3),
+            "overlaps": len(overlaps)
+        })
+        print(json.dumps(report[-1]))
+    return report
+
+@contextlib.contextmanager
+def _simulated_llm(fake, max_concurrency: int, timeout: float = None):
+    """Route summarization through an LLMClient backed by a FakeOllama, with the summary cache off"""
+    import services.batch as batch
+    import services.summarizer as summarizer
+    from services.llm_client import LLMClient
+
+    client = LLMClient(max_concurrency=max_concurrency, timeout=timeout, transport=fake.transport())
+    original = summarizer.get_llm_client, batch.get_llm_client, summarizer._summary_cache
+    summarizer.get_llm_client = batch.get_llm_client = lambda: client
+    summarizer._summary_cache = None
+    try:
+        yield client
+    finally:
+        summarizer.get_llm_client, batch.get_llm_client, summarizer._summary_cache = original
+        client.close()
+
+def _percentile(values, q: float) -> float:
+    return round(float(np.percentile(values, q)), 3) if len(values) else 0.0
+
+def benchmark_packing(args):
+    """Simulated LLM time of one summarization prompt per cluster versus packed prompts"""
+    import io
+    import time
+    import services.batch as batch
+    from services.config import config
+    from services.fake_ollama import FakeOllama
+
+    rng = np.random.default_rng(0)
+    words = ["access", "account", "audit", "review", "encryption", "key", "backup", "incident", "policy", "vendor"]
+    groups = [
+        (f"UC-{i:03}", [{"framework": "FW", "control_id": f"C-{i}-{j}", "name": f"Control {i}-{j}",
+                         "description": " ".join(rng.choice(words, size=25))} for j in range(args.cluster_size)], True)
+        for i in range(args.clusters)
+    ]
+
+    original = config.enable_prompt_packing, config.packed_prompt_max_tokens
+    config.packed_prompt_max_tokens = args.max_tokens
+    report = []
+    try:
+        for packing in (False, True):
+            config.enable_prompt_packing = packing
+            # Ollama-like cost model (per-request overhead, prompt and generation rates), sped up by time_scale
+            fake = FakeOllama(latency_seconds=args.overhead * args.time_scale, latency_sigma=0.0,
+                              prompt_tokens_per_second=args.prompt_rate / args.time_scale,
+                              tokens_per_second=args.generation_rate / args.time_scale, parallel=args.concurrency)
+            with _simulated_llm(fake, args.concurrency):
+                start_time = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    summaries = list(batch.iter_group_summaries(groups))
+                elapsed = time.perf_counter() - start_time
+            served = fake.stats()
+            report.append({
+                "packing": packing,
+                "clusters": len(summaries),
+                "prompts": served["requests"],
+                "prompt_tokens": served["prompt_tokens"],
+                "generated_tokens": served["generated_tokens"],
+                "llm_seconds": round(served["service_seconds"] / args.time_scale, 1),
+                "wall_seconds": round(elapsed / args.time_scale, 1)
+            })
+            print(json.dumps(report[-1]))
+    finally:
+        config.enable_prompt_packing, config.packed_prompt_max_tokens = original
+    return report
+
+def benchmark_llm(args):
+    """Batch harmonization summarization throughput and tail latency against a simulated Ollama"""
+    import io
+    import time
+    import services.batch as batch
+    import services.summarizer as summarizer
+    from services.config import config
+    from services.fake_ollama import FakeOllama
+
+    rng = np.random.default_rng(0)
+    words = ["access", "account", "audit", "review", "encryption", "key", "backup", "incident", "policy", "vendor"]
+    controls = [
+        {"framework": "FW", "control_id": f"C-{i}", "name": f"Control {i}",
+         "description": " ".join(rng.choice(words, size=25))}
+        for i in range(args.controls)
+    ]
+    embeddings = _synthetic_embeddings(args.controls, n_topics=args.topics)
+
+    original = config.enable_prompt_packing
+    config.enable_prompt_packing = args.packing
+    report = []
+    try:
+        for concurrency in args.concurrency:
+            fake = FakeOllama(latency_seconds=args.latency, latency_sigma=args.sigma,
+                              prompt_tokens_per_second=args.prompt_rate, tokens_per_second=args.generation_rate,
+                              parallel=args.parallel, malformed_rate=args.malformed_rate,
+                              failure_rate=args.failure_rate, seed=0)
+            replies_before = summarizer.get_structured_output_stats()
+            with _simulated_llm(fake, concurrency, args.timeout) as client:
+                completions = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for event in batch.iter_batch_harmonize(controls, embeddings=embeddings):
+                        if event["event"] == "clustering":
+                            start_time = time.perf_counter()
+                        elif event["event"] == "unified_control":
+                            completions.append(time.perf_counter() - start_time)
+                client_stats = client.stats()
+            replies = summarizer.get_structured_output_stats()
+            elapsed = completions[-1] if completions else 0.0
+            report.append({
+                "llm_concurrency": concurrency,
+                "server_parallel": args.parallel,
+                "packing": args.packing,
+                "groups": len(completions),
+                "llm_requests": client_stats["requests"],
+                "seconds": round(elapsed, 2),
+                "groups_per_second": round(len(completions) / elapsed, 2) if elapsed else 0.0,
+                "group_done_p50": _percentile(completions, 50),
+                "group_done_p95": _percentile(completions, 95),
+                "request_p50": client_stats["latency_seconds_p50"],
+                "request_p95": client_stats["latency_seconds_p95"],
+                "request_p99": client_stats["latency_seconds_p99"],
+                "peak_in_flight": client_stats["peak_in_flight"],
+                "server_failures": fake.stats()["failures"],
+                "malformed_replies": fake.stats()["malformed"],
+                "retries": replies["retries"] - replies_before["retries"],
+                "fallbacks": replies["fallbacks"] - replies_before["fallbacks"]
+            })
+            print(json.dumps(report[-1]))
+    finally:
+        config.enable_prompt_packing = original
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search = subparsers.add_parser("search", help="ANN recall@k vs latency report")
+    search.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    search.add_argument("--queries", type=int, default=200)
+    search.add_argument("--k", type=int, default=10)
+    search.add_argument("--probes", type=int, nargs="+", default=[4, 16, 32])
+    search.set_defaults(func=benchmark_search)
+
+    quantization = subparsers.add_parser("quantization", help="Compact embedding storage memory and drift report")
+    quantization.add_argument("--size", type=int, default=20000)
+    quantization.add_argument("--queries", type=int, default=200)
+    quantization.add_argument("--cluster-size", type=int, default=3000)
+    quantization.set_defaults(func=benchmark_quantization)
+
+    backends = subparsers.add_parser("backends", help="PyTorch vs ONNX Runtime embedding backends")
+    backends.add_argument("--corpus", default="data/known_control.json")
+    backends.add_argument("--repeat", type=int, default=50)
+    backends.add_argument("--batch-size", type=int, default=32)
+    backends.add_argument("--latency-samples", type=int, default=100)
+    backends.set_defaults(func=benchmark_backends)
+
+    clustering = subparsers.add_parser("clustering", help="Exact vs sparse-neighbourhood clustering scaling")
+    clustering.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+    clustering.add_argument("--max-exact", type=int, default=10000)
+    clustering.set_defaults(func=benchmark_clustering)
+
+    encoding = subparsers.add_parser("encoding", help="Multi-process encoding throughput by worker count")
+    encoding.add_argument("--corpus", default="data/known_control.json")
+    encoding.add_argument("--texts", type=int, default=20000)
+    encoding.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    encoding.add_argument("--chunk-size", type=int, default=256)
+    encoding.set_defaults(func=benchmark_encoding)
+
+    ingest = subparsers.add_parser("ingest", help="Streaming JSONL/CSV ingestion parse throughput")
+    ingest.add_argument("--rows", type=int, default=100000)
+    ingest.set_defaults(func=benchmark_ingest)
+
+    overlaps = subparsers.add_parser("overlaps", help="Overlap detection against existing controls")
+    overlaps.add_argument("--existing", type=int, default=2000)
+    overlaps.add_argument("--new", type=int, nargs="+", default=[5000, 20000, 100000])
+    overlaps.set_defaults(func=benchmark_overlaps)
+
+    packing = subparsers.add_parser("packing", help="Per-cluster vs packed summarization prompts (simulated LLM)")
+    packing.add_argument("--clusters", type=int, default=300)
+    packing.add_argument("--cluster-size", type=int, default=3)
+    packing.add_argument("--max-tokens", type=int, default=2000)
+    packing.add_argument("--concurrency", type=int, default=4)
+    packing.add_argument("--overhead", type=float, default=0.2, help="seconds per request")
+    packing.add_argument("--prompt-rate", type=float, default=1000.0, help="prompt tokens per second")
+    packing.add_argument("--generation-rate", type=float, default=40.0, help="generated tokens per second")
+    packing.add_argument("--time-scale", type=float, default=0.01, help="fraction of simulated time actually slept")
+    packing.set_defaults(func=benchmark_packing)
+
+    llm = subparsers.add_parser("llm", help="Summarization throughput and tail latency against a simulated Ollama")
+    llm.add_argument("--controls", type=int, default=500)
+    llm.add_argument("--topics", type=int, default=50)
+    llm.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    llm.add_argument("--parallel", type=int, default=4, help="requests the simulated server runs at once")
+    llm.add_argument("--latency", type=float, default=0.05, help="median base latency in seconds")
+    llm.add_argument("--sigma", type=float, default=0.75, help="log-normal spread of the base latency")
+    llm.add_argument("--prompt-rate", type=float, default=20000.0, help="prompt tokens per second")
+    llm.add_argument("--generation-rate", type=float, default=800.0, help="generated tokens per second")
+    llm.add_argument("--malformed-rate", type=float, default=0.05)
+    llm.add_argument("--failure-rate", type=float, default=0.01)
+    llm.add_argument("--timeout", type=float, default=None, help="per-generation timeout (LLM_TIMEOUT_SECONDS)")
+    llm.add_argument("--packing", action="store_true", help="enable prompt packing")
+    llm.set_defaults(func=benchmark_llm)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
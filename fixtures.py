@@ -0,0 +1,45 @@
+"""
+Shared fixtures for the test scripts: sample controls, topic embeddings and LLM stand-ins
+"""
+
+import asyncio
+
+import numpy as np
+from services.fake_ollama import FakeOllama
+
+CONTROLS = [
+    {"framework": "NIST", "control_id": "AC-2", "name": "Account Management", "description": "Manage accounts"},
+    {"framework": "ISO", "control_id": "A.9.2.1", "name": "User registration", "description": "Register users"}
+]
+
+def control(i, topic, description=None):
+    """Control T-<i> about a topic ("topic <topic> control <i>" unless a description is given)"""
+    return {"framework": "TEST", "control_id": f"T-{i}", "name": f"Control {i}",
+            "description": description or f"topic {topic} control {i}"}
+
+def topic_controls(n_topics=6, per_topic=2):
+    """per_topic controls T-<topic>-<i> named "Topic <topic>" for each topic"""
+    return [
+        {"framework": "TEST", "control_id": f"T-{t}-{i}", "name": f"Topic {t}", "description": f"topic {t} control {i}"}
+        for t in range(n_topics) for i in range(per_topic)
+    ]
+
+def topic_embeddings(texts):
+    """Stand-in for get_embeddings: one orthogonal direction per topic ("topic <n> ..." texts)"""
+    vectors = np.zeros((len(texts), 16), dtype=np.float32)
+    for row, text in enumerate(texts):
+        vectors[row, int(text.split()[1])] = 1.0
+    return vectors
+
+def slow_summary(seconds):
+    """Stand-in for summarize_controls_async that takes seconds and titles a group by its first control"""
+    async def summarize(group, org_context=None):
+        await asyncio.sleep(seconds)
+        return {"title": group[0]["name"], "description": "summary", "implementation_steps": []}
+    return summarize
+
+def fast_fake_ollama(**kwargs):
+    """FakeOllama without latency (unless given), seeded for reproducible faults"""
+    settings = {"latency_seconds": 0.0, "prompt_tokens_per_second": 1e9, "tokens_per_second": 1e9, "seed": 0}
+    settings.update(kwargs)
+    return FakeOllama(**settings)
@@ -1,7 +1,32 @@
 from fastapi import FastAPI
 from api.routes import router
+from services.catalog_index import load_catalog_index
+from services.model_registry import warm_up
+from services.jobs import recover_jobs
+from services.llm_client import close_llm_client
+from services.config import config
 
 app = FastAPI(title="Control Harmonization Engine")
 
 # Register routes
 app.include_router(router)
+
+@app.on_event("startup")
+def load_models_and_indexes():
+    """Load the embedding model and the known-control catalog index before serving"""
+    if config.warm_up_on_startup:
+        warm_up()
+    try:
+        load_catalog_index()
+    except Exception as e:
+        # /harmonize retries the load lazily on first use
+        print(f"Catalog index not loaded at startup: {e}")
+    try:
+        recover_jobs()
+    except Exception as e:
+        print(f"Harmonization jobs not recovered at startup: {e}")
+
+@app.on_event("shutdown")
+def close_clients():
+    """Close pooled LLM connections"""
+    close_llm_client()
@@ -1,17 +1,47 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import DBSCAN
-from collections import defaultdict
-from services.summarizer import summarize_controls
-from typing import List, Dict, Optional
+from collections import Counter, defaultdict
+from services.summarizer import summarize_controls_async, summarize_packed_async, plan_packs, estimate_control_tokens
+from services.llm_client import get_llm_client
+from services.embedding import get_embeddings
+from services.clustering import cluster_embeddings, split_oversized_groups
+from services.dedup import deduplicate_controls
+from services.quantization import QuantizedEmbeddings, quantize
+from services.config import config
+from services.vector_index import top_k
+from typing import List, Dict, Optional, Iterator, Callable
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from contextlib import closing
 import time
+import numpy as np
 
-# Load Sentence-BERT model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+_OUTLIER_NUMBER = 999
+OUTLIER_UNIFIED_CONTROL_ID = f"UC-{_OUTLIER_NUMBER}"
 
-def _analyze_org_context(controls: List[Dict], org_context: Optional[Dict] = None) -> Dict:
-    """Analyze organization context and provide insights"""
+def _find_overlaps(existing_vectors: np.ndarray, new_vectors: np.ndarray, k: int, threshold: float):
+    """Yield (existing index, new index, score) for each existing control's k most similar new controls
+
+    Only scores at or above threshold are kept. Scores come from chunked matrix products
+    (time linear in the batch size for a given set of existing controls, memory bounded by
+    the chunk) with a partial top-k per existing control.
+    """
+    # Bound the score block to about 4M floats; new_vectors may be quantized, so it goes on the left
+    chunk_size = max(1, (1 << 22) // max(1, new_vectors.shape[0]))
+    for start in range(0, existing_vectors.shape[0], chunk_size):
+        block = (new_vectors @ existing_vectors[start:start + chunk_size].T).T
+        for offset, scores in enumerate(block):
+            for new_idx, score in zip(*top_k(scores, k)):
+                if score >= threshold:
+                    yield start + offset, int(new_idx), float(score)
+
+def _analyze_org_context(controls: List[Dict], org_context: Optional[Dict] = None,
+                         embeddings: Optional[np.ndarray] = None) -> Dict:
+    """Analyze organization context and provide insights
+
+    Overlaps pair each existing control with the new controls most similar to it by
+    embedding cosine similarity (ORG_OVERLAP_TOP_K per existing control, at least
+    ORG_OVERLAP_THRESHOLD), best first. embeddings, if given, are the controls' normalized
+    description embeddings (one row per control) from the batch.
+    """
     if not org_context:
         return {
             "existing_controls_count": 0,
@@ -30,20 +60,21 @@ def _analyze_org_context(controls: List[Dict], org_context: Optional[Dict] = Non
     }
     
     # Compare with existing controls if provided
-    if org_context.get("existing_controls"):
+    if org_context.get("existing_controls") and controls:
         existing_controls = org_context["existing_controls"]
-        new_control_descriptions = [c["description"] for c in controls]
-        
-        # Simple keyword-based overlap detection
-        for existing in existing_controls:
-            for new_control in controls:
-                if any(keyword in new_control["description"].lower() 
-                      for keyword in existing.lower().split()):
-                    analysis["overlaps"].append({
-                        "existing": existing,
-                        "new_control": new_control["name"],
-                        "framework": new_control["framework"]
-                    })
+        existing_vectors = get_embeddings(existing_controls)
+        new_vectors = embeddings if embeddings is not None else get_embeddings([c["description"] for c in controls])
+
+        overlaps = _find_overlaps(existing_vectors, new_vectors, config.org_overlap_top_k,
+                                  config.org_overlap_threshold)
+        for existing_idx, new_idx, score in sorted(overlaps, key=lambda overlap: -overlap[2]):
+            analysis["overlaps"].append({
+                "existing": existing_controls[existing_idx],
+                "new_control": controls[new_idx]["name"],
+                "control_id": controls[new_idx]["control_id"],
+                "framework": controls[new_idx]["framework"],
+                "score": round(score, 4)
+            })
     
     # Industry-specific recommendations
     industry = org_context.get("industry", "").lower()
@@ -56,6 +87,22 @@ def _analyze_org_context(controls: List[Dict], org_context: Optional[Dict] = Non
     
     return analysis
 
+def _merge_org_analysis(previous: Dict, added: Dict, org_context: Optional[Dict]) -> Dict:
+    """Organization analysis of a batch grown by some controls, from the analysis of the batch
+    before and of the added controls alone (both under the same org_context)
+
+    Each existing control keeps its ORG_OVERLAP_TOP_K best overlaps across both, as if the
+    grown batch had been analyzed at once.
+    """
+    limits = Counter((org_context or {}).get("existing_controls", []))
+    kept = Counter()
+    overlaps = []
+    for overlap in sorted(previous["overlaps"] + added["overlaps"], key=lambda overlap: -overlap["score"]):
+        if kept[overlap["existing"]] < config.org_overlap_top_k * limits[overlap["existing"]]:
+            kept[overlap["existing"]] += 1
+            overlaps.append(overlap)
+    return dict(added, overlaps=overlaps)
+
 def _generate_contextualized_prompt(controls: List[Dict], org_context: Optional[Dict] = None) -> str:
     """Generate a context-aware prompt for LLM summarization"""
     base_prompt = f"""Summarize these security controls into a unified format:
@@ -123,13 +170,268 @@ def _generate_fast_summary(controls: List[Dict], org_context: Optional[Dict] = N
         "note": "Fast mode: Basic grouping only. Use normal mode for quality descriptions."
     }
 
-def batch_harmonize_from_input(controls: List[Dict], fast_mode: bool = False, org_context: Optional[Dict] = None) -> List[Dict]:
+def _finish_summary(summary: Dict, group: List[Dict], is_clustered: bool) -> Dict:
+    """Fill in whatever the LLM summary left empty"""
+    if is_clustered:
+        return {
+            "title": summary["title"] or "Clustered Controls",
+            "description": summary["description"] or f"Group of {len(group)} similar controls",
+            "implementation_steps": summary["implementation_steps"] or []
+        }
+    return {
+        "title": summary["title"] or "Other Controls: Unique or Unclustered",
+        "description": summary["description"] or (
+            "These controls did not match any cluster, but remain valuable and are summarized here for review."
+        ),
+        "implementation_steps": summary["implementation_steps"] or []
+    }
+
+async def _summarize_group_async(group: List[Dict], is_clustered: bool, org_context: Optional[Dict] = None) -> Dict:
+    """LLM summary of one group on the LLM client's loop, never raising"""
+    try:
+        summary = await summarize_controls_async(group, org_context)
+    except Exception as e:
+        print(f"Error summarizing group of {len(group)} controls: {e}")
+        summary = {"title": "", "description": "", "implementation_steps": []}
+    return _finish_summary(summary, group, is_clustered)
+
+def _summarize_group(group: List[Dict], is_clustered: bool, fast_mode: bool, org_context: Optional[Dict] = None) -> Dict:
+    """Summarize one group of controls (LLM, or heuristics in fast mode), never raising"""
+    if fast_mode:
+        return _generate_fast_summary(group, org_context)
+    return get_llm_client().submit(_summarize_group_async(group, is_clustered, org_context)).result()
+
+async def _summarize_pack_async(items: List[tuple], org_context: Optional[Dict] = None) -> List[tuple]:
+    """(key, summary) for each (key, group, is_clustered) item, packed into one prompt when there are several"""
+    if len(items) == 1:
+        key, group, is_clustered = items[0]
+        return [(key, await _summarize_group_async(group, is_clustered, org_context))]
+    try:
+        summaries = await summarize_packed_async({str(key): group for key, group, _ in items}, org_context)
+    except Exception as e:
+        print(f"Error summarizing pack of {len(items)} groups: {e}")
+        summaries = {}
+    empty = {"title": "", "description": "", "implementation_steps": []}
+    return [(key, _finish_summary(summaries.get(str(key), empty), group, is_clustered))
+            for key, group, is_clustered in items]
+
+def iter_group_summaries(groups: List[tuple], org_context: Optional[Dict] = None) -> Iterator[tuple]:
+    """Yield (key, summary) for (key, group, is_clustered) items in completion order (keys must be distinct)
+
+    Every LLM summary is scheduled on the shared LLM client at once, so the calling thread
+    does not block per request; LLM_MAX_CONCURRENCY bounds how many run together. With
+    ENABLE_PROMPT_PACKING, small groups share prompts within PACKED_PROMPT_MAX_TOKENS. With
+    ENABLE_PARALLEL off the prompts run one after another. Closing the generator early
+    cancels the summaries still queued or in flight.
+    """
+    client = get_llm_client()
+    if config.enable_prompt_packing:
+        packs = plan_packs([group for _, group, _ in groups], config.packed_prompt_max_tokens,
+                           config.packed_prompt_max_groups)
+    else:
+        packs = [[i] for i in range(len(groups))]
+    packs = [[groups[i] for i in pack] for pack in packs]
+
+    if not config.enable_parallel:
+        for pack in packs:
+            yield from client.submit(_summarize_pack_async(pack, org_context)).result()
+        return
+
+    futures = [client.submit(_summarize_pack_async(pack, org_context)) for pack in packs]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def _unified_control(unified_control_id: str, summary: Dict, group: List[Dict], is_clustered: bool,
+                     fast_mode: bool, org_context: Optional[Dict] = None) -> Dict:
+    """Build one unified control record"""
+    return {
+        "unified_control_id": unified_control_id,
+        "title": summary["title"],
+        "description": summary["description"],
+        "implementation_steps": summary["implementation_steps"],
+        "mapped_controls": group,
+        "is_clustered": is_clustered,
+        "fast_mode": fast_mode,
+        "org_context_applied": org_context is not None
+    }
+
+def _bound_group_sizes(embeddings: np.ndarray, labels: np.ndarray, controls: List[Dict]):
+    """Split clusters and the outlier pool over MAX_CLUSTER_MEMBERS / MAX_CLUSTER_TOKENS
+
+    With OUTLIER_SUMMARY_MODE=per_control every outlier becomes its own group instead.
+    Returns the relabelled clusters (sub-clusters get consecutive labels, outliers stay -1)
+    and the outlier pool as a list of row groups.
+    """
+    weights = np.array([estimate_control_tokens(c) for c in controls], dtype=np.float64)
+    cluster_rows = [np.flatnonzero(labels == label) for label in sorted(set(int(l) for l in labels) - {-1})]
+    bounded = split_oversized_groups(embeddings, cluster_rows, config.max_cluster_members,
+                                     config.max_cluster_tokens, weights)
+    new_labels = np.full(len(labels), -1, dtype=np.int64)
+    for label, rows in enumerate(bounded):
+        new_labels[rows] = label
+
+    outlier_rows = np.flatnonzero(labels == -1)
+    if config.outlier_summary_mode == "per_control":
+        outlier_groups = [outlier_rows[i:i + 1] for i in range(len(outlier_rows))]
+    else:
+        outlier_groups = split_oversized_groups(embeddings, [outlier_rows], config.max_cluster_members,
+                                                config.max_cluster_tokens, weights) if len(outlier_rows) else []
+    if len(bounded) != len(cluster_rows) or len(outlier_groups) > 1:
+        print(f"Split {len(cluster_rows)} clusters into {len(bounded)} and the outlier pool into "
+              f"{len(outlier_groups)} groups")
+    return new_labels, outlier_groups
+
+def _cluster_id(number: int) -> str:
+    """UC-<number> for the number-th cluster, skipping UC-999, which is reserved for the outlier group"""
+    return f"UC-{number + (number >= _OUTLIER_NUMBER):03}"
+
+def _outlier_group_ids(n_groups: int) -> List[str]:
+    """UC-999 for a single outlier group, UC-999-01, UC-999-02, ... once it is split"""
+    if n_groups == 1:
+        return [OUTLIER_UNIFIED_CONTROL_ID]
+    return [f"{OUTLIER_UNIFIED_CONTROL_ID}-{i:02}" for i in range(1, n_groups + 1)]
+
+def iter_batch_harmonize(controls: List[Dict], fast_mode: bool = False, org_context: Optional[Dict] = None,
+                         persist_state: bool = False, embeddings: Optional[np.ndarray] = None) -> Iterator[Dict]:
+    """
+    Streaming form of batch_harmonize_from_input. Yields events as work completes:
+
+    - {"event": "clustering", ...}: organization analysis and cluster membership, as soon as
+      clustering finishes (before any LLM call)
+    - {"event": "unified_control", "unified_control": {...}}: one per group, in completion order
+    - {"event": "summary", ...}: totals, processing time and state_id (if persisted)
+    """
+    start_time = time.time()
+    
+    # Step 1: Collapse duplicate descriptions so each is embedded and prompted once
+    dedup = deduplicate_controls(controls, config.dedup_mode, config.dedup_near_threshold)
+    representatives = [controls[i] for i in dedup["representatives"]]
+    duplicates = defaultdict(list)
+    for idx, position in enumerate(dedup["representative_of"]):
+        duplicates[position].append(controls[idx])
+    print(f"Deduplication completed in {time.time() - start_time:.2f}s "
+          f"({dedup['stats']['unique_controls']} of {len(controls)} controls unique)")
+
+    # Step 2: Embedding (fast; reads through the persistent embedding store), unless the
+    # caller already embedded the controls (e.g. chunk by chunk while parsing an upload)
+    if embeddings is None:
+        embeddings = get_embeddings([c["description"] for c in representatives])
+    elif isinstance(embeddings, QuantizedEmbeddings):
+        embeddings = embeddings[dedup["representatives"]]
+    else:
+        embeddings = np.asarray(embeddings)[dedup["representatives"]]
+    # The batch matrix is held in EMBEDDING_STORAGE_DTYPE like the catalog index; clustering,
+    # group splitting and overlap detection score quantized matrices directly
+    if not isinstance(embeddings, QuantizedEmbeddings):
+        embeddings = quantize(np.asarray(embeddings, dtype=np.float32), config.embedding_storage_dtype)
+    print(f"Embedding completed in {time.time() - start_time:.2f}s")
+
+    # Step 3: Analyze organization context (overlaps reuse the batch embeddings, one entry per
+    # distinct description)
+    org_analysis = _analyze_org_context(representatives, org_context, embeddings)
+    print(f"Context analysis completed in {time.time() - start_time:.2f}s")
+
+    # Step 4: Clustering (fast), then split groups over the member/token budget. Each
+    # representative weighs as many points as the controls it stands for, so duplicates
+    # still form clusters as they would without dedup
+    group_sizes = np.bincount(dedup["representative_of"], minlength=len(representatives))
+    labels = cluster_embeddings(embeddings, sample_weight=group_sizes)
+    labels, outlier_rows = _bound_group_sizes(embeddings, labels, representatives)
+    print(f"Clustering completed in {time.time() - start_time:.2f}s")
+
+    # Group controls by cluster label: representatives go into prompts, every original
+    # control (duplicates included) into mapped_controls
+    clusters = defaultdict(list)
+    members = defaultdict(list)
+    for position, label in enumerate(labels):
+        if label != -1:
+            clusters[label].append(representatives[position])
+            members[label].extend(duplicates[position])
+
+    # Outlier groups: (unified control id, representatives, all members)
+    outlier_groups = [
+        (uc_id, [representatives[p] for p in rows], [c for p in rows for c in duplicates[p]])
+        for uc_id, rows in zip(_outlier_group_ids(len(outlier_rows)), outlier_rows)
+    ]
+
+    yield {
+        "event": "clustering",
+        "organization_analysis": org_analysis,
+        "deduplication": dedup["stats"],
+        "total_clusters": len(clusters) + len(outlier_groups),
+        "clusters": [
+            {"unified_control_id": _cluster_id(cluster_id),
+             "control_ids": [c["control_id"] for c in members[cluster_id]]}
+            for cluster_id in clusters
+        ],
+        "outlier_groups": [
+            {"unified_control_id": uc_id, "control_ids": [c["control_id"] for c in group_members]}
+            for uc_id, _, group_members in outlier_groups
+        ],
+        "outlier_control_ids": [c["control_id"] for _, _, group_members in outlier_groups for c in group_members],
+        "elapsed_seconds": round(time.time() - start_time, 3)
+    }
+
+    # Step 5: Summarization (LLM or Fast Mode). Clusters and outlier groups are the same kind
+    # of work item: (unified control id, prompt controls, mapped controls, is_clustered)
+    work_items = [(_cluster_id(cluster_id), group, members[cluster_id], True) for cluster_id, group in clusters.items()]
+    work_items += [(uc_id, group, group_members, False) for uc_id, group, group_members in outlier_groups]
+    unified_results = []
+    
+    if fast_mode:
+        # FAST MODE: No LLM calls, instant results
+        for uc_id, _, group_members, is_clustered in work_items:
+            summary = _generate_fast_summary(group_members, org_context)
+            unified_results.append(_unified_control(uc_id, summary, group_members, is_clustered, True, org_context))
+            yield {"event": "unified_control", "unified_control": unified_results[-1]}
+    elif work_items:
+        # NORMAL MODE: Concurrent LLM processing with context; outlier groups share the client with
+        # clusters, so batch latency is bounded by the slowest group rather than clusters-then-outliers
+        if not clusters:
+            print("No clusters found - all controls are unique/outliers")
+        # Summaries are keyed by work-item position (also the group id in packed prompts), so
+        # each result is matched to its own members. Emit results in completion order
+        for position, summary in iter_group_summaries(
+                [(position, group, is_clustered) for position, (_, group, _, is_clustered) in enumerate(work_items)],
+                org_context):
+            uc_id, _, group_members, is_clustered = work_items[position]
+            unified_results.append(_unified_control(uc_id, summary, group_members, is_clustered, False, org_context))
+            yield {"event": "unified_control", "unified_control": unified_results[-1]}
+
+    print(f"Total harmonization completed in {time.time() - start_time:.2f}s")
+
+    state_id = None
+    if persist_state:
+        from services.harmonization_state import create_state
+        # The state tracks every original control, so expand back from the representatives
+        representative_of = dedup["representative_of"]
+        state_id = create_state(unified_results, controls, embeddings[representative_of], labels[representative_of],
+                                org_context, org_analysis).state_id
+
+    yield {
+        "event": "summary",
+        "total_clusters": len(unified_results),
+        "controls_processed": len(controls),
+        "deduplication": dedup["stats"],
+        "processing_time": time.time() - start_time,
+        "state_id": state_id
+    }
+
+def batch_harmonize_from_input(controls: List[Dict], fast_mode: bool = False, org_context: Optional[Dict] = None,
+                               persist_state: bool = False,
+                               on_event: Optional[Callable[[Dict], None]] = None,
+                               embeddings: Optional[np.ndarray] = None) -> Dict:
     """
     Harmonize a batch of controls by:
+    0. Collapsing duplicate descriptions (each is embedded and prompted once)
     1. Embedding control descriptions
-    2. Clustering them using DBSCAN (semantic similarity)
+    2. Clustering them using DBSCAN over a sparse neighbour graph (semantic similarity)
     3. Summarizing each cluster with LLM (semantic meaning) - PARALLEL
-    4. Summarizing unclustered controls with LLM (semantic meaning)
+    4. Summarizing unclustered controls with LLM (semantic meaning), in the same pool
     5. Analyzing organization context and providing insights
 
     Args:
@@ -144,132 +446,65 @@ def batch_harmonize_from_input(controls: List[Dict], fast_mode: bool = False, or
                            - existing_controls: List[str] (list of existing control descriptions)
                            - risk_profile: str (e.g., "high", "medium", "low")
                            - compliance_frameworks: List[str] (e.g., ["PCI", "SOX"])
+        persist_state (bool): If True, save the clusters, centroids and summaries as a harmonization
+                              state so later controls can be added with incremental_harmonize
+        on_event (Callable): Called with each iter_batch_harmonize event as it happens (progress
+                             reporting); an exception raised here aborts the run
+        embeddings (np.ndarray): Normalized embeddings of the controls' descriptions (one row per
+                                 control, float32 or QuantizedEmbeddings) if they were computed
+                                 already; embedded here otherwise. Held in EMBEDDING_STORAGE_DTYPE
 
     Returns:
-        List[Dict]: List of unified controls with summaries and source mappings
+        Dict: unified controls with summaries and source mappings, organization analysis,
+              deduplication stats, total_clusters, processing_time (and state_id when
+              persist_state is set)
     """
-    start_time = time.time()
-    
-    # Step 1: Analyze organization context
-    org_analysis = _analyze_org_context(controls, org_context)
-    print(f"Context analysis completed in {time.time() - start_time:.2f}s")
-    
-    # Step 2: Embedding (fast)
-    descriptions = [c["description"] for c in controls]
-    embeddings = model.encode(descriptions)
-    print(f"Embedding completed in {time.time() - start_time:.2f}s")
-
-    # Step 3: Clustering (fast)
-    clustering = DBSCAN(eps=0.4, min_samples=2, metric="cosine").fit(embeddings)
-    labels = clustering.labels_
-    print(f"Clustering completed in {time.time() - start_time:.2f}s")
-
-    # Group controls by cluster label
-    clusters = defaultdict(list)
-    for idx, label in enumerate(labels):
-        if label != -1:
-            clusters[label].append(controls[idx])
-
-    # Collect outlier controls (label -1)
-    outliers = [controls[idx] for idx, label in enumerate(labels) if label == -1]
-
-    # Step 4: Summarization (LLM or Fast Mode)
+    org_analysis = None
     unified_results = []
-    
-    if fast_mode:
-        # FAST MODE: No LLM calls, instant results
-        for cluster_id, group in clusters.items():
-            summary = _generate_fast_summary(group, org_context)
-            unified_results.append({
-                "unified_control_id": f"UC-{cluster_id:03}",
-                "title": summary["title"],
-                "description": summary["description"],
-                "implementation_steps": summary["implementation_steps"],
-                "mapped_controls": group,
-                "is_clustered": True,
-                "fast_mode": True,
-                "org_context_applied": org_context is not None
-            })
-        
-        # Handle outliers in fast mode
-        if outliers:
-            outlier_summary = _generate_fast_summary(outliers, org_context)
-            unified_results.append({
-                "unified_control_id": "UC-999",
-                "title": outlier_summary["title"],
-                "description": outlier_summary["description"],
-                "implementation_steps": outlier_summary["implementation_steps"],
-                "mapped_controls": outliers,
-                "is_clustered": False,
-                "fast_mode": True,
-                "org_context_applied": org_context is not None
-            })
-    else:
-        # NORMAL MODE: Parallel LLM processing with context
-        if clusters:
-            # Ensure max_workers is at least 1 to avoid ThreadPoolExecutor error
-            max_workers = max(1, min(len(clusters), 4))
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all cluster summarization tasks with context
-                future_to_cluster = {
-                    executor.submit(summarize_controls, group, org_context): cluster_id 
-                    for cluster_id, group in clusters.items()
-                }
-                
-                # Collect results as they complete
-                for future in future_to_cluster:
-                    cluster_id = future_to_cluster[future]
-                    try:
-                        summary = future.result()
-                        unified_results.append({
-                            "unified_control_id": f"UC-{cluster_id:03}",
-                            "title": summary["title"],
-                            "description": summary["description"],
-                            "implementation_steps": summary["implementation_steps"],
-                            "mapped_controls": clusters[cluster_id],
-                            "is_clustered": True,
-                            "fast_mode": False,
-                            "org_context_applied": org_context is not None
-                        })
-                    except Exception as e:
-                        print(f"Error processing cluster {cluster_id}: {e}")
-                        # Fallback: create basic summary without LLM
-                        unified_results.append({
-                            "unified_control_id": f"UC-{cluster_id:03}",
-                            "title": f"Cluster {cluster_id} Controls",
-                            "description": f"Group of {len(clusters[cluster_id])} similar controls",
-                            "implementation_steps": [],
-                            "mapped_controls": clusters[cluster_id],
-                            "is_clustered": True,
-                            "fast_mode": False,
-                            "org_context_applied": org_context is not None
-                        })
-        else:
-            # No clusters found - all controls are outliers
-            print("No clusters found - all controls are unique/outliers")
+    with closing(iter_batch_harmonize(controls, fast_mode, org_context, persist_state, embeddings)) as events:
+        for event in events:
+            if on_event:
+                on_event(event)
+            if event["event"] == "clustering":
+                org_analysis = event["organization_analysis"]
+                # Report unified controls in cluster order (outlier group last), not completion order
+                order = {c["unified_control_id"]: i
+                         for i, c in enumerate(event["clusters"] + event["outlier_groups"])}
+            elif event["event"] == "unified_control":
+                unified_results.append(event["unified_control"])
+            else:
+                summary = event
 
-        # Handle unclustered controls
-        if outliers:
-            outlier_summary = summarize_controls(outliers, org_context)
-            unified_results.append({
-                "unified_control_id": "UC-999",
-                "title": outlier_summary["title"] or "Other Controls: Unique or Unclustered",
-                "description": outlier_summary["description"] or (
-                    "These controls did not match any cluster, but remain valuable and are summarized here for review."
-                ),
-                "implementation_steps": outlier_summary["implementation_steps"] or [],
-                "mapped_controls": outliers,
-                "is_clustered": False,
-                "fast_mode": False,
-                "org_context_applied": org_context is not None
-            })
+    unified_results.sort(key=lambda uc: order.get(uc["unified_control_id"], len(order)))
 
-    print(f"Total harmonization completed in {time.time() - start_time:.2f}s")
-    
     # Return results with organization context analysis
-    return {
+    result = {
         "unified_controls": unified_results,
         "organization_analysis": org_analysis,
+        "deduplication": summary["deduplication"],
         "total_clusters": len(unified_results),
-        "processing_time": time.time() - start_time
+        "processing_time": summary["processing_time"]
+    }
+    if summary["state_id"]:
+        result["state_id"] = summary["state_id"]
+    return result
+
+def batch_response(result: Dict, controls_processed: int, fast_mode: bool, org_context: Optional[Dict],
+                   start_time: float) -> Dict:
+    """The /batch-harmonize response for a batch_harmonize_from_input result (run started at start_time)"""
+    processing_time = time.time() - start_time
+    return {
+        "state_id": result.get("state_id"),
+        "unified_controls": result["unified_controls"],
+        "total_clusters": result["total_clusters"],
+        "organization_analysis": result["organization_analysis"],
+        "deduplication": result["deduplication"],
+        "performance": {
+            "processing_time_seconds": round(processing_time, 3),
+            "controls_processed": controls_processed,
+            "fast_mode": fast_mode,
+            "clusters_generated": result["total_clusters"],
+            "org_context_applied": org_context is not None
+        },
+        "org_context": org_context
     }
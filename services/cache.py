@@ -0,0 +1,87 @@
+"""
+Bounded in-memory caches
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+def _sizeof(value: Any) -> int:
+    """Resident size of a cached value (numpy arrays report their buffer size)"""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    return len(value) if isinstance(value, (bytes, str)) else 0
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and resident bytes
+
+    max_entries=0 disables caching (nothing is stored); max_bytes=0 means no byte limit.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value (marking it most recently used) or None"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Insert a value, evicting least recently used entries to stay within bounds"""
+        size = _sizeof(value)
+        if self.max_entries <= 0 or (self.max_bytes and size > self.max_bytes):
+            return
+
+        with self._lock:
+            if key in self._data:
+                self.resident_bytes -= self._sizes[key]
+                self._data.move_to_end(key)
+            self._data[key] = value
+            self._sizes[key] = size
+            self.resident_bytes += size
+
+            while len(self._data) > self.max_entries or (self.max_bytes and self.resident_bytes > self.max_bytes):
+                evicted_key, _ = self._data.popitem(last=False)
+                self.resident_bytes -= self._sizes.pop(evicted_key)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.resident_bytes = 0
+
+    def stats(self) -> Dict:
+        """Size, bounds and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "cache_size": len(self._data),
+            "max_entries": self.max_entries,
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,268 @@
+"""
+Precomputed embedding index for the known-control catalog
+
+The catalog is embedded once and the vectors are stored on disk next to the control
+metadata, keyed by a content hash of the catalog file and the embedding model name.
+Later loads reuse the stored vectors and only re-embed when the catalog changes.
+"""
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.config import config
+from services.embedding import get_embeddings
+from services.vector_index import ExactIndex, create_search_index, top_k
+from services.quantization import quantize
+
+class CatalogIndex:
+    """Known controls together with their normalized description embeddings"""
+
+    def __init__(self, controls: List[Dict], embeddings: np.ndarray, catalog_hash: str, model_name: str):
+        self.controls = controls
+        self.embeddings = embeddings
+        self.catalog_hash = catalog_hash
+        self.model_name = model_name
+        self._search_index = None
+        self._exact_index = None
+        self._partitions = None
+        self._partition_indexes: Dict[Tuple[str, bool], object] = {}
+        self._partition_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.controls)
+
+    @property
+    def descriptions(self) -> List[str]:
+        return [c["description"] for c in self.controls]
+
+    @property
+    def search_index(self):
+        """Configured search backend over the catalog, built on first use"""
+        if self._search_index is None:
+            self._search_index = create_search_index(self.embeddings)
+        return self._search_index
+
+    @property
+    def exact_index(self) -> ExactIndex:
+        if self._exact_index is None:
+            self._exact_index = ExactIndex(self.embeddings)
+        return self._exact_index
+
+    def _get_partitions(self) -> Dict[str, Tuple[List[str], np.ndarray]]:
+        """Per-framework (sorted control ids, matching catalog rows), built on first use"""
+        if self._partitions is None:
+            rows_by_framework = defaultdict(list)
+            for row, control in enumerate(self.controls):
+                rows_by_framework[_framework_key(control["framework"])].append(row)
+
+            partitions = {}
+            for framework, rows in rows_by_framework.items():
+                rows.sort(key=lambda row: str(self.controls[row]["control_id"]))
+                partitions[framework] = ([str(self.controls[row]["control_id"]) for row in rows], np.array(rows))
+            self._partitions = partitions
+        return self._partitions
+
+    def _partition_index(self, framework: str, exact: bool):
+        """Search backend over one framework's vectors, built on first use"""
+        key = (framework, exact)
+        index = self._partition_indexes.get(key)
+        if index is None:
+            with self._partition_lock:
+                index = self._partition_indexes.get(key)
+                if index is None:
+                    rows = self._get_partitions()[framework][1]
+                    vectors = self.embeddings[rows]
+                    index = ExactIndex(vectors) if exact else create_search_index(vectors)
+                    self._partition_indexes[key] = index
+        return index
+
+    def scoped_index(self, frameworks: Optional[List[str]] = None, control_id_prefix: Optional[str] = None,
+                     exact: bool = False):
+        """Search index restricted to some frameworks and/or a control-id prefix
+
+        Framework filters search only the per-framework partitions; a control-id prefix
+        is resolved to a contiguous range of each partition's sorted ids, and only those
+        vectors are scored. Returned indices are always catalog rows.
+        """
+        if not frameworks and not control_id_prefix:
+            return self.exact_index if exact else self.search_index
+
+        partitions = self._get_partitions()
+        selected = [_framework_key(f) for f in frameworks] if frameworks else list(partitions)
+        parts = []
+        for framework in dict.fromkeys(selected):
+            if framework not in partitions:
+                continue
+            sorted_ids, rows = partitions[framework]
+            if control_id_prefix:
+                start = bisect.bisect_left(sorted_ids, control_id_prefix)
+                end = bisect.bisect_left(sorted_ids, control_id_prefix + "\U0010ffff")
+                if start == end:
+                    continue
+                subset = rows[start:end]
+                parts.append((subset, ExactIndex(self.embeddings[subset])))
+            else:
+                parts.append((rows, self._partition_index(framework, exact)))
+        return _ScopedIndex(parts)
+
+    def save(self, index_dir: str):
+        """Write vectors and metadata to index_dir (atomically, so concurrent loaders never see partial files)"""
+        os.makedirs(index_dir, exist_ok=True)
+        vectors_path, meta_path = _index_paths(index_dir, self.model_name, self.catalog_hash)
+
+        tmp_vectors = f"{vectors_path}.{os.getpid()}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, self.embeddings)
+        os.replace(tmp_vectors, vectors_path)
+
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                "catalog_hash": self.catalog_hash,
+                "model_name": self.model_name,
+                "controls": self.controls
+            }, f)
+        os.replace(tmp_meta, meta_path)
+        _remove_superseded(index_dir, self.model_name, self.catalog_hash)
+
+    @classmethod
+    def load(cls, index_dir: str, model_name: str, catalog_hash: str) -> Optional["CatalogIndex"]:
+        """Load a stored index, or return None if none exists for this catalog hash and model"""
+        vectors_path, meta_path = _index_paths(index_dir, model_name, catalog_hash)
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            embeddings = np.load(vectors_path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable catalog index {vectors_path}: {e}")
+            return None
+
+        if len(meta["controls"]) != embeddings.shape[0]:
+            print(f"Ignoring inconsistent catalog index {vectors_path}")
+            return None
+
+        return cls(meta["controls"], embeddings, catalog_hash, model_name)
+
+def _framework_key(framework: str) -> str:
+    return str(framework).strip().casefold()
+
+class _ScopedIndex:
+    """Searches several catalog partitions and merges their hits into catalog rows"""
+
+    name = "scoped"
+
+    def __init__(self, parts: List[Tuple[np.ndarray, object]]):
+        self.parts = parts
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        all_rows, all_scores = [], []
+        for rows, index in self.parts:
+            local, scores = index.search(query, k)
+            all_rows.append(rows[local])
+            all_scores.append(scores)
+        if not all_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows, scores = np.concatenate(all_rows), np.concatenate(all_scores)
+        best, best_scores = top_k(scores, k)
+        return rows[best], best_scores
+
+def _index_paths(index_dir: str, model_name: str, catalog_hash: str):
+    """Return (vectors_path, metadata_path) for a model and catalog hash"""
+    safe_model = model_name.replace("/", "_")
+    base = os.path.join(index_dir, f"catalog_{safe_model}_{catalog_hash[:16]}")
+    return f"{base}.npy", f"{base}.json"
+
+def _remove_superseded(index_dir: str, model_name: str, catalog_hash: str):
+    """Delete stored indexes for the same model built from an older catalog"""
+    current = {os.path.basename(path) for path in _index_paths(index_dir, model_name, catalog_hash)}
+    # Exact match on the model part, so "model" does not match files of "model_variant"
+    pattern = re.compile(rf"catalog_{re.escape(model_name.replace('/', '_'))}_[0-9a-f]{{16}}\.(npy|json)")
+    for name in os.listdir(index_dir):
+        if name in current or not pattern.fullmatch(name):
+            continue
+        try:
+            os.remove(os.path.join(index_dir, name))
+            print(f"Removed superseded catalog index {name}")
+        except OSError as e:
+            # Another process may have removed it first
+            print(f"Could not remove superseded catalog index {name}: {e}")
+
+def build_catalog_index(catalog_path: Optional[str] = None, index_dir: Optional[str] = None) -> CatalogIndex:
+    """Load the stored index for the catalog, embedding and saving it first if the catalog changed"""
+    catalog_path = catalog_path or config.catalog_path
+    index_dir = index_dir or config.index_dir
+    model_name = config.embedding_model_key
+
+    with open(catalog_path, "rb") as f:
+        raw = f.read()
+    catalog_hash = hashlib.sha256(raw).hexdigest()
+
+    index = CatalogIndex.load(index_dir, model_name, catalog_hash)
+    if index is None:
+        start_time = time.time()
+        controls = json.loads(raw.decode("utf-8"))
+        embeddings = get_embeddings([c["description"] for c in controls])
+        index = CatalogIndex(controls, embeddings, catalog_hash, model_name)
+        index.save(index_dir)
+        print(f"Catalog index built for {len(controls)} controls in {time.time() - start_time:.2f}s")
+
+    # Vectors are stored on disk as float32 and compacted in memory if configured
+    index.embeddings = quantize(index.embeddings, config.embedding_storage_dtype)
+    return index
+
+# Process-wide index, refreshed only when the catalog file changes on disk
+_catalog_index: Optional[CatalogIndex] = None
+_catalog_stamp = None
+_index_lock = threading.Lock()
+
+def _file_stamp(path: str):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+def load_catalog_index(catalog_path: Optional[str] = None) -> CatalogIndex:
+    """Load (or build) the catalog index and install it as the process-wide index"""
+    global _catalog_index, _catalog_stamp
+    catalog_path = catalog_path or config.catalog_path
+    with _index_lock:
+        stamp = _file_stamp(catalog_path)
+        index = build_catalog_index(catalog_path)
+        index.search_index  # build the ANN structure before serving queries
+        _catalog_index, _catalog_stamp = index, stamp
+        return index
+
+def get_catalog_index(catalog_path: Optional[str] = None) -> CatalogIndex:
+    """Return the process-wide catalog index, reloading it if the catalog file changed"""
+    catalog_path = catalog_path or config.catalog_path
+    if _catalog_index is not None and _catalog_stamp == _file_stamp(catalog_path):
+        return _catalog_index
+    return load_catalog_index(catalog_path)
+
+def get_index_stats() -> Dict:
+    """Get catalog index statistics"""
+    if _catalog_index is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "controls": len(_catalog_index),
+        "dimensions": int(_catalog_index.embeddings.shape[1]) if len(_catalog_index) else 0,
+        "catalog_hash": _catalog_index.catalog_hash[:16],
+        "model_name": _catalog_index.model_name,
+        "storage_dtype": config.embedding_storage_dtype,
+        "embedding_bytes": int(_catalog_index.embeddings.nbytes),
+        "search_backend": _catalog_index.search_index.name,
+        "frameworks": {
+            framework: len(rows) for framework, (_, rows) in _catalog_index._get_partitions().items()
+        }
+    }
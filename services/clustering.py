@@ -0,0 +1,148 @@
+"""
+Clustering engine for batch harmonization
+
+- exact: DBSCAN with the cosine metric on the raw vectors (brute-force pairwise
+  distances; quadratic time and memory) - the reference mode
+- sparse: DBSCAN on a precomputed sparse radius-neighbour graph built from normalized
+  vectors. Below CLUSTERING_IVF_MIN_SIZE the graph is exact: every pair is still scored
+  (quadratic time), but in chunks, so memory is bounded by chunk size x batch size plus
+  the graph. From that size on, candidate neighbours come from IVF partitions, so each
+  vector is only compared with its n_probe nearest lists (about n_probe / n_lists of the
+  pairs). The default threshold is the measured break-even point: below it, the all-pairs
+  matrix products are faster than training the IVF lists.
+
+DBSCAN can chain many controls into one very large cluster. split_oversized_groups
+recursively splits groups over a member or weight (prompt token) budget with spherical
+k-means, so every group stays small enough for one bounded LLM call.
+"""
+import math
+from typing import List, Optional, Union
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import DBSCAN
+
+from services.config import config
+from services.quantization import QuantizedEmbeddings, as_float32
+from services.vector_index import IVFIndex, nearest_centroid, spherical_kmeans, top_k
+
+# Distances of exactly 0 would be dropped from the sparse graph; keep duplicates as neighbours
+_MIN_DISTANCE = 1e-12
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1.0)
+
+def _to_graph(n: int, rows: list, cols: list, distances: list) -> sparse.csr_matrix:
+    if rows:
+        rows, cols, distances = np.concatenate(rows), np.concatenate(cols), np.concatenate(distances)
+    else:
+        rows = cols = np.zeros(0, dtype=np.int64)
+        distances = np.zeros(0, dtype=np.float32)
+    return sparse.csr_matrix((np.maximum(distances, _MIN_DISTANCE), (rows, cols)), shape=(n, n))
+
+def radius_graph_exact(vectors: Union[np.ndarray, QuantizedEmbeddings], eps: float,
+                       chunk_size: int = 512) -> sparse.csr_matrix:
+    """Sparse graph of all pairs with cosine distance <= eps, computed chunk by chunk
+
+    Scores all n^2 pairs; peak memory is one chunk_size x n distance block plus the graph.
+    """
+    n = vectors.shape[0]
+    rows, cols, distances = [], [], []
+    for start in range(0, n, chunk_size):
+        block = as_float32(vectors[start:start + chunk_size])
+        block_distances = 1.0 - (vectors @ block.T).T
+        block_rows, block_cols = np.nonzero(block_distances <= eps)
+        rows.append(block_rows + start)
+        cols.append(block_cols)
+        distances.append(block_distances[block_rows, block_cols])
+    return _to_graph(n, rows, cols, distances)
+
+def radius_graph_ivf(vectors: Union[np.ndarray, QuantizedEmbeddings], eps: float,
+                     index: Optional[IVFIndex] = None) -> sparse.csr_matrix:
+    """Approximate radius graph: each IVF list is compared only with its n_probe nearest lists"""
+    index = index or IVFIndex(vectors, n_lists=config.ivf_lists, n_probe=config.ivf_probe)
+    n = vectors.shape[0]
+    rows, cols, distances = [], [], []
+    for list_id in range(index.n_lists):
+        members = index.members(list_id)
+        if len(members) == 0:
+            continue
+        probe_lists, _ = top_k(index.centroids @ index.centroids[list_id], index.n_probe)
+        candidates = np.concatenate([index.members(i) for i in probe_lists])
+
+        block_distances = 1.0 - (vectors[candidates] @ as_float32(vectors[members]).T).T
+        block_rows, block_cols = np.nonzero(block_distances <= eps)
+        rows.append(members[block_rows])
+        cols.append(candidates[block_cols])
+        distances.append(block_distances[block_rows, block_cols])
+
+    graph = _to_graph(n, rows, cols, distances)
+    # Neighbourhoods are symmetric; keep an edge found from either side
+    return graph.maximum(graph.T).tocsr()
+
+def cluster_embeddings(embeddings: Union[np.ndarray, QuantizedEmbeddings], eps: Optional[float] = None,
+                       min_samples: Optional[int] = None, mode: Optional[str] = None,
+                       sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cluster embeddings with DBSCAN (cosine distance); returns labels, -1 for outliers
+
+    sample_weight counts each row as that many points towards min_samples, e.g. the number
+    of duplicate controls a deduplicated representative stands for.
+    """
+    eps = config.clustering_eps if eps is None else eps
+    min_samples = config.clustering_min_samples if min_samples is None else min_samples
+    mode = mode or config.clustering_mode
+
+    if embeddings.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+    if mode == "exact":
+        return DBSCAN(eps=eps, min_samples=min_samples, metric="cosine").fit(
+            as_float32(embeddings), sample_weight=sample_weight).labels_
+    if mode != "sparse":
+        raise ValueError(f"Unknown clustering mode: {mode}")
+
+    vectors = embeddings if isinstance(embeddings, QuantizedEmbeddings) else _normalize(
+        np.asarray(embeddings, dtype=np.float32))
+    if vectors.shape[0] < config.clustering_ivf_min_size:
+        graph = radius_graph_exact(vectors, eps)
+    else:
+        graph = radius_graph_ivf(vectors, eps)
+    return DBSCAN(eps=eps, min_samples=min_samples, metric="precomputed").fit(graph, sample_weight=sample_weight).labels_
+
+def split_oversized_groups(vectors: Union[np.ndarray, QuantizedEmbeddings], groups: List[np.ndarray],
+                           max_members: int = 0, max_weight: float = 0.0, weights: Optional[np.ndarray] = None,
+                           seed: int = 0) -> List[np.ndarray]:
+    """Recursively split groups (arrays of row indices) until each fits the budgets
+
+    A group over max_members rows, or whose summed weights exceed max_weight, is split into
+    k = ceil(size / budget) sub-groups by spherical k-means on its (normalized) vectors; sub-groups
+    still over budget are split again. A single row over the weight budget is kept as is.
+    A budget of 0 means no limit. Sub-groups replace their parent in place, in order.
+    """
+    weights = np.ones(vectors.shape[0], dtype=np.float64) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    def overshoot(group: np.ndarray) -> float:
+        ratios = [1.0]
+        if max_members > 0:
+            ratios.append(len(group) / max_members)
+        if max_weight > 0:
+            ratios.append(float(weights[group].sum()) / max_weight)
+        return max(ratios)
+
+    bounded = []
+    pending = list(reversed([np.asarray(group) for group in groups]))
+    while pending:
+        group = pending.pop()
+        if len(group) <= 1 or overshoot(group) <= 1.0:
+            bounded.append(group)
+            continue
+
+        k = min(len(group), max(2, math.ceil(overshoot(group))))
+        group_vectors = _normalize(as_float32(vectors[group]))
+        assignments = nearest_centroid(group_vectors, spherical_kmeans(group_vectors, k, n_iter=10, seed=seed))
+        parts = [group[assignments == i] for i in range(k) if np.any(assignments == i)]
+        if len(parts) < 2:
+            # Indistinguishable vectors: fall back to equal slices
+            parts = [part for part in np.array_split(group, k) if len(part)]
+        pending.extend(reversed(parts))
+    return bounded
@@ -0,0 +1,114 @@
+"""
+Micro-batching coalescer for query embeddings
+
+Concurrent callers each submit one text; a background thread collects the texts that
+arrive within a short window (or until the batch is full), encodes them in one model
+call and hands each caller its own vector. A caller waits at most timeout_seconds for
+its batch; after that it encodes its text directly, so a stalled batch never blocks a query.
+"""
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List
+
+import numpy as np
+
+class EmbeddingCoalescer:
+    """Gathers concurrent single-text encode requests into batched encode calls"""
+
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray], window_ms: float = 5.0,
+                 max_batch_size: int = 32, timeout_seconds: float = 5.0):
+        self.encode_batch = encode_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.timeout = timeout_seconds
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self._recent_delays = deque(maxlen=1000)
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode one text, sharing a model call with other concurrent callers"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Still queued: withdraw it so the worker skips it. Already encoding: let it finish unused
+            future.cancel()
+            with self._stats_lock:
+                self.fallbacks += 1
+            print(f"Query batch not ready after {self.timeout:.1f}s; encoding directly")
+            return self.encode_batch([text])[0]
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-coalescer", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop requests whose callers gave up waiting; the rest can no longer be cancelled
+            batch = [item for item in self._collect_batch() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = self.encode_batch(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            self._record(batch, started)
+
+    def _record(self, batch: list, started: float):
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_sizes[len(batch)] += 1
+            self._recent_delays.extend(started - enqueued for _, _, enqueued in batch)
+
+    def stats(self) -> Dict:
+        """Batch size distribution and the queueing delay added before encoding"""
+        with self._stats_lock:
+            delays_ms = np.array(self._recent_delays) * 1000
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "requests": self.requests,
+                "batches": self.batches,
+                "fallbacks": self.fallbacks,
+                "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "batch_size_distribution": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "queue_delay_ms_p50": round(float(np.percentile(delays_ms, 50)), 3) if len(delays_ms) else 0.0,
+                "queue_delay_ms_p95": round(float(np.percentile(delays_ms, 95)), 3) if len(delays_ms) else 0.0,
+                "queue_delay_ms_max": round(float(delays_ms.max()), 3) if len(delays_ms) else 0.0
+            }
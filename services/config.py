@@ -8,14 +8,80 @@ class HarmonizationConfig:
     """Configuration for harmonization performance and behavior"""
     
     def __init__(self):
+        # Embedding model
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" or "onnx"
+        self.onnx_quantize = os.getenv("ONNX_QUANTIZE", "false").lower() == "true"
+        self.onnx_model_dir = os.getenv("ONNX_MODEL_DIR", "data/onnx")
+        self.warm_up_on_startup = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+        
+        # Known-control catalog and its precomputed embedding index
+        self.catalog_path = os.getenv("CATALOG_PATH", "data/known_control.json")
+        self.index_dir = os.getenv("INDEX_DIR", "data/index")
+        
+        # Nearest-neighbour search over the catalog index ("exact" or "ivf")
+        self.search_backend = os.getenv("SEARCH_BACKEND", "ivf")
+        self.ann_min_catalog_size = int(os.getenv("ANN_MIN_CATALOG_SIZE", "5000"))
+        self.ivf_lists = int(os.getenv("IVF_LISTS", "0"))  # 0 = sqrt(catalog size)
+        self.ivf_probe = int(os.getenv("IVF_PROBE", "16"))
+        
         # Clustering parameters
         self.clustering_eps = float(os.getenv("CLUSTERING_EPS", "0.4"))
         self.clustering_min_samples = int(os.getenv("CLUSTERING_MIN_SAMPLES", "2"))
+        self.clustering_mode = os.getenv("CLUSTERING_MODE", "sparse")  # "sparse" or "exact" (reference)
+        # Sparse mode scores all pairs (quadratic time) below this batch size, IVF candidates from it on
+        self.clustering_ivf_min_size = int(os.getenv("CLUSTERING_IVF_MIN_SIZE", "5000"))
+        
+        # Upper bounds on one summarization group (larger clusters and the outlier pool are split; 0 = no limit)
+        self.max_cluster_members = int(os.getenv("MAX_CLUSTER_MEMBERS", "30"))
+        self.max_cluster_tokens = int(os.getenv("MAX_CLUSTER_TOKENS", "2000"))  # estimated prompt tokens
+        # Unclustered controls: "chunked" (bounded groups of similar outliers) or "per_control"
+        self.outlier_summary_mode = os.getenv("OUTLIER_SUMMARY_MODE", "chunked")
+        
+        # Overlap detection against an organization's existing controls (embedding cosine similarity)
+        self.org_overlap_threshold = float(os.getenv("ORG_OVERLAP_THRESHOLD", "0.6"))
+        self.org_overlap_top_k = int(os.getenv("ORG_OVERLAP_TOP_K", "5"))  # new controls per existing control
+        
+        # Duplicate elimination before embedding: "off", "exact" (normalized text) or "near" (plus MinHash)
+        self.dedup_mode = os.getenv("DEDUP_MODE", "exact")
+        self.dedup_near_threshold = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0.9"))
+        
+        self.state_dir = os.getenv("STATE_DIR", "data/state")  # persisted harmonization states
+        
+        # Background batch harmonization jobs
+        self.job_store_path = os.getenv("JOB_STORE_PATH", "data/jobs.sqlite3")
+        self.job_workers = int(os.getenv("JOB_WORKERS", "1"))  # concurrent jobs per process
         
         # LLM settings
         self.llm_model = os.getenv("LLM_MODEL", "llama2")
         self.llm_temperature = float(os.getenv("LLM_TEMPERATURE", "0.3"))
         self.llm_host = os.getenv("LLM_HOST", "http://localhost:11434")
+        self.llm_backend = os.getenv("LLM_BACKEND", "ollama")  # "ollama" or "fake" (in-process simulator)
+        # Process-wide cap on in-flight generations (also the HTTP connection pool size)
+        self.llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", os.getenv("MAX_WORKERS", "4")))
+        self.llm_timeout_seconds = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))  # per generation
+        # Constrain summaries to a JSON schema (Ollama structured outputs); invalid replies are re-prompted
+        self.llm_structured_output = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+        self.llm_json_retries = int(os.getenv("LLM_JSON_RETRIES", "1"))
+        # Pack several small groups into one summarization prompt (budget covers prompt and replies)
+        self.enable_prompt_packing = os.getenv("ENABLE_PROMPT_PACKING", "false").lower() == "true"
+        self.packed_prompt_max_tokens = int(os.getenv("PACKED_PROMPT_MAX_TOKENS", "2000"))
+        self.packed_prompt_max_groups = int(os.getenv("PACKED_PROMPT_MAX_GROUPS", "8"))
+        
+        # Simulated LLM for LLM_BACKEND=fake: log-normal base latency plus token-rate costs, and fault rates
+        self.fake_llm_latency_seconds = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.5"))
+        self.fake_llm_latency_sigma = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+        self.fake_llm_prompt_tokens_per_second = float(os.getenv("FAKE_LLM_PROMPT_TOKENS_PER_SECOND", "1000"))
+        self.fake_llm_tokens_per_second = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "40"))
+        self.fake_llm_parallel = int(os.getenv("FAKE_LLM_PARALLEL", "4"))
+        self.fake_llm_malformed_rate = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0.0"))
+        self.fake_llm_failure_rate = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0.0"))
+        self.fake_llm_seed = int(os.getenv("FAKE_LLM_SEED", "0"))
+        
+        # Persistent cache of LLM summaries (content-addressed; 0 TTL = entries never expire)
+        self.enable_summary_cache = os.getenv("ENABLE_SUMMARY_CACHE", "true").lower() == "true"
+        self.summary_cache_path = os.getenv("SUMMARY_CACHE_PATH", "data/summaries.sqlite3")
+        self.summary_cache_ttl_seconds = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "0"))
         
         # Parallel processing
         self.max_workers = int(os.getenv("MAX_WORKERS", "4"))
@@ -23,7 +89,26 @@ class HarmonizationConfig:
         
         # Caching
         self.enable_embedding_cache = os.getenv("ENABLE_EMBEDDING_CACHE", "true").lower() == "true"
-        self.max_cache_size = int(os.getenv("MAX_CACHE_SIZE", "1000"))
+        self.max_cache_size = int(os.getenv("MAX_CACHE_SIZE", "1000"))  # 0 = no in-memory caching
+        self.max_cache_bytes = int(os.getenv("MAX_CACHE_BYTES", str(64 * 1024 * 1024)))  # 0 = no byte limit
+        # In-memory representation of catalog, cache and batch embeddings: "float32", "float16" or "int8"
+        self.embedding_storage_dtype = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+        self.enable_embedding_store = os.getenv("ENABLE_EMBEDDING_STORE", "true").lower() == "true"
+        self.embedding_store_path = os.getenv("EMBEDDING_STORE_PATH", "data/embeddings.sqlite3")
+        
+        # Multi-process encoding of large batches (ENCODE_WORKERS 0 = half the cores, at most 8)
+        self.parallel_encode_min_batch = int(os.getenv("PARALLEL_ENCODE_MIN_BATCH", "2048"))
+        self.encode_workers = int(os.getenv("ENCODE_WORKERS", "0"))
+        self.encode_chunk_size = int(os.getenv("ENCODE_CHUNK_SIZE", "256"))
+        
+        self.ingest_chunk_size = int(os.getenv("INGEST_CHUNK_SIZE", "1024"))  # rows embedded per upload chunk
+        
+        # Micro-batching of concurrent query embeddings
+        self.enable_query_batching = os.getenv("ENABLE_QUERY_BATCHING", "true").lower() == "true"
+        self.query_batch_window_ms = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+        self.query_batch_max_size = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+        # Longest a query waits for its batch before encoding on its own
+        self.query_batch_timeout_seconds = float(os.getenv("QUERY_BATCH_TIMEOUT_SECONDS", "5"))
         
         # Performance modes
         self.default_fast_mode = os.getenv("DEFAULT_FAST_MODE", "false").lower() == "true"
@@ -31,16 +116,55 @@ class HarmonizationConfig:
         # Text processing
         self.max_description_length = int(os.getenv("MAX_DESCRIPTION_LENGTH", "200"))
         
+    @property
+    def embedding_model_key(self) -> str:
+        """Identity of persisted embeddings; backend variants produce slightly different vectors"""
+        if self.embedding_backend == "torch":
+            return self.embedding_model
+        suffix = "-int8" if self.onnx_quantize else ""
+        return f"{self.embedding_model}+{self.embedding_backend}{suffix}"
+        
     def to_dict(self) -> Dict[str, Any]:
         """Convert config to dictionary for API responses"""
         return {
+            "embedding_model": self.embedding_model,
+            "embedding_backend": self.embedding_backend,
+            "onnx_quantize": self.onnx_quantize,
+            "catalog_path": self.catalog_path,
+            "search_backend": self.search_backend,
+            "ivf_probe": self.ivf_probe,
             "clustering_eps": self.clustering_eps,
             "clustering_min_samples": self.clustering_min_samples,
+            "clustering_mode": self.clustering_mode,
+            "clustering_ivf_min_size": self.clustering_ivf_min_size,
+            "max_cluster_members": self.max_cluster_members,
+            "max_cluster_tokens": self.max_cluster_tokens,
+            "outlier_summary_mode": self.outlier_summary_mode,
+            "org_overlap_threshold": self.org_overlap_threshold,
+            "dedup_mode": self.dedup_mode,
+            "job_workers": self.job_workers,
             "llm_model": self.llm_model,
+            "llm_backend": self.llm_backend,
             "llm_temperature": self.llm_temperature,
+            "llm_max_concurrency": self.llm_max_concurrency,
+            "llm_timeout_seconds": self.llm_timeout_seconds,
+            "llm_structured_output": self.llm_structured_output,
+            "llm_json_retries": self.llm_json_retries,
+            "enable_prompt_packing": self.enable_prompt_packing,
+            "packed_prompt_max_tokens": self.packed_prompt_max_tokens,
+            "enable_summary_cache": self.enable_summary_cache,
             "max_workers": self.max_workers,
             "enable_parallel": self.enable_parallel,
             "enable_embedding_cache": self.enable_embedding_cache,
+            "max_cache_size": self.max_cache_size,
+            "max_cache_bytes": self.max_cache_bytes,
+            "embedding_storage_dtype": self.embedding_storage_dtype,
+            "enable_embedding_store": self.enable_embedding_store,
+            "parallel_encode_min_batch": self.parallel_encode_min_batch,
+            "encode_workers": self.encode_workers,
+            "enable_query_batching": self.enable_query_batching,
+            "query_batch_window_ms": self.query_batch_window_ms,
+            "query_batch_timeout_seconds": self.query_batch_timeout_seconds,
             "default_fast_mode": self.default_fast_mode
         }
 
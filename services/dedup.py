@@ -0,0 +1,137 @@
+"""
+Duplicate control elimination ahead of embedding and summarization
+
+Descriptions are normalized (Unicode NFKC, case-folded, whitespace collapsed) and exact
+duplicates are collapsed by hash. Optionally, near-duplicates are found with MinHash
+signatures over word 3-gram shingles: LSH banding proposes candidate pairs, which are kept
+when their estimated Jaccard similarity reaches the threshold. Each group is represented
+by its first control; the caller embeds and prompts with representatives only and maps
+every original control back through the group.
+"""
+import hashlib
+import itertools
+import re
+import unicodedata
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+# Universal hashing modulo a prime just above 2^32; a < 2^31 keeps a * h + b inside uint64
+_PRIME = np.uint64((1 << 32) + 15)
+_ROWS_PER_BAND = 4
+_MAX_BUCKET_PAIRS_SIZE = 32
+
+def normalize_text(text: str) -> str:
+    """Canonical form used to detect duplicates: NFKC, case-folded, single-spaced"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+def _shingles(normalized: str, size: int = 3) -> np.ndarray:
+    words = normalized.split(" ")
+    grams = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+def minhash_signatures(texts: List[str], num_perm: int = 64, seed: int = 0) -> np.ndarray:
+    """MinHash signature (num_perm uint64 values) of each normalized text's word 3-grams"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        hashes = _shingles(text)
+        signatures[row] = ((np.outer(hashes, a) + b) % _PRIME).min(axis=0)
+    return signatures
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            # The earlier control stays the representative
+            self.parent[max(i, j)] = min(i, j)
+
+def _near_duplicate_pairs(signatures: np.ndarray, threshold: float):
+    """Candidate pairs from LSH bands, filtered by estimated Jaccard similarity"""
+    num_perm = signatures.shape[1]
+    seen = set()
+    for start in range(0, num_perm - _ROWS_PER_BAND + 1, _ROWS_PER_BAND):
+        buckets: Dict[bytes, List[int]] = {}
+        for row, band in enumerate(signatures[:, start:start + _ROWS_PER_BAND]):
+            buckets.setdefault(band.tobytes(), []).append(row)
+        for rows in buckets.values():
+            # Compare all pairs in small buckets; oversized buckets only against their first row
+            pairs = itertools.combinations(rows, 2) if len(rows) <= _MAX_BUCKET_PAIRS_SIZE else (
+                (rows[0], row) for row in rows[1:])
+            for pair in pairs:
+                if pair not in seen:
+                    seen.add(pair)
+                    if np.mean(signatures[pair[0]] == signatures[pair[1]]) >= threshold:
+                        yield pair
+
+def deduplicate_controls(controls: List[Dict], mode: str = "exact", threshold: float = 0.9,
+                         num_perm: int = 64) -> Dict:
+    """Group duplicate controls by description
+
+    Args:
+        controls: controls with a "description" key
+        mode: "off", "exact" (normalized text hash) or "near" (exact plus MinHash near-duplicates)
+        threshold: minimum estimated Jaccard similarity of near-duplicates
+
+    Returns:
+        Dict with "representatives" (index of the first control of each group),
+        "representative_of" (for every control, the position of its group in representatives)
+        and "stats" (duplicate counts and the embedding and prompt work saved)
+    """
+    if mode not in ("off", "exact", "near"):
+        raise ValueError(f"Unknown dedup mode: {mode}")
+    n = len(controls)
+    union = _UnionFind(n)
+    exact_duplicates = 0
+
+    if mode != "off":
+        normalized = [normalize_text(c["description"]) for c in controls]
+        first_by_hash: Dict[str, int] = {}
+        for i, text in enumerate(normalized):
+            key = hashlib.sha1(text.encode()).hexdigest()
+            if key in first_by_hash:
+                union.union(first_by_hash[key], i)
+                exact_duplicates += 1
+            else:
+                first_by_hash[key] = i
+
+        if mode == "near" and len(first_by_hash) > 1:
+            unique = sorted(first_by_hash.values())
+            signatures = minhash_signatures([normalized[i] for i in unique], num_perm)
+            for i, j in _near_duplicate_pairs(signatures, threshold):
+                union.union(unique[i], unique[j])
+
+    roots = [union.find(i) for i in range(n)]
+    representatives = sorted(set(roots))
+    position = {root: k for k, root in enumerate(representatives)}
+    representative_of = np.array([position[root] for root in roots], dtype=np.int64)
+
+    is_duplicate = np.ones(n, dtype=bool)
+    is_duplicate[representatives] = False
+    removed = int(is_duplicate.sum())
+    return {
+        "representatives": representatives,
+        "representative_of": representative_of,
+        "stats": {
+            "mode": mode,
+            "controls": n,
+            "unique_controls": len(representatives),
+            "exact_duplicates": exact_duplicates,
+            "near_duplicates": removed - exact_duplicates,
+            "embeddings_saved": removed,
+            "prompt_characters_saved": int(sum(len(controls[i]["description"]) for i in np.flatnonzero(is_duplicate)))
+        }
+    }
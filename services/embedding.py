@@ -1,58 +1,141 @@
-from sentence_transformers import SentenceTransformer, util
-from typing import List, Tuple
+from services.config import config
+from services.model_registry import get_model
+from services.cache import LRUCache
+from services.embedding_store import EmbeddingStore
+from services.coalescer import EmbeddingCoalescer
+from services.encoding_pool import default_workers, parallel_encode
+from services.quantization import quantize, as_float32
+from services.vector_index import ExactIndex
+from typing import List, Tuple, Optional
+import numpy as np
 import hashlib
-import pickle
-import os
 
-# Global cache for embeddings
-_embedding_cache = {}
+# Global cache for embeddings, bounded by MAX_CACHE_SIZE entries and MAX_CACHE_BYTES
+# (entries are stored in EMBEDDING_STORAGE_DTYPE)
+_embedding_cache = LRUCache(config.max_cache_size, config.max_cache_bytes)
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Persistent store shared by all workers on the node (second level behind the memory cache)
+_embedding_store = EmbeddingStore(config.embedding_store_path) if config.enable_embedding_store else None
 
 def _get_cache_key(text: str) -> str:
     """Generate cache key for text"""
     return hashlib.md5(text.encode()).hexdigest()
 
-def get_embedding(text: str, use_cache: bool = True):
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Encode a list of texts into L2-normalized float32 embeddings (one row per text)
+
+    Batches of at least PARALLEL_ENCODE_MIN_BATCH texts are spread over the multi-process
+    encoding pool; smaller ones (and any pool failure) are encoded in this process.
+    """
+    model = get_model()
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    if len(texts) >= config.parallel_encode_min_batch and default_workers() > 1:
+        try:
+            return parallel_encode(texts, model.get_sentence_embedding_dimension())
+        except Exception as e:
+            print(f"Parallel encoding failed, encoding in process: {e}")
+    embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+def get_embeddings(texts: List[str], use_cache: bool = True) -> np.ndarray:
+    """Embed a list of texts, reading through the persistent embedding store
+
+    Only texts missing from the store are encoded (each distinct text once), and their
+    embeddings are written back so other workers and later runs reuse them.
+    """
+    if not texts or _embedding_store is None or not use_cache:
+        return encode_texts(texts)
+
+    keys = [_get_cache_key(text) for text in texts]
+    stored = _embedding_store.get_many(config.embedding_model_key, set(keys))
+
+    missing = {}
+    for text, key in zip(texts, keys):
+        if key not in stored and key not in missing:
+            missing[key] = text
+    if missing:
+        encoded = encode_texts(list(missing.values()))
+        new_embeddings = dict(zip(missing.keys(), encoded))
+        _embedding_store.put_many(config.embedding_model_key, new_embeddings)
+        stored.update(new_embeddings)
+
+    return np.stack([stored[key] for key in keys])
+
+def get_embedding(text: str, use_cache: bool = True) -> np.ndarray:
     """Generate BERT embedding for a single text with optional caching"""
-    if use_cache:
+    use_memory_cache = use_cache and config.enable_embedding_cache
+    if use_memory_cache:
         cache_key = _get_cache_key(text)
-        if cache_key in _embedding_cache:
-            return _embedding_cache[cache_key]
-    
-    embedding = model.encode(text, convert_to_tensor=True)
-    
-    if use_cache:
-        _embedding_cache[cache_key] = embedding
-    
+        cached = _embedding_cache.get(cache_key)
+        if cached is not None:
+            return as_float32(cached)
+
+    if use_cache and _query_coalescer is not None:
+        embedding = _query_coalescer.encode(text)
+    else:
+        embedding = get_embeddings([text], use_cache)[0]
+
+    if use_memory_cache:
+        _embedding_cache.put(cache_key, quantize(embedding, config.embedding_storage_dtype))
+
     return embedding
 
+# Concurrent single-text queries are coalesced into batched get_embeddings calls
+_query_coalescer = EmbeddingCoalescer(
+    get_embeddings, config.query_batch_window_ms, config.query_batch_max_size, config.query_batch_timeout_seconds
+) if config.enable_query_batching else None
+
 def compare_texts(text1: str, text2: str, use_cache: bool = True) -> float:
     """Compare two texts and return cosine similarity"""
     emb1 = get_embedding(text1, use_cache)
     emb2 = get_embedding(text2, use_cache)
-    score = util.pytorch_cos_sim(emb1, emb2)
-    return score.item()
+    return float(np.dot(emb1, emb2))
+
+def search_similar(input_text: str, candidate_embeddings: Optional[np.ndarray] = None, top_n: int = 3,
+                   use_cache: bool = True, search_index=None) -> List[Tuple[int, float]]:
+    """Return (candidate index, score) pairs for the top N candidates, best first
 
-def find_most_similar(input_text: str, candidate_texts: List[str], top_n: int = 3, use_cache: bool = True) -> List[Tuple[str, float]]:
-    """Return top N most similar texts to input_text from a list"""
+    Candidates are given either as normalized embeddings (one row per candidate) or as a
+    prebuilt search_index from services.vector_index; selection is a partial top-k.
+    """
     input_embedding = get_embedding(input_text, use_cache)
-    candidates_embeddings = model.encode(candidate_texts, convert_to_tensor=True)
+    if search_index is None:
+        search_index = ExactIndex(candidate_embeddings)
 
-    similarities = util.pytorch_cos_sim(input_embedding, candidates_embeddings)[0]
-    scores = similarities.tolist()
+    indices, scores = search_index.search(input_embedding, top_n)
+    return [(int(i), float(score)) for i, score in zip(indices, scores)]
 
-    sorted_scores = sorted(zip(candidate_texts, scores), key=lambda x: x[1], reverse=True)
-    return sorted_scores[:top_n]
+def find_most_similar(input_text: str, candidate_texts: List[str], top_n: int = 3, use_cache: bool = True,
+                      candidate_embeddings: Optional[np.ndarray] = None, search_index=None) -> List[Tuple[str, float]]:
+    """Return top N most similar texts to input_text from a list
 
-def clear_cache():
-    """Clear the embedding cache"""
-    global _embedding_cache
+    If candidate_embeddings or a prebuilt search_index are supplied, the candidates are
+    not re-encoded, so the query costs one encode plus one search.
+    """
+    if search_index is None and candidate_embeddings is None:
+        candidate_embeddings = get_embeddings(candidate_texts, use_cache)
+
+    matches = search_similar(input_text, candidate_embeddings, top_n, use_cache, search_index)
+    return [(candidate_texts[i], score) for i, score in matches]
+
+def clear_cache(include_store: bool = False):
+    """Clear the embedding cache (and optionally this model's entries in the persistent store)"""
     _embedding_cache.clear()
+    if include_store and _embedding_store is not None:
+        _embedding_store.clear(config.embedding_model_key)
 
 def get_cache_stats():
-    """Get cache statistics"""
-    return {
-        "cache_size": len(_embedding_cache),
-        "cache_keys": list(_embedding_cache.keys())[:5]  # First 5 keys for debugging
-    }
\ No newline at end of file
+    """Get cache statistics (size, bounds, resident bytes and hit/miss/eviction counters)"""
+    stats = _embedding_cache.stats()
+    stats["enabled"] = config.enable_embedding_cache
+    stats["store"] = _embedding_store.stats(config.embedding_model_key) if _embedding_store is not None else None
+    return stats
+
+def get_query_batching_stats():
+    """Get query micro-batching statistics"""
+    if _query_coalescer is None:
+        return {"enabled": False}
+    stats = _query_coalescer.stats()
+    stats["enabled"] = True
+    return stats
@@ -0,0 +1,135 @@
+"""
+Persistent embedding store shared across worker processes and restarts
+
+Embeddings are stored in a SQLite database (WAL mode) keyed by embedding model name and
+the text hash from services.embedding._get_cache_key, so every uvicorn worker on a node
+reads and warms the same store.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# SQLite's default limit on bound parameters per statement is 999
+_MAX_PARAMS = 900
+
+class EmbeddingStore:
+    """SQLite-backed embedding store safe for concurrent multi-process access"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.reads = 0
+        self.hits = 0
+        self.writes = 0
+        self.errors = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, key)"
+            ") WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model_name: str, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the stored embeddings for whichever keys are present"""
+        keys = list(keys)
+        found: Dict[str, np.ndarray] = {}
+        try:
+            conn = self._connection()
+            for start in range(0, len(keys), _MAX_PARAMS):
+                chunk = keys[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model_name, *chunk]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as e:
+            print(f"Embedding store read failed: {e}")
+            self._count(errors=1)
+            return found
+
+        self._count(reads=len(keys), hits=len(found))
+        return found
+
+    def put_many(self, model_name: str, items: Dict[str, np.ndarray]):
+        """Store embeddings; existing entries are kept (same model and text give the same vector)"""
+        if not items:
+            return
+        rows = [
+            (model_name, key, int(vector.shape[0]), np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items.items()
+        ]
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, key, dim, vector) VALUES (?, ?, ?, ?)", rows
+                )
+        except sqlite3.Error as e:
+            print(f"Embedding store write failed: {e}")
+            self._count(errors=1)
+            return
+        self._count(writes=len(rows))
+
+    def clear(self, model_name: Optional[str] = None):
+        """Delete stored embeddings for one model, or for all models"""
+        conn = self._connection()
+        with conn:
+            if model_name:
+                conn.execute("DELETE FROM embeddings WHERE model = ?", (model_name,))
+            else:
+                conn.execute("DELETE FROM embeddings")
+
+    def count(self, model_name: Optional[str] = None) -> int:
+        conn = self._connection()
+        if model_name:
+            return conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model_name,)).fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _count(self, reads: int = 0, hits: int = 0, writes: int = 0, errors: int = 0):
+        with self._stats_lock:
+            self.reads += reads
+            self.hits += hits
+            self.writes += writes
+            self.errors += errors
+
+    def stats(self, model_name: Optional[str] = None) -> Dict:
+        """Stored entry count and this process's read/hit/write counters"""
+        try:
+            entries = self.count(model_name)
+        except sqlite3.Error:
+            entries = None
+        return {
+            "path": self.path,
+            "entries": entries,
+            "reads": self.reads,
+            "hits": self.hits,
+            "writes": self.writes,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / self.reads, 4) if self.reads else 0.0
+        }
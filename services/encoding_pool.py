@@ -0,0 +1,134 @@
+"""
+Multi-process embedding for very large batches
+
+Texts are sorted by length, split into chunks of ENCODE_CHUNK_SIZE and encoded by a pool
+of worker processes. Each worker loads the embedding model once (in its initializer,
+through the model registry) and writes its rows straight into a shared-memory output
+array, so only the texts cross the process boundary. encode_texts uses the pool
+automatically for batches of at least PARALLEL_ENCODE_MIN_BATCH texts.
+
+Starting the pool waits until every worker has loaded the model: one warm-up task per
+worker meets at a barrier, which only releases once that many distinct, initialized
+processes are running, so model loading is never charged to the first batch.
+
+Workers are started with "spawn" (forking a process that already runs torch threads is
+unsafe) and each gets cpu_count / ENCODE_WORKERS intra-op threads to avoid oversubscription.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from services.config import config
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_key = None
+_pool_lock = threading.Lock()
+_WARM_UP_TIMEOUT_SECONDS = 600
+
+# Per worker process: the loaded model and the warm-up barrier shared with the other workers
+_worker_model = None
+_worker_barrier = None
+
+def default_workers() -> int:
+    """ENCODE_WORKERS, or half the cores (at most 8) when it is 0"""
+    if config.encode_workers > 0:
+        return config.encode_workers
+    return max(1, min(8, (os.cpu_count() or 1) // 2))
+
+def _init_worker(threads: int, barrier, model_loader: Optional[Callable]):
+    """Runs once in each worker process: limit intra-op threads, then load the model
+
+    model_loader (a picklable function) replaces the model registry, e.g. with a stub model.
+    """
+    global _worker_model, _worker_barrier
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "TOKENIZERS_PARALLELISM"):
+        os.environ[name] = "false" if name == "TOKENIZERS_PARALLELISM" else str(threads)
+    if config.embedding_backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+
+    if model_loader is None:
+        from services.model_registry import get_model as model_loader
+    _worker_model = model_loader()
+    _worker_barrier = barrier
+
+def _warm_up(_) -> int:
+    """Block until every worker has run its initializer; returns this worker's pid"""
+    _worker_barrier.wait(_WARM_UP_TIMEOUT_SECONDS)
+    return os.getpid()
+
+def _encode_chunk(shm_name: str, shape: tuple, rows: np.ndarray, texts: List[str]) -> int:
+    """Encode one chunk in a worker and write it into the shared output array"""
+    embeddings = _worker_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        output[rows] = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        del output
+    finally:
+        shm.close()
+    return len(texts)
+
+def get_encoding_pool(workers: Optional[int] = None, model_loader: Optional[Callable] = None) -> ProcessPoolExecutor:
+    """Return the shared worker pool, (re)starting it with the requested workers and model"""
+    global _pool, _pool_key
+    workers = workers or default_workers()
+    with _pool_lock:
+        if _pool is None or _pool_key != (workers, model_loader):
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            start_time = time.time()
+            context = multiprocessing.get_context("spawn")
+            barrier = context.Barrier(workers)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                        initializer=_init_worker, initargs=(threads, barrier, model_loader))
+            # A worker runs one task at a time, so the barrier only releases once `workers`
+            # processes have each finished loading the model
+            pids = set(_pool.map(_warm_up, range(workers)))
+            if len(pids) != workers:
+                _pool.shutdown(wait=True)
+                _pool = None
+                raise RuntimeError(f"Expected {workers} embedding workers, {len(pids)} started")
+            _pool_key = (workers, model_loader)
+            print(f"Started {workers} embedding workers (model loaded) in {time.time() - start_time:.2f}s")
+    return _pool
+
+def shutdown_encoding_pool():
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool, _pool_key = None, None
+
+def parallel_encode(texts: List[str], dimension: int, workers: Optional[int] = None,
+                    chunk_size: Optional[int] = None, model_loader: Optional[Callable] = None) -> np.ndarray:
+    """Encode texts across the worker pool into L2-normalized float32 rows (input order)"""
+    chunk_size = chunk_size or config.encode_chunk_size
+    pool = get_encoding_pool(workers, model_loader)
+
+    # Length-sorted chunks pad to similar lengths; rows map each chunk back to input order
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    shape = (len(texts), dimension)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(texts) * dimension * 4))
+    try:
+        futures = [
+            pool.submit(_encode_chunk, shm.name, shape, rows, [texts[i] for i in rows])
+            for rows in (order[start:start + chunk_size] for start in range(0, len(texts), chunk_size))
+        ]
+        for future in futures:
+            future.result()
+        return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+    except BrokenProcessPool:
+        shutdown_encoding_pool()
+        raise
+    finally:
+        shm.close()
+        shm.unlink()
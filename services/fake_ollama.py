@@ -0,0 +1,153 @@
+"""
+In-process stand-in for an Ollama server
+
+FakeOllama answers POST /api/generate like Ollama does (non-streaming): it reads the
+summarization prompt, replies with a summary per group (a packed "summaries" object when
+the prompt lists several groups) and reports token counts and durations. Behaviour is
+configurable and seeded, so runs are reproducible:
+
+- service time: log-normal base latency (median FAKE_LLM_LATENCY_SECONDS, spread
+  FAKE_LLM_LATENCY_SIGMA) plus prompt tokens / FAKE_LLM_PROMPT_TOKENS_PER_SECOND plus
+  generated tokens / FAKE_LLM_TOKENS_PER_SECOND
+- FAKE_LLM_PARALLEL requests are served at once, the rest queue (like OLLAMA_NUM_PARALLEL)
+- FAKE_LLM_MALFORMED_RATE of replies are truncated mid-JSON
+- FAKE_LLM_FAILURE_RATE of requests fail with HTTP 500
+
+Tests can also script the model: scripted_replies are returned verbatim, in order, before
+any generated reply, and drop_groups are left out of packed replies (exercising the repair,
+retry and per-group fallback paths). record_payloads keeps every request body in .payloads.
+
+It plugs into LLMClient as an httpx transport (LLM_BACKEND=fake), so everything above the
+HTTP layer (pooling, concurrency limits, timeouts, parsing, retries) runs unchanged.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from services.config import config
+
+_GROUP_HEADER = re.compile(r'^Group "([^"]+)":$', re.MULTILINE)
+_CONTROL_LINE = re.compile(r'^- [^:\n]+: (.+?) - ', re.MULTILINE)
+
+class FakeOllama:
+    """Simulated Ollama generate endpoint with configurable latency, throughput and faults"""
+
+    def __init__(self, latency_seconds: Optional[float] = None, latency_sigma: Optional[float] = None,
+                 prompt_tokens_per_second: Optional[float] = None, tokens_per_second: Optional[float] = None,
+                 parallel: Optional[int] = None, malformed_rate: Optional[float] = None,
+                 failure_rate: Optional[float] = None, seed: Optional[int] = None,
+                 scripted_replies: Optional[List[str]] = None, drop_groups: Iterable[str] = (),
+                 record_payloads: bool = False):
+        self.latency_seconds = config.fake_llm_latency_seconds if latency_seconds is None else latency_seconds
+        self.latency_sigma = config.fake_llm_latency_sigma if latency_sigma is None else latency_sigma
+        self.prompt_tokens_per_second = prompt_tokens_per_second or config.fake_llm_prompt_tokens_per_second
+        self.tokens_per_second = tokens_per_second or config.fake_llm_tokens_per_second
+        self.parallel = max(1, parallel or config.fake_llm_parallel)
+        self.malformed_rate = config.fake_llm_malformed_rate if malformed_rate is None else malformed_rate
+        self.failure_rate = config.fake_llm_failure_rate if failure_rate is None else failure_rate
+        self._random = random.Random(config.fake_llm_seed if seed is None else seed)
+        self.scripted_replies = list(scripted_replies or [])
+        self.drop_groups = set(drop_groups)
+        self.payloads: Optional[List[Dict]] = [] if record_payloads else None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.packed_requests = 0
+        self.failures = 0
+        self.malformed = 0
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+        self.service_seconds = 0.0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def _reply(self, prompt: str) -> str:
+        """A schema-valid reply summarizing the groups of a (packed or single) prompt"""
+        def summary(section: str) -> Dict:
+            names = _CONTROL_LINE.findall(section) or ["Security"]
+            return {
+                "title": f"{names[0]} Controls",
+                "description": f"Unified summary of {len(names)} related controls.",
+                "implementation_steps": [
+                    {"step": "Assess", "description": "Review the current implementation of each control"},
+                    {"step": "Implement", "description": "Close the gaps found in the assessment"}
+                ]
+            }
+
+        headers = list(_GROUP_HEADER.finditer(prompt))
+        if not headers:
+            return json.dumps(summary(prompt))
+        bounds = [header.start() for header in headers[1:]] + [len(prompt)]
+        return json.dumps({"summaries": [
+            dict(summary(prompt[header.end():end]), group_id=header.group(1))
+            for header, end in zip(headers, bounds) if header.group(1) not in self.drop_groups
+        ]})
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST" or request.url.path != "/api/generate":
+            return httpx.Response(404, json={"error": "not found"})
+        payload = json.loads(request.content)
+        prompt = payload.get("prompt", "")
+        if self.payloads is not None:
+            self.payloads.append(payload)
+        packed = _GROUP_HEADER.search(prompt) is not None
+
+        # Semaphores bind to the running loop, so create it on first use
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.parallel)
+        async with self._slots:
+            failed = self._random.random() < self.failure_rate
+            malformed = not failed and self._random.random() < self.malformed_rate
+            reply = self.scripted_replies.pop(0) if self.scripted_replies else self._reply(prompt)
+            if malformed:
+                reply = reply[:len(reply) // 2]
+            prompt_tokens, generated_tokens = len(prompt) // 4, len(reply) // 4
+            base = self.latency_seconds * math.exp(self._random.gauss(0.0, self.latency_sigma)) \
+                if self.latency_seconds > 0 else 0.0
+            seconds = base + prompt_tokens / self.prompt_tokens_per_second
+            if not failed:
+                seconds += generated_tokens / self.tokens_per_second
+            start_time = time.perf_counter()
+            await asyncio.sleep(seconds)
+            elapsed = time.perf_counter() - start_time
+
+        with self._stats_lock:
+            self.requests += 1
+            self.packed_requests += packed
+            self.failures += failed
+            self.malformed += malformed
+            self.prompt_tokens += prompt_tokens
+            self.generated_tokens += 0 if failed else generated_tokens
+            self.service_seconds += elapsed
+        if failed:
+            return httpx.Response(500, json={"error": "simulated server failure"})
+        return httpx.Response(200, json={
+            "model": payload.get("model"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": reply,
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": generated_tokens,
+            "total_duration": int(elapsed * 1e9)
+        })
+
+    def stats(self) -> Dict:
+        """Requests served, simulated faults, tokens and total service time"""
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "packed_requests": self.packed_requests,
+                "failures": self.failures,
+                "malformed": self.malformed,
+                "prompt_tokens": self.prompt_tokens,
+                "generated_tokens": self.generated_tokens,
+                "service_seconds": round(self.service_seconds, 3)
+            }
@@ -1,8 +1,5 @@
 from typing import Dict, List, Optional
 import json
-from ollama import Client
-
-ollama = Client(host='http://localhost:11434')
 
 # Enhanced Framework database with additional metadata
 FRAMEWORKS_DATABASE = {
@@ -0,0 +1,273 @@
+"""
+Persistent harmonization state and incremental harmonization
+
+A state records the unified controls of a batch run (member lists, summaries, UC ids)
+together with each cluster's centroid. New controls are then assigned to the nearest
+existing cluster when they are within CLUSTERING_EPS of its centroid; the rest are
+clustered together with the previous outliers, and only clusters whose membership
+changed are re-summarized. As in batch runs, duplicate descriptions are embedded and
+prompted once, and clusters that grow past the member/token budget are split.
+"""
+import fcntl
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.batch import (_analyze_org_context, _bound_group_sizes, _cluster_id, _merge_org_analysis,
+                            _outlier_group_ids, _summarize_group, _unified_control, iter_group_summaries)
+from services.clustering import cluster_embeddings
+from services.config import config
+from services.dedup import deduplicate_controls
+from services.embedding import get_embeddings
+from services.quantization import as_float32
+from services.summarizer import estimate_control_tokens
+
+class HarmonizationState:
+    """Unified controls plus per-cluster centroid sums (normalized embedding sums) and the
+    organization analysis under org_context, which later additions update rather than redo"""
+
+    def __init__(self, state_id: str, unified_controls: List[Dict], centroid_sums: Dict[str, np.ndarray],
+                 next_cluster_number: int, org_context: Optional[Dict], model_key: str,
+                 organization_analysis: Optional[Dict] = None):
+        self.state_id = state_id
+        self.unified_controls = unified_controls
+        self.centroid_sums = centroid_sums
+        self.next_cluster_number = next_cluster_number
+        self.org_context = org_context
+        self.model_key = model_key
+        self.organization_analysis = organization_analysis
+
+    def save(self, state_dir: Optional[str] = None):
+        """Write the state atomically as <state_id>.json plus <state_id>.npz"""
+        state_dir = state_dir or config.state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        json_path, vectors_path = _state_paths(state_dir, self.state_id)
+
+        tmp_vectors = f"{vectors_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_vectors, **self.centroid_sums)
+        os.replace(tmp_vectors, vectors_path)
+
+        tmp_json = f"{json_path}.{os.getpid()}.tmp"
+        with open(tmp_json, "w", encoding="utf-8") as f:
+            json.dump({
+                "state_id": self.state_id,
+                "model_key": self.model_key,
+                "next_cluster_number": self.next_cluster_number,
+                "org_context": self.org_context,
+                "organization_analysis": self.organization_analysis,
+                "unified_controls": self.unified_controls
+            }, f)
+        os.replace(tmp_json, json_path)
+
+    @classmethod
+    def load(cls, state_id: str, state_dir: Optional[str] = None) -> "HarmonizationState":
+        state_dir = state_dir or config.state_dir
+        json_path, vectors_path = _state_paths(state_dir, state_id)
+        if not os.path.exists(json_path):
+            raise KeyError(f"Unknown harmonization state: {state_id}")
+
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with np.load(vectors_path) as vectors:
+            centroid_sums = {key: vectors[key] for key in vectors.files}
+        # States saved before the analysis was stored have none; it is rebuilt on the next update
+        return cls(data["state_id"], data["unified_controls"], centroid_sums, data["next_cluster_number"],
+                   data["org_context"], data["model_key"], data.get("organization_analysis"))
+
+def _state_paths(state_dir: str, state_id: str):
+    # state ids are generated hex strings; never let a caller-supplied id escape state_dir
+    safe_id = os.path.basename(state_id)
+    return os.path.join(state_dir, f"{safe_id}.json"), os.path.join(state_dir, f"{safe_id}.npz")
+
+@contextmanager
+def _locked_state(state_id: str):
+    """Exclusive cross-process lock so concurrent updates of one state are serialized"""
+    os.makedirs(config.state_dir, exist_ok=True)
+    json_path, _ = _state_paths(config.state_dir, state_id)
+    with open(f"{json_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1.0)
+
+def _deduplicated(controls: List[Dict]):
+    """(representatives, controls each representative stands for), grouped as in batch runs"""
+    dedup = deduplicate_controls(controls, config.dedup_mode, config.dedup_near_threshold)
+    members = [[] for _ in dedup["representatives"]]
+    for idx, position in enumerate(dedup["representative_of"]):
+        members[position].append(controls[idx])
+    return [controls[i] for i in dedup["representatives"]], members
+
+def _embed(controls: List[Dict]) -> np.ndarray:
+    return _normalize(np.asarray(get_embeddings([c["description"] for c in controls]), dtype=np.float32))
+
+def _within_budget(representatives: List[Dict]) -> bool:
+    if config.max_cluster_members > 0 and len(representatives) > config.max_cluster_members:
+        return False
+    return config.max_cluster_tokens <= 0 or \
+        sum(estimate_control_tokens(c) for c in representatives) <= config.max_cluster_tokens
+
+def create_state(unified_controls: List[Dict], controls: List[Dict], embeddings: np.ndarray, labels: np.ndarray,
+                 org_context: Optional[Dict] = None,
+                 organization_analysis: Optional[Dict] = None) -> HarmonizationState:
+    """Persist the result of a batch run (label n becomes cluster _cluster_id(n)) as a new state"""
+    vectors = _normalize(np.asarray(as_float32(embeddings), dtype=np.float32))
+    centroid_sums = {}
+    for label in set(int(l) for l in labels) - {-1}:
+        centroid_sums[_cluster_id(label)] = vectors[labels == label].sum(axis=0)
+
+    state = HarmonizationState(
+        state_id=uuid.uuid4().hex,
+        unified_controls=unified_controls,
+        centroid_sums=centroid_sums,
+        next_cluster_number=int(max(labels, default=-1)) + 1,
+        org_context=org_context,
+        model_key=config.embedding_model_key,
+        organization_analysis=organization_analysis
+    )
+    state.save()
+    return state
+
+def incremental_harmonize(state_id: str, controls: List[Dict], fast_mode: bool = False,
+                          org_context: Optional[Dict] = None) -> Dict:
+    """Add controls to an existing harmonization state without re-clustering everything
+
+    Returns the full updated set of unified controls and the ids of those that changed
+    (only changed clusters are re-summarized).
+    """
+    with _locked_state(state_id):
+        return _incremental_harmonize(state_id, controls, fast_mode, org_context)
+
+def _incremental_harmonize(state_id: str, controls: List[Dict], fast_mode: bool,
+                           org_context: Optional[Dict]) -> Dict:
+    start_time = time.time()
+    state = HarmonizationState.load(state_id)
+    if state.model_key != config.embedding_model_key:
+        raise ValueError(f"State {state_id} was built with {state.model_key}, not {config.embedding_model_key}")
+    org_context = org_context if org_context is not None else state.org_context
+    # The stored analysis can only be extended if it was made under the same context
+    previous_analysis = state.organization_analysis if org_context == state.org_context else None
+
+    by_id = {uc["unified_control_id"]: uc for uc in state.unified_controls}
+    changed = set()
+    empty_summary = {"title": "", "description": "", "implementation_steps": []}
+
+    def add_cluster(uc_id: str, vectors: np.ndarray, members: List[List[Dict]]):
+        """Install a cluster of representatives (rows of vectors) and the controls they stand for"""
+        by_id[uc_id] = _unified_control(uc_id, empty_summary, [c for group in members for c in group],
+                                        True, fast_mode, org_context)
+        state.centroid_sums[uc_id] = (vectors * np.array([[len(group)] for group in members])).sum(axis=0)
+        changed.add(uc_id)
+
+    def next_cluster_id() -> str:
+        uc_id = _cluster_id(state.next_cluster_number)
+        state.next_cluster_number += 1
+        return uc_id
+
+    # Step 1: Assign new controls (one representative per duplicate description) to the nearest
+    # existing cluster within eps of its centroid
+    new_representatives, new_members = _deduplicated(controls)
+    new_vectors = _embed(new_representatives)
+    cluster_ids = [uc_id for uc_id in state.centroid_sums if uc_id in by_id]
+    pending = list(range(len(new_representatives)))
+    if cluster_ids and new_representatives:
+        centroids = _normalize(np.stack([state.centroid_sums[uc_id] for uc_id in cluster_ids]))
+        similarities = new_vectors @ centroids.T
+        best = np.argmax(similarities, axis=1)
+        pending = []
+        for i in range(len(new_representatives)):
+            if 1.0 - similarities[i, best[i]] <= config.clustering_eps:
+                uc_id = cluster_ids[best[i]]
+                by_id[uc_id]["mapped_controls"].extend(new_members[i])
+                state.centroid_sums[uc_id] = state.centroid_sums[uc_id] + new_vectors[i] * len(new_members[i])
+                changed.add(uc_id)
+            else:
+                pending.append(i)
+
+    # Clusters that grew past MAX_CLUSTER_MEMBERS / MAX_CLUSTER_TOKENS are split like in batch
+    # runs: the first part keeps the cluster's id, the others get new ones
+    for uc_id in sorted(changed):
+        representatives, members = _deduplicated(by_id[uc_id]["mapped_controls"])
+        if _within_budget(representatives):
+            continue
+        vectors = _embed(representatives)
+        labels, _ = _bound_group_sizes(vectors, np.zeros(len(representatives), dtype=np.int64), representatives)
+        for label in range(int(labels.max()) + 1):
+            rows = np.flatnonzero(labels == label)
+            add_cluster(uc_id if label == 0 else next_cluster_id(), vectors[rows], [members[i] for i in rows])
+
+    # Step 2: Cluster the remaining new controls together with the previous outliers
+    # (the outlier pool may be split over several groups, UC-999-01, UC-999-02, ...)
+    previous_outlier_ids = [uc_id for uc_id, uc in by_id.items() if not uc["is_clustered"]]
+    previous_outliers = [c for uc_id in previous_outlier_ids for c in by_id[uc_id]["mapped_controls"]]
+    outlier_groups = [by_id[uc_id]["mapped_controls"] for uc_id in previous_outlier_ids]
+    if pending:
+        pool = previous_outliers + [c for i in pending for c in new_members[i]]
+        pool_representatives, pool_members = _deduplicated(pool)
+        pool_vectors = _embed(pool_representatives)
+        labels = cluster_embeddings(pool_vectors, sample_weight=np.array([len(group) for group in pool_members]))
+        labels, outlier_rows = _bound_group_sizes(pool_vectors, labels, pool_representatives)
+        for label in sorted(set(int(l) for l in labels) - {-1}):
+            rows = np.flatnonzero(labels == label)
+            add_cluster(next_cluster_id(), pool_vectors[rows], [pool_members[i] for i in rows])
+        outlier_groups = [[c for i in rows for c in pool_members[i]] for rows in outlier_rows]
+
+    if [c for group in outlier_groups for c in group] != previous_outliers:
+        for uc_id in previous_outlier_ids:
+            by_id.pop(uc_id)
+        for uc_id, group in zip(_outlier_group_ids(len(outlier_groups)), outlier_groups):
+            by_id[uc_id] = _unified_control(uc_id, empty_summary, group, False, fast_mode, org_context)
+            changed.add(uc_id)
+    print(f"Incremental assignment completed in {time.time() - start_time:.2f}s ({len(changed)} groups changed)")
+
+    # Step 3: Re-summarize only the groups whose membership changed
+    to_summarize = [uc_id for uc_id in sorted(changed) if uc_id in by_id]
+    if to_summarize:
+        if fast_mode:
+            summaries = ((uc_id, _summarize_group(by_id[uc_id]["mapped_controls"], by_id[uc_id]["is_clustered"],
+                                                  True, org_context)) for uc_id in to_summarize)
+        else:
+            # Prompts list each distinct description once, as in batch runs
+            summaries = iter_group_summaries(
+                [(uc_id, _deduplicated(by_id[uc_id]["mapped_controls"])[0], by_id[uc_id]["is_clustered"])
+                 for uc_id in to_summarize],
+                org_context)
+        for uc_id, summary in summaries:
+            by_id[uc_id] = _unified_control(uc_id, summary, by_id[uc_id]["mapped_controls"],
+                                            by_id[uc_id]["is_clustered"], fast_mode, org_context)
+
+    # Keep clusters in id order with the outlier group last (shorter ids first, so UC-998 precedes UC-1000)
+    state.unified_controls = sorted(by_id.values(), key=lambda uc: (not uc["is_clustered"],
+                                                                    len(uc["unified_control_id"]),
+                                                                    uc["unified_control_id"]))
+    # Step 4: Organization analysis. Only the new controls are compared with the existing ones
+    # and merged into the stored analysis; a new context needs a pass over the whole state
+    if previous_analysis is not None:
+        analysis = _merge_org_analysis(previous_analysis,
+                                       _analyze_org_context(new_representatives, org_context, new_vectors), org_context)
+    else:
+        all_controls = [c for uc in state.unified_controls for c in uc["mapped_controls"]]
+        analysis = _analyze_org_context(all_controls, org_context)
+
+    state.org_context = org_context
+    state.organization_analysis = analysis
+    state.save()
+
+    return {
+        "state_id": state.state_id,
+        "unified_controls": state.unified_controls,
+        "changed_unified_control_ids": to_summarize,
+        "organization_analysis": analysis,
+        "total_clusters": len(state.unified_controls),
+        "processing_time": time.time() - start_time
+    }
@@ -0,0 +1,208 @@
+"""
+Streaming ingestion of large control sets from JSONL or CSV
+
+Rows are parsed one at a time from a file (or any binary stream), validated as they
+arrive and kept as plain dicts with only the four control fields. Every INGEST_CHUNK_SIZE
+valid rows the chunk's descriptions are embedded, so parsing and embedding proceed
+together and batch harmonization receives ready-made embeddings. Each distinct
+(normalized) description is embedded once per upload.
+"""
+import csv
+import io
+import json
+import time
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from services.batch import batch_harmonize_from_input
+from services.config import config
+from services.dedup import normalize_text
+from services.embedding import get_embeddings
+
+CONTROL_FIELDS = ("framework", "control_id", "name", "description")
+_MAX_REPORTED_ERRORS = 20
+
+class IngestError(ValueError):
+    """Raised for an unreadable upload, or for the first invalid row in strict mode"""
+
+def _validate_row(row) -> Dict:
+    """The row as a control dict, or ValueError describing what is wrong with it"""
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    control = {}
+    for field in CONTROL_FIELDS:
+        value = row.get(field)
+        if not isinstance(value, str):
+            raise ValueError(f"'{field}' is missing or not a string")
+        value = value.strip()
+        if not value:
+            raise ValueError(f"'{field}' is empty")
+        control[field] = value
+    return control
+
+def _iter_jsonl(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"invalid JSON: {e.msg}")
+
+def _iter_csv(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        missing = [field for field in CONTROL_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise IngestError(f"CSV header is missing columns: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+    finally:
+        text.detach()
+
+def iter_controls(stream: BinaryIO, format: str = "jsonl", stats: Optional[Dict] = None,
+                  strict: bool = False) -> Iterator[Dict]:
+    """Yield validated controls from a JSONL or CSV stream, one row at a time
+
+    Invalid rows are skipped and reported in stats["errors"] (first few), or raise
+    IngestError when strict is set.
+    """
+    if format not in ("jsonl", "csv"):
+        raise IngestError(f"Unknown upload format: {format}")
+    stats = stats if stats is not None else {}
+    stats.setdefault("rows", 0)
+    stats.setdefault("invalid_rows", 0)
+    stats.setdefault("errors", [])
+
+    rows = _iter_jsonl(stream) if format == "jsonl" else _iter_csv(stream)
+    for line_number, row in rows:
+        stats["rows"] += 1
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            control = _validate_row(row)
+        except ValueError as e:
+            if strict:
+                raise IngestError(f"Line {line_number}: {e}")
+            stats["invalid_rows"] += 1
+            if len(stats["errors"]) < _MAX_REPORTED_ERRORS:
+                stats["errors"].append({"line": line_number, "error": str(e)})
+            continue
+        yield control
+
+class _CountingReader(io.RawIOBase):
+    """Read-through wrapper that counts the bytes consumed from a binary stream into stats["bytes"]"""
+
+    def __init__(self, stream: BinaryIO, stats: Dict):
+        self._stream = stream
+        self._stats = stats
+        stats["bytes"] = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self._stats["bytes"] += len(data)
+        return len(data)
+
+def _format_from_name(name: str) -> str:
+    return "csv" if name.lower().endswith(".csv") else "jsonl"
+
+def ingest_controls(source: Union[str, BinaryIO], format: Optional[str] = None, chunk_size: Optional[int] = None,
+                    strict: bool = False, embed: bool = True) -> Dict:
+    """Parse, validate and (chunk by chunk) embed controls from a JSONL/CSV file path or binary stream
+
+    Returns:
+        Dict: "controls" (list of control dicts), "embeddings" (one normalized row per control,
+              or None when embed is False) and "stats" (row counts, first errors, bytes read,
+              parse and embedding time, parse throughput)
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as stream:
+            return ingest_controls(stream, format or _format_from_name(source), chunk_size, strict, embed)
+
+    chunk_size = chunk_size or config.ingest_chunk_size
+    format = format or "jsonl"
+    stats: Dict = {"format": format}
+    start_time = time.perf_counter()
+    embed_seconds = 0.0
+
+    controls: List[Dict] = []
+    # Output rows, grown in place; rows [:embedded] are filled. Repeated descriptions are
+    # recorded as the row that first holds their vector
+    embeddings: Optional[np.ndarray] = None
+    embedded = 0
+    row_of_text: Dict[str, int] = {}
+
+    def embed_pending():
+        # Embed each new distinct description of the chunk once, then fill the chunk's rows
+        nonlocal embed_seconds, embeddings, embedded
+        embed_start = time.perf_counter()
+        chunk = controls[embedded:]
+        keys = [normalize_text(c["description"]) for c in chunk]
+        new = {}
+        for key, control in zip(keys, chunk):
+            if key not in row_of_text and key not in new:
+                new[key] = control["description"]
+        encoded = dict(zip(new, get_embeddings(list(new.values())))) if new else {}
+
+        needed = embedded + len(chunk)
+        if embeddings is None:
+            first = next(iter(encoded.values()))
+            embeddings = np.empty((max(chunk_size, needed), len(first)), dtype=first.dtype)
+        elif needed > len(embeddings):
+            # realloc rather than concatenating chunks, so the rows are never held twice
+            embeddings.resize((max(2 * len(embeddings), needed), embeddings.shape[1]), refcheck=False)
+        for row, key in enumerate(keys, start=embedded):
+            if key in row_of_text:
+                embeddings[row] = embeddings[row_of_text[key]]
+            else:
+                embeddings[row] = encoded[key]
+                row_of_text[key] = row
+        embedded = needed
+        embed_seconds += time.perf_counter() - embed_start
+
+    reader = io.BufferedReader(_CountingReader(source, stats), buffer_size=1 << 20)
+    for control in iter_controls(reader, format, stats, strict):
+        controls.append(control)
+        if embed and len(controls) - embedded >= chunk_size:
+            embed_pending()
+    if embed and len(controls) > embedded:
+        embed_pending()
+
+    total_seconds = time.perf_counter() - start_time
+    parse_seconds = max(total_seconds - embed_seconds, 1e-9)
+    stats.update({
+        "valid_rows": len(controls),
+        "parse_seconds": round(parse_seconds, 3),
+        "embedding_seconds": round(embed_seconds, 3) if embed else None,
+        "rows_per_second": round(stats["rows"] / parse_seconds, 1),
+        "megabytes_per_second": round(stats["bytes"] / parse_seconds / 1024 / 1024, 2)
+    })
+    print(f"Ingested {len(controls)} of {stats['rows']} rows in {total_seconds:.2f}s "
+          f"({stats['rows_per_second']:.0f} rows/s parse)")
+
+    if not embed:
+        embeddings = None
+    elif embeddings is None:
+        embeddings = np.zeros((0, 0), dtype=np.float32)
+    else:
+        # Trim the spare capacity in place
+        embeddings.resize((embedded, embeddings.shape[1]), refcheck=False)
+    return {"controls": controls, "embeddings": embeddings, "stats": stats}
+
+def batch_harmonize_from_file(source: Union[str, BinaryIO], format: Optional[str] = None, fast_mode: bool = False,
+                              org_context: Optional[Dict] = None, persist_state: bool = False,
+                              strict: bool = False) -> Dict:
+    """Batch harmonize a JSONL/CSV control file; the result also carries the ingestion stats"""
+    ingested = ingest_controls(source, format, strict=strict)
+    if not ingested["controls"]:
+        raise IngestError("No valid controls in upload")
+    result = batch_harmonize_from_input(ingested["controls"], fast_mode, org_context, persist_state,
+                                        embeddings=ingested["embeddings"])
+    result["ingestion"] = ingested["stats"]
+    return result
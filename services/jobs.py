@@ -0,0 +1,281 @@
+"""
+Background jobs for long-running batch harmonization
+
+A job is submitted with the same payload as /batch-harmonize and returns immediately with a
+job id. Jobs run on a local worker pool; their status, progress (clusters done/total, stage
+timings), result and error are persisted in SQLite (JOB_STORE_PATH), so any API worker can
+report on any job and finished results survive restarts. Jobs left queued or running by a
+process that no longer exists are re-queued by recover_jobs at startup.
+
+Cancellation is cooperative: it takes effect at the next progress event, queued cluster
+summaries are dropped and LLM requests already in flight are cancelled.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from services.batch import batch_harmonize_from_input, batch_response
+from services.config import config
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a running job when cancellation was requested"""
+
+class JobStore:
+    """SQLite-backed job table shared by all processes on a node"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " owner TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " request TEXT NOT NULL,"
+            " progress TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0"
+            ")"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, owner: str, request: Dict, progress: Dict):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, owner, created_at, request, progress) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, owner, time.time(), json.dumps(request), json.dumps(progress))
+            )
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        return self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+    def update(self, job_id: str, **fields):
+        """Set columns of one job; dict values are stored as JSON"""
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        values = [json.dumps(v) if isinstance(v, (dict, list)) else v for v in fields.values()]
+        conn = self._connection()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*values, job_id))
+
+    def claim(self, job_id: str, previous_owner: str, owner: str) -> bool:
+        """Take over an orphaned job; only one process can win"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET owner = ?, status = ? WHERE job_id = ? AND owner = ? AND status IN (?, ?)",
+                (owner, QUEUED, job_id, previous_owner, QUEUED, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Cancel a queued job outright, or flag a running one; False if already finished"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            if cursor.rowcount:
+                return True
+            cursor = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = ?", (job_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[sqlite3.Row]:
+        if status:
+            return self._connection().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        return self._connection().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+
+    def unfinished(self) -> List[sqlite3.Row]:
+        return self._connection().execute(
+            "SELECT job_id, owner FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+        ).fetchall()
+
+# Distinguishes this process from an earlier one with the same host and pid (a restarted
+# container usually runs its entrypoint under the same pid)
+_PROCESS_NONCE = uuid.uuid4().hex[:12]
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_NONCE}"
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process that owns a job is still running (owners on other hosts are assumed alive)"""
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname():
+        return True
+    if pid == str(os.getpid()):
+        # Same host and pid: alive only if it is this very process, not a predecessor
+        return owner == _owner_id()
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+def _job_view(row: sqlite3.Row) -> Dict:
+    """Public status of a job (without its result)"""
+    view = {
+        "job_id": row["job_id"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "progress": json.loads(row["progress"]),
+        "cancel_requested": bool(row["cancel_requested"])
+    }
+    if row["error"]:
+        view["error"] = row["error"]
+    return view
+
+class JobManager:
+    """Runs batch harmonization jobs on a local thread pool and records them in a JobStore"""
+
+    def __init__(self, store: JobStore, max_workers: int = 1):
+        self.store = store
+        self.owner = _owner_id()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="harmonize-job")
+
+    def submit(self, controls: List[Dict], fast_mode: bool = False, org_context: Optional[Dict] = None,
+               persist_state: bool = False) -> Dict:
+        """Queue a batch harmonization and return its status"""
+        job_id = uuid.uuid4().hex
+        request = {"controls": controls, "fast_mode": fast_mode, "org_context": org_context,
+                   "persist_state": persist_state}
+        self.store.create(job_id, self.owner, request, {"stage": QUEUED, "controls_total": len(controls)})
+        self._executor.submit(self._run, job_id)
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Dict:
+        row = self.store.get(job_id)
+        if row is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return _job_view(row)
+
+    def result(self, job_id: str) -> Dict:
+        """The batch harmonization result of a completed job"""
+        row = self.store.get(job_id)
+        if row is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if row["status"] != COMPLETED:
+            raise ValueError(f"Job {job_id} is {row['status']}, not {COMPLETED}")
+        return json.loads(row["result"])
+
+    def cancel(self, job_id: str) -> Dict:
+        if self.store.get(job_id) is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        self.store.request_cancel(job_id)
+        return self.status(job_id)
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        return [_job_view(row) for row in self.store.list(status, limit)]
+
+    def recover(self) -> List[str]:
+        """Re-queue unfinished jobs whose owning process has died"""
+        recovered = []
+        for row in self.store.unfinished():
+            if row["owner"] != self.owner and not _owner_alive(row["owner"]):
+                if self.store.claim(row["job_id"], row["owner"], self.owner):
+                    self._executor.submit(self._run, row["job_id"])
+                    recovered.append(row["job_id"])
+        if recovered:
+            print(f"Re-queued {len(recovered)} interrupted harmonization jobs")
+        return recovered
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job_id: str):
+        row = self.store.get(job_id)
+        if row is None or row["status"] != QUEUED or row["owner"] != self.owner:
+            return  # cancelled while queued, or taken over by another process
+
+        request = json.loads(row["request"])
+        start_time = time.time()
+        progress = {"stage": "clustering", "controls_total": len(request["controls"]),
+                    "clusters_done": 0, "clusters_total": None, "stage_timings": {}}
+        self.store.update(job_id, status=RUNNING, started_at=start_time, progress=progress)
+
+        def on_event(event: Dict):
+            if event["event"] == "clustering":
+                progress["stage"] = "summarizing"
+                progress["clusters_total"] = event["total_clusters"]
+                progress["stage_timings"]["clustering"] = event["elapsed_seconds"]
+            elif event["event"] == "unified_control":
+                progress["clusters_done"] += 1
+            else:
+                progress["stage"] = "finishing"
+                progress["stage_timings"]["summarization"] = round(
+                    time.time() - start_time - progress["stage_timings"].get("clustering", 0.0), 3)
+            self.store.update(job_id, progress=progress)
+            if self.store.get(job_id)["cancel_requested"]:
+                raise JobCancelled(job_id)
+
+        try:
+            result = batch_harmonize_from_input(request["controls"], request["fast_mode"], request["org_context"],
+                                                request["persist_state"], on_event=on_event)
+        except JobCancelled:
+            progress["stage"] = CANCELLED
+            self.store.update(job_id, status=CANCELLED, finished_at=time.time(), progress=progress)
+            print(f"Job {job_id} cancelled after {progress['clusters_done']} clusters")
+        except Exception as e:
+            progress["stage"] = FAILED
+            self.store.update(job_id, status=FAILED, finished_at=time.time(), progress=progress, error=str(e))
+            print(f"Job {job_id} failed: {e}")
+        else:
+            progress["stage"] = COMPLETED
+            response = batch_response(result, len(request["controls"]), request["fast_mode"],
+                                      request["org_context"], start_time)
+            self.store.update(job_id, status=COMPLETED, finished_at=time.time(), progress=progress,
+                              result=json.dumps(response))
+
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """Return this process's job manager, creating it on first use"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager(JobStore(config.job_store_path), config.job_workers)
+    return _job_manager
+
+def recover_jobs() -> List[str]:
+    return get_job_manager().recover()
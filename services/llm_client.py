@@ -0,0 +1,188 @@
+"""
+Asynchronous, connection-pooled LLM client
+
+Every LLM call goes through one httpx.AsyncClient per process, which keeps a pool of
+keep-alive connections to LLM_HOST, running on a dedicated event loop thread. A process-wide
+semaphore caps in-flight generations at LLM_MAX_CONCURRENCY and each call has its own
+deadline (LLM_TIMEOUT_SECONDS, not counting time spent waiting for the semaphore).
+
+Async code awaits generate() on the client's loop; synchronous code calls submit(), which
+returns a concurrent.futures.Future, or generate_sync(). A single worker thread can therefore
+keep many generations in flight instead of blocking one thread per request.
+
+LLM_BACKEND selects what answers the requests: "ollama" (HTTP to LLM_HOST) or "fake", the
+in-process FakeOllama simulator, for benchmarks and tests without a model server.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Coroutine, Dict, Optional, Union
+
+import httpx
+
+from services.config import config
+
+LLM_BACKENDS = ("ollama", "fake")
+_LATENCY_WINDOW = 1000  # recent generations kept for latency percentiles
+
+class LLMError(RuntimeError):
+    """Raised when a generation fails, times out or returns an unusable response"""
+
+class LLMClient:
+    """Pooled Ollama /api/generate client driven by its own event loop thread"""
+
+    def __init__(self, host: Optional[str] = None, max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 backend: Optional[str] = None):
+        self.backend = backend or config.llm_backend
+        if self.backend not in LLM_BACKENDS:
+            raise ValueError(f"Unknown LLM backend: {self.backend}")
+        self.fake_server = None
+        if transport is None and self.backend == "fake":
+            from services.fake_ollama import FakeOllama
+            self.fake_server = FakeOllama()
+            transport = self.fake_server.transport()
+        self.host = host or config.llm_host
+        self.max_concurrency = max(1, max_concurrency or config.llm_max_concurrency)
+        self.timeout = timeout or config.llm_timeout_seconds
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_seconds = 0.0
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        # The HTTP client and semaphore belong to the client's loop, so create them there
+        self.submit(self._setup(transport)).result()
+
+    async def _setup(self, transport: Optional[httpx.AsyncBaseTransport]):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=self.host,
+            transport=transport,
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+            # The overall deadline is enforced per call; these only bound the individual phases
+            timeout=httpx.Timeout(self.timeout, connect=min(10.0, self.timeout))
+        )
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the client's loop from any thread"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("submit() would deadlock on the LLM client loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def generate(self, prompt: str, model: Optional[str] = None, temperature: Optional[float] = None,
+                       timeout: Optional[float] = None, format: Optional[Union[str, Dict]] = None) -> Dict:
+        """One non-streaming generation; returns Ollama's response body ("response", token counts, ...)
+
+        format is passed through to Ollama: "json", or a JSON schema the output must follow.
+        Must run on the client's loop (await it from a coroutine passed to submit()).
+        """
+        payload = {
+            "model": model or config.llm_model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"temperature": config.llm_temperature if temperature is None else temperature}
+        }
+        if format is not None:
+            payload["format"] = format
+        timeout = timeout or self.timeout
+        async with self._semaphore:
+            self._count(in_flight=1)
+            start_time = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(self._http.post("/api/generate", json=payload), timeout)
+                response.raise_for_status()
+                body = response.json()
+                if not isinstance(body, dict) or "response" not in body:
+                    raise ValueError("response body has no 'response' field")
+            except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+                self._count(failures=1, timeouts=1)
+                raise LLMError(f"LLM generation timed out after {timeout:.0f}s") from e
+            except (httpx.HTTPError, ValueError) as e:
+                self._count(failures=1)
+                raise LLMError(f"LLM generation failed: {e}") from e
+            finally:
+                self._count(in_flight=-1, requests=1, seconds=time.perf_counter() - start_time)
+        return body
+
+    def generate_sync(self, prompt: str, **kwargs) -> Dict:
+        """Blocking generate() for synchronous callers"""
+        return self.submit(self.generate(prompt, **kwargs)).result()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.submit(self._http.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _count(self, in_flight: int = 0, requests: int = 0, failures: int = 0, timeouts: int = 0,
+               seconds: float = 0.0):
+        with self._stats_lock:
+            self.in_flight += in_flight
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.requests += requests
+            self.failures += failures
+            self.timeouts += timeouts
+            self.total_seconds += seconds
+            if requests:
+                self._latencies.append(seconds)
+
+    def stats(self) -> Dict:
+        """Request counters, recent latency percentiles and in-flight high-water mark for this process"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "backend": self.backend,
+                "host": self.host,
+                "max_concurrency": self.max_concurrency,
+                "timeout_seconds": self.timeout,
+                "requests": self.requests,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "avg_latency_seconds": round(self.total_seconds / self.requests, 3) if self.requests else 0.0
+            }
+        for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"latency_seconds_{name}"] = round(latencies[int(q * (len(latencies) - 1))], 3) if latencies else 0.0
+        if self.fake_server is not None:
+            stats["fake_server"] = self.fake_server.stats()
+        return stats
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+def close_llm_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+def get_llm_client_stats() -> Dict:
+    """LLM client statistics, or {"started": False} before the first LLM call"""
+    client = _client
+    if client is None:
+        return {"started": False}
+    stats = client.stats()
+    stats["started"] = True
+    return stats
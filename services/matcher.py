@@ -1,26 +1,24 @@
 import json
-from typing import List, Dict
-from services.embedding import find_most_similar
+from typing import List, Dict, Optional
+from services.config import config
+from services.embedding import search_similar
+from services.catalog_index import get_catalog_index
 
 # Load controls from your known_controls.json
-def load_known_controls(path: str = "data/known_control.json") -> List[Dict]:
+def load_known_controls(path: str = config.catalog_path) -> List[Dict]:
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     return data
 
-def match_control(input_description: str, top_n: int = 3) -> List[Dict]:
-    known_controls = load_known_controls()
+def match_control(input_description: str, top_n: int = 3, exact: Optional[bool] = None,
+                  frameworks: Optional[List[str]] = None, control_id_prefix: Optional[str] = None) -> List[Dict]:
+    index = get_catalog_index()
+    known_controls = index.controls
 
-    # Just compare with descriptions
-    candidate_texts = [c["description"] for c in known_controls]
-    top_matches = find_most_similar(input_description, candidate_texts, top_n=top_n)
+    # Compare with the precomputed catalog description embeddings, restricted to the
+    # requested frameworks / control-id prefix (exact=True bypasses the approximate backend)
+    search_index = index.scoped_index(frameworks, control_id_prefix, exact=bool(exact))
+    top_matches = search_similar(input_description, top_n=top_n, search_index=search_index)
 
-    # Map back to full control info
-    results = []
-    for match_text, score in top_matches:
-        for c in known_controls:
-            if c["description"] == match_text:
-                c["match_score"] = round(score, 4)
-                results.append(c)
-                break
-    return results
+    # Build fresh result records so the shared catalog is never mutated
+    return [dict(known_controls[i], match_score=round(score, 4)) for i, score in top_matches]
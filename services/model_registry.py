@@ -0,0 +1,84 @@
+"""
+Shared registry of embedding models
+
+Each model is loaded lazily, once per process, on first use (or explicitly through
+warm_up at startup), and every caller shares the same instance. EMBEDDING_BACKEND
+selects PyTorch sentence-transformers ("torch") or ONNX Runtime ("onnx").
+"""
+import os
+import resource
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.config import config
+
+_models: Dict[str, object] = {}
+_load_info: Dict[str, Dict] = {}
+_registry_lock = threading.Lock()
+
+def _current_rss_bytes() -> int:
+    """Resident set size of this process (falls back to peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _parameter_bytes(model) -> int:
+    model_path = getattr(model, "model_path", None)
+    if model_path:
+        return os.path.getsize(model_path)
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except (AttributeError, TypeError):
+        return 0
+
+def _load(model_name: str):
+    """Construct a model with the configured inference backend"""
+    if config.embedding_backend == "onnx":
+        from services.onnx_encoder import OnnxSentenceEncoder
+        return OnnxSentenceEncoder(model_name, config.onnx_model_dir, quantize=config.onnx_quantize)
+    if config.embedding_backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    raise ValueError(f"Unknown embedding backend: {config.embedding_backend}")
+
+def get_model(model_name: Optional[str] = None):
+    """Return the shared instance of an embedding model, loading it on first use"""
+    model_name = model_name or config.embedding_model
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        model = _models.get(model_name)
+        if model is None:
+            rss_before = _current_rss_bytes()
+            start_time = time.time()
+            model = _load(model_name)
+            _load_info[model_name] = {
+                "backend": config.embedding_backend,
+                "load_time_seconds": round(time.time() - start_time, 3),
+                "parameter_bytes": _parameter_bytes(model),
+                "rss_delta_bytes": max(0, _current_rss_bytes() - rss_before)
+            }
+            _models[model_name] = model
+            print(f"Loaded embedding model {model_name} in {_load_info[model_name]['load_time_seconds']:.2f}s")
+    return model
+
+def warm_up(model_names: Optional[List[str]] = None):
+    """Load models and run one encode so the first request does not pay for initialization"""
+    for model_name in model_names or [config.embedding_model]:
+        model = get_model(model_name)
+        start_time = time.time()
+        model.encode(["warm-up"])
+        _load_info[model_name]["warm_up_seconds"] = round(time.time() - start_time, 3)
+
+def get_registry_stats() -> Dict:
+    """Loaded models with their load time and memory footprint"""
+    return {
+        "loaded_models": list(_models.keys()),
+        "models": {name: dict(info) for name, info in _load_info.items()},
+        "process_rss_bytes": _current_rss_bytes()
+    }
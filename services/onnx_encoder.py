@@ -0,0 +1,116 @@
+"""
+ONNX Runtime inference backend for sentence-transformer embedding models
+
+The transformer is exported to ONNX once (optionally dynamically quantized to int8)
+and cached under ONNX_MODEL_DIR; inference then runs through onnxruntime on CPU with
+the same mean pooling as the sentence-transformers model, so callers can use it in
+place of SentenceTransformer.encode.
+"""
+import os
+import time
+from typing import List, Union
+
+import numpy as np
+
+class OnnxSentenceEncoder:
+    """Drop-in replacement for SentenceTransformer.encode backed by onnxruntime"""
+
+    def __init__(self, model_name: str, model_dir: str, quantize: bool = False,
+                 max_seq_length: int = 256, num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        export_dir = os.path.join(model_dir, model_name.replace("/", "_"))
+        model_path = _export(model_name, export_dir, max_seq_length)
+        if quantize:
+            model_path = _quantize(model_path)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.model_path = model_path
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1])
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, normalize_embeddings: bool = False,
+               **kwargs) -> np.ndarray:
+        """Mean-pooled sentence embeddings as a float32 numpy array"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Sort by length so each batch pads to a similar length
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        output = None
+        for start in range(0, len(sentences), batch_size):
+            batch_ids = order[start:start + batch_size]
+            features = self.tokenizer([sentences[i] for i in batch_ids], padding=True, truncation=True,
+                                      max_length=self.max_seq_length, return_tensors="np")
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names if name in features}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if output is None:
+                output = np.empty((len(sentences), pooled.shape[1]), dtype=np.float32)
+            output[batch_ids] = pooled
+
+        if output is None:
+            output = np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        if normalize_embeddings:
+            output /= np.clip(np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None)
+        return output[0] if single else output
+
+def _export(model_name: str, export_dir: str, max_seq_length: int) -> str:
+    """Export the sentence-transformer's transformer module to ONNX (once per model)"""
+    model_path = os.path.join(export_dir, "model.onnx")
+    if os.path.exists(model_path):
+        return model_path
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    start_time = time.time()
+    os.makedirs(export_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    sample = tokenizer(["export sample"], padding=True, truncation=True, max_length=max_seq_length,
+                       return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    tokenizer.save_pretrained(export_dir)
+    os.replace(tmp_path, model_path)
+    print(f"Exported {model_name} to ONNX in {time.time() - start_time:.2f}s")
+    return model_path
+
+def _quantize(model_path: str) -> str:
+    """Dynamically quantize the exported model's weights to int8 (once per model)"""
+    quantized_path = model_path.replace(".onnx", ".int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, quantized_path)
+    return quantized_path
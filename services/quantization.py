@@ -0,0 +1,110 @@
+"""
+Compact storage for normalized embeddings
+
+- float16: half-precision copy (2x smaller)
+- int8: symmetric per-vector quantization, codes = round(v / scale) with
+  scale = max|v| / 127 (about 4x smaller)
+
+QuantizedEmbeddings supports row selection and matrix products directly, so the search
+backends in services.vector_index score quantized matrices without a float32 copy.
+"""
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+class QuantizedEmbeddings:
+    """Embedding matrix stored as float16 or int8 codes with per-vector scales"""
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray], dtype: str, chunk_size: int = 4096):
+        self.codes = codes
+        self.scales = scales
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.codes.ndim
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __getitem__(self, index) -> Union["QuantizedEmbeddings", np.ndarray]:
+        if isinstance(index, (int, np.integer)):
+            return self._dequantize_rows(self.codes[index], None if self.scales is None else self.scales[index])
+        return QuantizedEmbeddings(self.codes[index], None if self.scales is None else self.scales[index],
+                                   self.dtype, self.chunk_size)
+
+    def _dequantize_rows(self, codes: np.ndarray, scales) -> np.ndarray:
+        rows = codes.astype(np.float32)
+        if scales is not None:
+            rows *= scales[..., None] if rows.ndim > 1 else scales
+        return rows
+
+    def dequantize(self) -> np.ndarray:
+        return self._dequantize_rows(self.codes, self.scales)
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        """Scores against a query vector (or matrix), computed chunk by chunk to bound memory"""
+        other = np.asarray(other, dtype=np.float32)
+        out_shape = (self.codes.shape[0],) + other.shape[1:]
+        out = np.empty(out_shape, dtype=np.float32)
+        for start in range(0, self.codes.shape[0], self.chunk_size):
+            block = self.codes[start:start + self.chunk_size].astype(np.float32) @ other
+            if self.scales is not None:
+                scales = self.scales[start:start + self.chunk_size]
+                block *= scales[:, None] if block.ndim > 1 else scales
+            out[start:start + self.chunk_size] = block
+        return out
+
+def quantize(embeddings: np.ndarray, dtype: str = "int8") -> Union[np.ndarray, QuantizedEmbeddings]:
+    """Quantize float32 embeddings (one row per vector, or a single vector)"""
+    if dtype == "float32":
+        return embeddings
+    if dtype == "float16":
+        return QuantizedEmbeddings(embeddings.astype(np.float16), None, dtype)
+    if dtype == "int8":
+        max_abs = np.abs(embeddings).max(axis=-1)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        codes = np.round(embeddings / scales[..., None]).astype(np.int8)
+        return QuantizedEmbeddings(codes, scales, dtype)
+    raise ValueError(f"Unknown embedding storage dtype: {dtype} (expected one of {', '.join(STORAGE_DTYPES)})")
+
+def as_float32(embeddings: Union[np.ndarray, QuantizedEmbeddings]) -> np.ndarray:
+    """Return a float32 array for either representation"""
+    if isinstance(embeddings, QuantizedEmbeddings):
+        return embeddings.dequantize()
+    return embeddings
+
+def quantization_report(embeddings: np.ndarray, queries: np.ndarray, dtype: str, k: int = 10) -> Dict:
+    """Memory saved and score / top-k drift of a storage dtype versus float32"""
+    quantized = quantize(embeddings, dtype)
+    exact_scores = embeddings @ queries.T
+    quantized_scores = quantized @ queries.T
+    drift = np.abs(exact_scores - quantized_scores)
+
+    k = min(k, embeddings.shape[0])
+    overlap = 0
+    for column in range(queries.shape[0]):
+        expected = np.argpartition(-exact_scores[:, column], k - 1)[:k]
+        found = np.argpartition(-quantized_scores[:, column], k - 1)[:k]
+        overlap += len(np.intersect1d(expected, found))
+
+    return {
+        "dtype": dtype,
+        "float32_bytes": int(embeddings.nbytes),
+        "stored_bytes": int(quantized.nbytes),
+        "memory_saved_ratio": round(1 - quantized.nbytes / embeddings.nbytes, 4),
+        "score_drift_mean": float(drift.mean()),
+        "score_drift_max": float(drift.max()),
+        f"top_{k}_agreement": round(overlap / (queries.shape[0] * k), 4)
+    }
@@ -1,9 +1,58 @@
-from ollama import Client
+import asyncio
 import json
 import re
-from typing import Optional, Dict
+import threading
+from typing import Optional, Dict, List
+from services.config import config
+from services.llm_client import get_llm_client
+from services.summary_cache import SummaryCache, summary_key
 
-ollama = Client(host='http://localhost:11434')
+# Bump whenever the summarization prompt changes; cached summaries of older prompts stop matching
+PROMPT_VERSION = "2"
+PACKED_PROMPT_VERSION = "packed-2"
+
+# Token budget of a packed prompt: fixed instructions, plus reserved output per summary
+_PACKED_PREAMBLE_TOKENS = 150
+_SUMMARY_OUTPUT_TOKENS = 200
+
+# Persistent summary cache shared by all workers on the node
+_summary_cache = SummaryCache(config.summary_cache_path, config.summary_cache_ttl_seconds) \
+    if config.enable_summary_cache else None
+
+# JSON schemas passed to Ollama's structured output mode
+_STEP_SCHEMA = {
+    "type": "object",
+    "properties": {"step": {"type": "string"}, "description": {"type": "string"}},
+    "required": ["step", "description"]
+}
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "implementation_steps": {"type": "array", "items": _STEP_SCHEMA}
+    },
+    "required": ["title", "description", "implementation_steps"]
+}
+PACKED_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summaries": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": dict(SUMMARY_SCHEMA["properties"], group_id={"type": "string"}),
+                "required": ["group_id"] + SUMMARY_SCHEMA["required"]
+            }
+        }
+    },
+    "required": ["summaries"]
+}
+
+# Prompt packing and reply parsing counters for this process
+_stats_lock = threading.Lock()
+_packing_stats = {"packed_prompts": 0, "packed_groups": 0, "packed_groups_dropped": 0}
+_reply_stats = {"replies": 0, "parsed": 0, "repaired": 0, "invalid_replies": 0, "retries": 0, "fallbacks": 0}
 
 def _extract_json_from_text(text: str) -> Optional[Dict]:
     """Extract JSON from LLM response with multiple fallback strategies"""
@@ -121,35 +170,50 @@ def _generate_fallback_summary(control_list, org_context: Optional[Dict] = None)
         "implementation_steps": implementation_steps
     }
 
-def summarize_controls(control_list, org_context: Optional[Dict] = None):
-    if not control_list:
-        return {
-            "title": "No Controls Provided",
-            "description": "The list of controls was empty.",
-            "implementation_steps": []
-        }
+def format_control(control: Dict) -> str:
+    """One control as it appears in a summarization prompt (description truncated to 200 characters)"""
+    description = control['description']
+    return f"- {control['framework']}: {control['name']} - {description[:200]}{'...' if len(description) > 200 else ''}"
 
-    # OPTIMIZED: Shorter, more focused prompt
-    # Only include essential info: framework, name, and key parts of description
-    formatted_controls = "\n".join([
-        f"- {c['framework']}: {c['name']} - {c['description'][:200]}{'...' if len(c['description']) > 200 else ''}"
-        for c in control_list
-    ])
+def estimate_control_tokens(control: Dict) -> int:
+    """Rough prompt token count of one control (about 4 characters per token)"""
+    return len(format_control(control)) // 4 + 1
 
-    # Build context-aware prompt with stronger JSON formatting instructions
-    prompt = f"""You are a cybersecurity expert. Summarize these security controls into a unified format.
+def clear_summary_cache() -> int:
+    """Delete all cached summaries; returns the number removed"""
+    return _summary_cache.clear() if _summary_cache is not None else 0
 
-Controls:
-{formatted_controls}"""
+def get_summary_cache_stats() -> Dict:
+    """Get summary cache statistics (entries and hit/miss counters)"""
+    if _summary_cache is None:
+        return {"enabled": False}
+    stats = _summary_cache.stats()
+    stats["enabled"] = True
+    stats["prompt_version"] = PROMPT_VERSION
+    return stats
 
-    # Add organization context if provided
-    if org_context:
-        industry = org_context.get("industry", "")
-        existing_count = len(org_context.get("existing_controls", []))
-        risk_profile = org_context.get("risk_profile", "Standard")
-        compliance_frameworks = org_context.get("compliance_frameworks", [])
-        
-        context_info = f"""
+async def _cached_summary(control_list, org_context: Optional[Dict]) -> Optional[Dict]:
+    """A cached single-group or packed summary of these controls, if any"""
+    if _summary_cache is None:
+        return None
+    keys = [summary_key(control_list, org_context, config.llm_model, prompt_version)
+            for prompt_version in (PROMPT_VERSION, PACKED_PROMPT_VERSION)]
+    return await asyncio.to_thread(_summary_cache.get_any, keys)
+
+async def _cache_summary(control_list, org_context: Optional[Dict], summary: Dict, prompt_version: str):
+    if _summary_cache is not None:
+        key = summary_key(control_list, org_context, config.llm_model, prompt_version)
+        await asyncio.to_thread(_summary_cache.put, key, summary, config.llm_model, prompt_version)
+
+def _org_context_section(org_context: Optional[Dict]) -> str:
+    if not org_context:
+        return ""
+    industry = org_context.get("industry", "")
+    existing_count = len(org_context.get("existing_controls", []))
+    risk_profile = org_context.get("risk_profile", "Standard")
+    compliance_frameworks = org_context.get("compliance_frameworks", [])
+
+    return f"""
 
 Organization Context:
 - Industry: {industry}
@@ -159,7 +223,20 @@ Organization Context:
 
 Please tailor the implementation steps to be relevant for {industry} industry and consider the existing control landscape.
 """
-        prompt += context_info
+
+def _build_prompt(control_list, org_context: Optional[Dict] = None) -> str:
+    # OPTIMIZED: Shorter, more focused prompt
+    # Only include essential info: framework, name, and key parts of description
+    formatted_controls = "\n".join([format_control(c) for c in control_list])
+
+    # Build context-aware prompt with stronger JSON formatting instructions
+    prompt = f"""You are a cybersecurity expert. Summarize these security controls into a unified format.
+
+Controls:
+{formatted_controls}"""
+
+    # Add organization context if provided
+    prompt += _org_context_section(org_context)
 
     prompt += """
 
@@ -173,34 +250,253 @@ IMPORTANT: Respond with ONLY valid JSON, no other text.
     {"step": "Step 2", "description": "Action"}
   ]
 }"""
+    return prompt
 
-    try:
-        response = ollama.generate(
-            model="llama2",
-            prompt=prompt,
-            options={"temperature": 0.2}  # Even lower temperature for more consistent JSON
-        )
+def _validate_summary(parsed) -> Dict:
+    """The summary in a parsed reply, or ValueError naming what violates SUMMARY_SCHEMA"""
+    if not isinstance(parsed, dict):
+        raise ValueError("expected a JSON object")
+    title, description, steps = parsed.get("title"), parsed.get("description"), parsed.get("implementation_steps")
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("'title' is missing or empty")
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("'description' is missing or empty")
+    if not isinstance(steps, list):
+        raise ValueError("'implementation_steps' is not an array")
+    return {
+        "title": title.strip(),
+        "description": description.strip(),
+        "implementation_steps": [
+            {"step": step["step"], "description": str(step.get("description", ""))}
+            for step in steps if isinstance(step, dict) and isinstance(step.get("step"), str)
+        ]
+    }
+
+def _repair_prompt(prompt: str, raw_output: str, error: str) -> str:
+    return f"""{prompt}
+
+Your previous reply could not be used ({error}):
+{raw_output[:1000]}
 
+Respond again with ONLY the corrected JSON."""
+
+async def _generate_validated(prompt: str, schema: Dict, validate, extract):
+    """Generate a JSON reply and validate it, re-prompting with the error up to LLM_JSON_RETRIES times
+
+    With LLM_STRUCTURED_OUTPUT the schema is passed to Ollama, so replies are normally valid
+    JSON; extract (the legacy text scanner) only recovers replies from servers that ignore it.
+    Returns the validated value, or None when every attempt was unusable. LLM errors propagate.
+    """
+    attempt_prompt = prompt
+    for attempt in range(config.llm_json_retries + 1):
+        response = await get_llm_client().generate(
+            attempt_prompt, format=schema if config.llm_structured_output else None,
+            temperature=None if attempt == 0 else 0.0)
         raw_output = response["response"].strip()
         print(f"LLM Raw Response: {raw_output[:200]}...")  # Debug log
 
-        # Try to extract JSON with multiple strategies
-        parsed = _extract_json_from_text(raw_output)
-        
-        if parsed:
-            return {
-                "title": parsed.get("title", "Untitled"),
-                "description": parsed.get("description", ""),
-                "implementation_steps": parsed.get("implementation_steps", [])
-            }
-        else:
-            # Fallback to heuristic-based summary
-            print("LLM failed to return valid JSON, using fallback summary")
-            return _generate_fallback_summary(control_list, org_context)
+        repaired = False
+        try:
+            parsed = json.loads(raw_output)
+        except json.JSONDecodeError:
+            parsed, repaired = extract(raw_output), True
+        try:
+            if not parsed:
+                raise ValueError("no JSON found")
+            result = validate(parsed)
+        except ValueError as e:
+            _count(_reply_stats, replies=1, invalid_replies=1)
+            print(f"LLM reply rejected: {e}")
+            if attempt < config.llm_json_retries:
+                _count(_reply_stats, retries=1)
+                attempt_prompt = _repair_prompt(prompt, raw_output, str(e))
+            continue
+        _count(_reply_stats, replies=1, **({"repaired": 1} if repaired else {"parsed": 1}))
+        return result
+    return None
+
+def get_structured_output_stats() -> Dict:
+    """Reply counters: valid JSON, recovered by text scanning, invalid, retries and heuristic fallbacks"""
+    with _stats_lock:
+        stats = dict(_reply_stats)
+    usable = stats["parsed"] + stats["repaired"]
+    stats["parse_success_rate"] = round(usable / stats["replies"], 4) if stats["replies"] else 0.0
+    stats["structured_output"] = config.llm_structured_output
+    return stats
 
+async def summarize_controls_async(control_list, org_context: Optional[Dict] = None) -> Dict:
+    """Summarize a group of controls with the LLM; runs on the LLM client's event loop"""
+    if not control_list:
+        return {
+            "title": "No Controls Provided",
+            "description": "The list of controls was empty.",
+            "implementation_steps": []
+        }
+
+    # Same members, context, model and prompt as an earlier run: reuse its summary
+    cached = await _cached_summary(control_list, org_context)
+    if cached is not None:
+        return cached
+
+    summary = None
+    try:
+        summary = await _generate_validated(_build_prompt(control_list, org_context), SUMMARY_SCHEMA,
+                                            _validate_summary, _extract_json_from_text)
     except Exception as e:
         print(f"Error during summarization: {str(e)}")
-        print(f"LLM Response: {response.get('response', 'No response')[:200]}...")
-        
-        # Return fallback summary
+
+    if summary is None:
+        # Fallback to heuristic-based summary
+        print("LLM failed to return a valid summary, using fallback summary")
+        _count(_reply_stats, fallbacks=1)
         return _generate_fallback_summary(control_list, org_context)
+
+    # Only real LLM summaries are cached; fallbacks are retried next time
+    await _cache_summary(control_list, org_context, summary, PROMPT_VERSION)
+    return summary
+
+def summarize_controls(control_list, org_context: Optional[Dict] = None) -> Dict:
+    """Blocking summarize_controls_async for synchronous callers"""
+    return get_llm_client().submit(summarize_controls_async(control_list, org_context)).result()
+
+def plan_packs(groups: List[List[Dict]], max_tokens: int, max_groups: int) -> List[List[int]]:
+    """Greedily pack consecutive groups into prompts within a token budget
+
+    A group costs its estimated prompt tokens plus the output reserved for its summary.
+    Groups too large to share half of a prompt are packed alone.
+
+    Returns:
+        List[List[int]]: positions in groups, one list per prompt
+    """
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = _PACKED_PREAMBLE_TOKENS
+    for i, group in enumerate(groups):
+        cost = sum(estimate_control_tokens(c) for c in group) + _SUMMARY_OUTPUT_TOKENS
+        if _PACKED_PREAMBLE_TOKENS + cost > max_tokens / 2:
+            packs.append([i])
+            continue
+        if current and (used + cost > max_tokens or len(current) >= max_groups):
+            packs.append(current)
+            current, used = [], _PACKED_PREAMBLE_TOKENS
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+def _build_packed_prompt(groups: Dict[str, List[Dict]], org_context: Optional[Dict] = None) -> str:
+    sections = "\n\n".join(
+        f'Group "{group_id}":\n' + "\n".join(format_control(c) for c in group) for group_id, group in groups.items()
+    )
+    prompt = f"""You are a cybersecurity expert. Summarize each group of security controls below into its own unified control.
+
+{sections}"""
+    prompt += _org_context_section(org_context)
+    prompt += f"""
+
+IMPORTANT: Respond with ONLY valid JSON, no other text: an object whose "summaries" array has exactly one entry per group ({len(groups)} in total).
+
+{{
+  "summaries": [
+    {{
+      "group_id": "Group id exactly as given above",
+      "title": "Unified control title",
+      "description": "2-3 sentence summary",
+      "implementation_steps": [
+        {{"step": "Step 1", "description": "Action"}},
+        {{"step": "Step 2", "description": "Action"}}
+      ]
+    }}
+  ]
+}}"""
+    return prompt
+
+def _extract_json_array_from_text(text: str) -> List:
+    """The list of objects in an LLM response (bare array, or an object wrapping one), else []"""
+    if not text:
+        return []
+    cleaned_text = re.sub(r'```(?:json)?\s*', '', text).strip()
+    candidates = [cleaned_text]
+    start, end = cleaned_text.find('['), cleaned_text.rfind(']')
+    if start != -1 and end > start:
+        candidates.append(cleaned_text[start:end + 1])
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            parsed = next((value for value in parsed.values() if isinstance(value, list)), [])
+        if isinstance(parsed, list):
+            return [item for item in parsed if isinstance(item, dict)]
+    return []
+
+def _count(stats: Dict, **counts):
+    with _stats_lock:
+        for name, value in counts.items():
+            stats[name] += value
+
+def get_packing_stats() -> Dict:
+    """Prompt packing counters: packed prompts sent, groups they covered, groups re-summarized alone"""
+    with _stats_lock:
+        stats = dict(_packing_stats)
+    stats["enabled"] = config.enable_prompt_packing
+    return stats
+
+def _validate_packed(parsed, group_ids) -> Dict[str, Dict]:
+    """Valid summaries of a packed reply by group id (first one per requested id; others ignored)"""
+    items = parsed.get("summaries") if isinstance(parsed, dict) else parsed
+    if not isinstance(items, list):
+        raise ValueError("'summaries' is not an array")
+    summaries: Dict[str, Dict] = {}
+    for item in items:
+        group_id = str(item.get("group_id", "")) if isinstance(item, dict) else ""
+        if group_id in group_ids and group_id not in summaries:
+            try:
+                summaries[group_id] = _validate_summary(item)
+            except ValueError:
+                continue
+    if not summaries:
+        raise ValueError("no valid summary for any requested group id")
+    return summaries
+
+async def summarize_packed_async(groups: Dict[str, List[Dict]], org_context: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Summarize several groups with one LLM call; runs on the LLM client's event loop
+
+    The reply must hold one summary per group id (PACKED_SUMMARY_SCHEMA). Groups that are
+    missing, duplicated or invalid in the reply (or all of them, if the call fails) are
+    summarized with their own summarize_controls_async call.
+    """
+    summaries: Dict[str, Dict] = {}
+    misses: Dict[str, List[Dict]] = {}
+    for group_id, group in groups.items():
+        cached = await _cached_summary(group, org_context) if group else None
+        if cached is not None:
+            summaries[group_id] = cached
+        else:
+            misses[group_id] = group
+
+    if len(misses) > 1:
+        packed = None
+        try:
+            packed = await _generate_validated(_build_packed_prompt(misses, org_context), PACKED_SUMMARY_SCHEMA,
+                                               lambda parsed: _validate_packed(parsed, misses),
+                                               _extract_json_array_from_text)
+        except Exception as e:
+            print(f"Error during packed summarization of {len(misses)} groups: {str(e)}")
+
+        for group_id, summary in (packed or {}).items():
+            summaries[group_id] = summary
+            await _cache_summary(misses[group_id], org_context, summary, PACKED_PROMPT_VERSION)
+
+        dropped = len([group_id for group_id in misses if group_id not in summaries])
+        _count(_packing_stats, packed_prompts=1, packed_groups=len(misses), packed_groups_dropped=dropped)
+        if dropped:
+            print(f"Packed reply covered {len(misses) - dropped} of {len(misses)} groups; summarizing the rest alone")
+
+    # Groups the packed reply dropped (or a lone miss) get their own call
+    remaining = [group_id for group_id in misses if group_id not in summaries]
+    results = await asyncio.gather(*(summarize_controls_async(misses[group_id], org_context) for group_id in remaining))
+    summaries.update(zip(remaining, results))
+    return summaries
@@ -0,0 +1,145 @@
+"""
+Persistent, content-addressed cache of LLM cluster summaries
+
+A summary is keyed by a hash of its member controls (framework, name and description,
+sorted, so member order does not matter), the canonicalized organization context, the
+LLM model and the summarization prompt version. Entries live in a SQLite database (WAL
+mode) shared by every worker on the node, so re-running harmonization over a mostly
+unchanged catalog only calls the LLM for groups that changed. Bumping the prompt version
+invalidates old entries implicitly; clear() drops them explicitly.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+def summary_key(controls: List[Dict], org_context: Optional[Dict], model: str, prompt_version: str) -> str:
+    """Content hash identifying one summarization request"""
+    members = sorted((c["framework"], c["name"], c["description"]) for c in controls)
+    payload = json.dumps({
+        "members": members,
+        "org_context": org_context,
+        "model": model,
+        "prompt_version": prompt_version
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class SummaryCache:
+    """SQLite-backed summary cache safe for concurrent multi-process access"""
+
+    def __init__(self, path: str, ttl_seconds: float = 0.0, timeout: float = 30.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " summary TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The cached summary, or None on a miss (or an entry older than the TTL)"""
+        return self.get_any([key])
+
+    def get_any(self, keys: List[str]) -> Optional[Dict]:
+        """The cached summary under the first of keys present (counted as one lookup)"""
+        try:
+            rows = dict(
+                (row[0], row[1:]) for row in self._connection().execute(
+                    f"SELECT key, summary, created_at FROM summaries WHERE key IN ({','.join('?' * len(keys))})",
+                    keys
+                )
+            )
+        except sqlite3.Error as e:
+            print(f"Summary cache read failed: {e}")
+            self._count(errors=1, misses=1)
+            return None
+
+        for key in keys:
+            row = rows.get(key)
+            if row is not None and not (self.ttl_seconds and time.time() - row[1] > self.ttl_seconds):
+                self._count(hits=1)
+                return json.loads(row[0])
+        self._count(misses=1)
+        return None
+
+    def put(self, key: str, summary: Dict, model: str, prompt_version: str):
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, model, prompt_version, created_at, summary)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, model, prompt_version, time.time(), json.dumps(summary))
+                )
+        except sqlite3.Error as e:
+            print(f"Summary cache write failed: {e}")
+            self._count(errors=1)
+            return
+        self._count(writes=1)
+
+    def clear(self, model: Optional[str] = None) -> int:
+        """Delete cached summaries for one model, or all of them; returns the number removed"""
+        conn = self._connection()
+        with conn:
+            if model:
+                cursor = conn.execute("DELETE FROM summaries WHERE model = ?", (model,))
+            else:
+                cursor = conn.execute("DELETE FROM summaries")
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def _count(self, hits: int = 0, misses: int = 0, writes: int = 0, errors: int = 0):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+            self.writes += writes
+            self.errors += errors
+
+    def stats(self) -> Dict:
+        """Stored entry count and this process's hit/miss/write counters"""
+        try:
+            entries = self.count()
+        except sqlite3.Error:
+            entries = None
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,145 @@
+"""
+Nearest-neighbour search backends over normalized embedding matrices
+
+All backends take L2-normalized vectors (one row per item, float32 or a
+services.quantization.QuantizedEmbeddings matrix) and return (indices, scores) for the
+top k items by cosine similarity, best first.
+
+- ExactIndex: dense matrix-vector product with partial top-k selection
+- IVFIndex: inverted-file partitions (spherical k-means); a query only scores the
+  vectors in its n_probe closest partitions, so latency grows sublinearly with size
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.config import config
+from services.quantization import as_float32
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (indices, scores) of the k largest scores, best first, without a full sort"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    order = np.argsort(-scores[candidates], kind="stable")
+    indices = candidates[order]
+    return indices, scores[indices]
+
+class ExactIndex:
+    """Brute-force cosine search over all vectors"""
+
+    name = "exact"
+
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = embeddings
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return top_k(self.embeddings @ query, k)
+
+class IVFIndex:
+    """Inverted-file index: vectors are partitioned by their nearest k-means centroid"""
+
+    name = "ivf"
+
+    def __init__(self, embeddings: np.ndarray, n_lists: int = 0, n_probe: int = 16,
+                 n_iter: int = 10, seed: int = 0):
+        self.embeddings = embeddings
+        n = embeddings.shape[0]
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        self.n_probe = max(1, min(self.n_lists, n_probe))
+
+        start_time = time.time()
+        self.centroids = spherical_kmeans(embeddings, self.n_lists, n_iter, seed)
+        assignments = nearest_centroid(embeddings, self.centroids)
+
+        # Member ids grouped by list so a probe is a contiguous slice of self.order
+        self.order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.build_time = time.time() - start_time
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    def members(self, list_id: int) -> np.ndarray:
+        """Ids of the vectors assigned to one list"""
+        return self.order[self.offsets[list_id]:self.offsets[list_id + 1]]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probe_lists, _ = top_k(self.centroids @ query, self.n_probe)
+        members = np.concatenate([self.members(i) for i in probe_lists])
+
+        local, scores = top_k(self.embeddings[members] @ query, k)
+        return members[local], scores
+
+def nearest_centroid(embeddings: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Assign each vector to its most similar centroid, chunked to bound memory"""
+    assignments = np.empty(embeddings.shape[0], dtype=np.int64)
+    for start in range(0, embeddings.shape[0], chunk_size):
+        block = embeddings[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+def spherical_kmeans(embeddings: np.ndarray, n_clusters: int, n_iter: int, seed: int,
+                      max_train_per_cluster: int = 64) -> np.ndarray:
+    """Cosine k-means on a training sample; returns normalized centroids"""
+    rng = np.random.default_rng(seed)
+    n = embeddings.shape[0]
+    train_size = min(n, n_clusters * max_train_per_cluster)
+    train = embeddings[rng.choice(n, size=train_size, replace=False)] if train_size < n else embeddings
+    train = as_float32(train)
+
+    centroids = train[rng.choice(train.shape[0], size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = nearest_centroid(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, train)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty lists with random training vectors
+        if empty.any():
+            sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()))]
+            norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+def create_search_index(embeddings: np.ndarray, backend: Optional[str] = None):
+    """Build the configured search backend; small catalogs always use exact search"""
+    backend = backend or config.search_backend
+    if backend == "exact" or embeddings.shape[0] < config.ann_min_catalog_size:
+        return ExactIndex(embeddings)
+    if backend == "ivf":
+        return IVFIndex(embeddings, n_lists=config.ivf_lists, n_probe=config.ivf_probe)
+    raise ValueError(f"Unknown search backend: {backend}")
+
+def evaluate_search(index, embeddings: np.ndarray, queries: np.ndarray, k: int = 10) -> Dict:
+    """Measure recall@k against exact search and per-query latency for a search index"""
+    exact = ExactIndex(embeddings)
+    hits = 0
+    latencies: List[float] = []
+    for query in queries:
+        expected, _ = exact.search(query, k)
+        start_time = time.perf_counter()
+        found, _ = index.search(query, k)
+        latencies.append(time.perf_counter() - start_time)
+        hits += len(np.intersect1d(expected, found))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": index.name,
+        "catalog_size": int(embeddings.shape[0]),
+        "k": k,
+        f"recall_at_{k}": round(hits / max(1, len(queries) * min(k, embeddings.shape[0])), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 3),
+        "n_probe": getattr(index, "n_probe", None),
+        "n_lists": getattr(index, "n_lists", None)
+    }
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for streamed batch harmonization events
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import json
+import time
+
+import services.batch as batch
+from fastapi.testclient import TestClient
+from fixtures import topic_controls, topic_embeddings
+from main import app
+
+summarized = []
+
+async def _staggered_summary(group, org_context=None):
+    summarized.append(group[0]["name"])
+    # Topic 0 finishes last, so completion order differs from cluster order
+    await asyncio.sleep(0.4 if group[0]["name"] == "Topic 0" else 0.05)
+    return {"title": group[0]["name"], "description": "summary", "implementation_steps": []}
+
+def test_batch_stream():
+    """Test the event order, completion-order results and the final summary event"""
+    controls = topic_controls(n_topics=4, per_topic=2)
+    original = batch.get_embeddings, batch.summarize_controls_async
+    batch.get_embeddings, batch.summarize_controls_async = topic_embeddings, _staggered_summary
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: Clustering first, unified controls as they finish, summary last")
+        print("=" * 60)
+
+        start_time = time.time()
+        events = []
+        for event in batch.iter_batch_harmonize(controls, fast_mode=False):
+            events.append((event, time.time() - start_time))
+            if event["event"] == "clustering":
+                # cluster membership arrives before any LLM call is made
+                assert summarized == []
+        names = [event["event"] for event, _ in events]
+        print(f"Events: {names}")
+        assert names == ["clustering"] + ["unified_control"] * 4 + ["summary"]
+
+        clustering, _ = events[0]
+        assert clustering["total_clusters"] == 4
+        assert sorted(len(c["control_ids"]) for c in clustering["clusters"]) == [2, 2, 2, 2]
+
+        titles = [event["unified_control"]["title"] for event, _ in events[1:-1]]
+        print(f"Completion order: {titles}")
+        assert titles[-1] == "Topic 0" and sorted(titles) == [f"Topic {t}" for t in range(4)]
+        # the fast groups were streamed before the slow one finished
+        assert events[1][1] < 0.3 and events[4][1] >= 0.4
+
+        summary, _ = events[-1]
+        print(f"Summary: {summary}")
+        assert summary["total_clusters"] == 4 and summary["controls_processed"] == len(controls)
+        assert summary["state_id"] is None and summary["deduplication"] == clustering["deduplication"]
+
+        print("=" * 60)
+        print("TEST CASE 2: The endpoint streams the same events as SSE and NDJSON")
+        print("=" * 60)
+
+        client = TestClient(app)
+        body = {"controls": controls, "fast_mode": True}
+        response = client.post("/batch-harmonize/stream", json=body)
+        assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        assert [line["event"] for line in lines] == names
+        assert all(line["unified_control"]["fast_mode"] for line in lines[1:-1])
+        assert lines[-1]["controls_processed"] == len(controls)
+
+        response = client.post("/batch-harmonize/stream?format=sse", json=body)
+        sse_events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+        print(f"SSE events: {sse_events}")
+        assert response.headers["content-type"].startswith("text/event-stream") and sse_events == names
+    finally:
+        batch.get_embeddings, batch.summarize_controls_async = original
+
+if __name__ == "__main__":
+    test_batch_stream()
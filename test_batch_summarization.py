@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for concurrent summarization of clusters and unclustered controls
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import time
+
+import numpy as np
+import services.batch as batch
+from fixtures import control, slow_summary, topic_embeddings
+from services.config import config
+
+def _controls():
+    # two clusters of two controls each, plus three unrelated controls
+    return [control(i, t) for i, t in enumerate([0, 0, 1, 1, 2, 3, 4])]
+
+def test_outliers_share_the_pool():
+    """Test that outlier groups are summarized concurrently with the clusters"""
+    original = batch.get_embeddings, batch.summarize_controls_async, config.outlier_summary_mode
+    batch.get_embeddings, batch.summarize_controls_async = topic_embeddings, slow_summary(0.3)
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: Chunked outliers run alongside clusters")
+        print("=" * 60)
+
+        start_time = time.time()
+        result = batch.batch_harmonize_from_input(_controls())
+        elapsed = time.time() - start_time
+        ids = [uc["unified_control_id"] for uc in result["unified_controls"]]
+        print(f"Unified controls {ids} in {elapsed:.2f}s")
+        assert ids == ["UC-000", "UC-001", "UC-999"]
+        # three groups of 0.3s each in parallel, not clusters followed by a serial outlier call
+        assert elapsed < 0.55
+
+        print("=" * 60)
+        print("TEST CASE 2: One summary per unclustered control")
+        print("=" * 60)
+
+        config.outlier_summary_mode = "per_control"
+        result = batch.batch_harmonize_from_input(_controls())
+        outliers = [uc for uc in result["unified_controls"] if not uc["is_clustered"]]
+        print(f"Outlier groups: {[uc['unified_control_id'] for uc in outliers]}")
+        assert [len(uc["mapped_controls"]) for uc in outliers] == [1, 1, 1]
+        assert [uc["unified_control_id"] for uc in outliers] == ["UC-999-01", "UC-999-02", "UC-999-03"]
+    finally:
+        batch.get_embeddings, batch.summarize_controls_async, config.outlier_summary_mode = original
+
+def _pairs(n_pairs, n_outliers, dim=256):
+    """Controls C-<pair>-0/1 with near-identical embeddings, plus unrelated controls O-<i>"""
+    rng = np.random.default_rng(0)
+    controls, vectors = [], []
+    for pair in range(n_pairs):
+        base = rng.standard_normal(dim)
+        for member in range(2):
+            controls.append({"framework": "TEST", "control_id": f"C-{pair}-{member}", "name": f"Pair {pair}",
+                             "description": f"pair {pair} member {member}"})
+            vectors.append(base + 0.1 * rng.standard_normal(dim))
+    for i in range(n_outliers):
+        controls.append({"framework": "TEST", "control_id": f"O-{i}", "name": f"Outlier {i}",
+                         "description": f"outlier {i}"})
+        vectors.append(rng.standard_normal(dim))
+    vectors = np.array(vectors, dtype=np.float32)
+    return controls, vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_thousand_clusters():
+    """Test that cluster ids never collide with the outlier group beyond 999 clusters"""
+    original = batch.summarize_controls_async
+    batch.summarize_controls_async = slow_summary(0)
+    try:
+        print("=" * 60)
+        print("TEST CASE 3: 1001 clusters and an outlier group")
+        print("=" * 60)
+
+        controls, embeddings = _pairs(1001, 2)
+        result = batch.batch_harmonize_from_input(controls, embeddings=embeddings)
+        ids = [uc["unified_control_id"] for uc in result["unified_controls"]]
+        print(f"{len(ids)} unified controls: {ids[:2]} ... {ids[-3:]}")
+        assert len(set(ids)) == len(ids) == 1002
+        assert ids[-3:] == ["UC-1000", "UC-1001", "UC-999"]
+        # every control is mapped exactly once, pairs together and the outliers in UC-999
+        mapped = [sorted(c["control_id"] for c in uc["mapped_controls"]) for uc in result["unified_controls"]]
+        assert sorted(c for group in mapped for c in group) == sorted(c["control_id"] for c in controls)
+        assert mapped[-1] == ["O-0", "O-1"] and not result["unified_controls"][-1]["is_clustered"]
+        assert all(group[0][:-1] == group[1][:-1] for group in mapped[:-1])
+        # incremental states number new clusters with the same helper
+        assert [batch._cluster_id(n) for n in (0, 998, 999, 1000)] == ["UC-000", "UC-998", "UC-1000", "UC-1001"]
+    finally:
+        batch.summarize_controls_async = original
+
+if __name__ == "__main__":
+    test_outliers_share_the_pool()
+    test_thousand_clusters()
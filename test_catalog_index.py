@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for the precomputed catalog index and its scoped searches
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import tempfile
+import zlib
+
+import numpy as np
+from fastapi import HTTPException
+
+import api.routes as routes
+import services.catalog_index as catalog_index
+from services.catalog_index import CatalogIndex, build_catalog_index
+from services.config import config
+
+CONTROLS = [
+    {"framework": "NIST", "control_id": "AC-2", "name": "Account Management", "description": "Manage accounts"},
+    {"framework": "ISO 27001", "control_id": "A.9.2.1", "name": "User registration", "description": "Register users"},
+    {"framework": "nist ", "control_id": "AC-10", "name": "Concurrent Sessions", "description": "Limit sessions"},
+    {"framework": "NIST", "control_id": "AU-2", "name": "Audit Events", "description": "Log audit events"},
+    {"framework": "ISO 27001", "control_id": "A.12.4.1", "name": "Event logging", "description": "Log events"},
+    {"framework": "NIST", "control_id": "AC-3", "name": "Access Enforcement", "description": "Enforce access"}
+]
+
+def _index():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((len(CONTROLS), 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return CatalogIndex(CONTROLS, vectors, "0" * 64, "test-model")
+
+def _found(search_index, query, k=10):
+    rows, scores = search_index.search(query, k)
+    assert list(scores) == sorted(scores, reverse=True)
+    return sorted(CONTROLS[row]["control_id"] for row in rows)
+
+def test_catalog_index():
+    """Test framework partitions, control-id prefix ranges and the /harmonize 404"""
+    index = _index()
+    query = index.embeddings[0]
+
+    print("=" * 60)
+    print("TEST CASE 1: Framework filters are case- and whitespace-insensitive")
+    print("=" * 60)
+
+    found = _found(index.scoped_index(frameworks=["NIST"]), query)
+    print(f"NIST: {found}")
+    assert found == ["AC-10", "AC-2", "AC-3", "AU-2"]
+    assert _found(index.scoped_index(frameworks=[" nist", "iso 27001"]), query) == sorted(c["control_id"] for c in CONTROLS)
+    assert index.scoped_index() is index.search_index
+    assert index.scoped_index(exact=True) is index.exact_index
+
+    print("=" * 60)
+    print("TEST CASE 2: Control-id prefixes select a contiguous sorted range")
+    print("=" * 60)
+
+    found = _found(index.scoped_index(control_id_prefix="AC-"), query)
+    print(f"AC-*: {found}")
+    assert found == ["AC-10", "AC-2", "AC-3"]
+    assert _found(index.scoped_index(control_id_prefix="AC-1"), query) == ["AC-10"]
+    assert _found(index.scoped_index(frameworks=["iso 27001"], control_id_prefix="A."), query) == ["A.12.4.1", "A.9.2.1"]
+    assert _found(index.scoped_index(control_id_prefix="AC-", exact=True), query, k=1) == ["AC-2"]
+
+    print("=" * 60)
+    print("TEST CASE 3: Filters matching nothing give an empty result and a 404")
+    print("=" * 60)
+
+    for search_index in (index.scoped_index(frameworks=["PCI DSS"]),
+                         index.scoped_index(control_id_prefix="ZZ-"),
+                         index.scoped_index(frameworks=["ISO 27001"], control_id_prefix="AC-")):
+        rows, scores = search_index.search(query, 5)
+        assert len(rows) == 0 and len(scores) == 0
+
+    original = routes.match_control
+    routes.match_control = lambda *args, **kwargs: []
+    try:
+        routes.harmonize_control(routes.ControlInput(description="Manage accounts", frameworks=["PCI DSS"]))
+        raise AssertionError("unmatched filter did not raise")
+    except HTTPException as e:
+        print(f"/harmonize: {e.status_code} {e.detail}")
+        assert e.status_code == 404
+    finally:
+        routes.match_control = original
+
+embedded = []
+
+def _fake_embeddings(texts):
+    embedded.extend(texts)
+    vectors = np.array([np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8) for text in texts],
+                       dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _write_catalog(path, controls):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(controls, f)
+
+def test_index_persistence():
+    """Test that the stored index is reused until the catalog changes"""
+    original = catalog_index.get_embeddings
+    catalog_index.get_embeddings = _fake_embeddings
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            catalog_path, index_dir = os.path.join(work_dir, "catalog.json"), os.path.join(work_dir, "index")
+            _write_catalog(catalog_path, CONTROLS)
+
+            print("=" * 60)
+            print("TEST CASE 4: The catalog is embedded once, then loaded from disk")
+            print("=" * 60)
+
+            embedded.clear()
+            first = build_catalog_index(catalog_path, index_dir)
+            assert len(embedded) == len(CONTROLS)
+            second = build_catalog_index(catalog_path, index_dir)
+            print(f"Index files: {sorted(os.listdir(index_dir))}")
+            assert len(embedded) == len(CONTROLS)
+            assert second.catalog_hash == first.catalog_hash and second.controls == CONTROLS
+            assert np.array_equal(second.embeddings, first.embeddings)
+
+            print("=" * 60)
+            print("TEST CASE 5: A changed catalog or another model invalidates the index")
+            print("=" * 60)
+
+            changed = CONTROLS + [{"framework": "PCI DSS", "control_id": "8.2", "name": "Authentication",
+                                   "description": "Authenticate users"}]
+            _write_catalog(catalog_path, changed)
+            embedded.clear()
+            third = build_catalog_index(catalog_path, index_dir)
+            print(f"Re-embedded {len(embedded)} controls, hash {third.catalog_hash[:16]}")
+            assert third.catalog_hash != first.catalog_hash and len(embedded) == len(changed)
+            assert len(third) == len(changed)
+            assert np.array_equal(third.embeddings[:len(CONTROLS)], first.embeddings)
+
+            # Only the current index is kept for this model; other models' indexes are untouched
+            other = CatalogIndex(CONTROLS, first.embeddings, first.catalog_hash, config.embedding_model_key + "_v2")
+            other.save(index_dir)
+            current = [os.path.basename(path) for path in
+                       catalog_index._index_paths(index_dir, config.embedding_model_key, third.catalog_hash)]
+            print(f"Index files: {sorted(os.listdir(index_dir))}")
+            assert sorted(os.listdir(index_dir)) == sorted(current + [
+                os.path.basename(path) for path in
+                catalog_index._index_paths(index_dir, other.model_name, other.catalog_hash)])
+            assert CatalogIndex.load(index_dir, config.embedding_model_key, first.catalog_hash) is None
+
+            assert CatalogIndex.load(index_dir, config.embedding_model_key, third.catalog_hash) is not None
+            assert CatalogIndex.load(index_dir, "other-model", third.catalog_hash) is None
+    finally:
+        catalog_index.get_embeddings = original
+
+if __name__ == "__main__":
+    test_catalog_index()
+    test_index_persistence()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the sparse-neighbourhood clustering engine
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from services.clustering import cluster_embeddings, radius_graph_exact, radius_graph_ivf, split_oversized_groups
+from services.config import config
+from services.vector_index import IVFIndex
+
+def _clustered_vectors(n_topics=20, per_topic=15, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim))
+    vectors = np.repeat(topics, per_topic, axis=0) + 0.3 * rng.standard_normal((n_topics * per_topic, dim))
+    outliers = 3 * rng.standard_normal((10, dim))
+    vectors = np.vstack([vectors, outliers]).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_clustering_modes():
+    """Test that sparse clustering reproduces the exact DBSCAN reference"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Sparse exact graph vs DBSCAN reference")
+    print("=" * 60)
+
+    vectors = _clustered_vectors()
+    exact = cluster_embeddings(vectors, eps=0.4, min_samples=2, mode="exact")
+    sparse_labels = cluster_embeddings(vectors, eps=0.4, min_samples=2, mode="sparse")
+    print(f"Exact: {exact.max() + 1} clusters, sparse: {sparse_labels.max() + 1} clusters")
+    assert np.array_equal(exact, sparse_labels)
+
+    print("=" * 60)
+    print("TEST CASE 2: IVF graph edges are a subset of the exact graph")
+    print("=" * 60)
+
+    exact_graph = radius_graph_exact(vectors, 0.4)
+    ivf_graph = radius_graph_ivf(vectors, 0.4, IVFIndex(vectors, n_lists=8, n_probe=8))
+    print(f"Exact edges: {exact_graph.nnz}, IVF edges: {ivf_graph.nnz}")
+    # Probing every list finds every edge
+    assert ivf_graph.nnz == exact_graph.nnz
+
+    # Batches from CLUSTERING_IVF_MIN_SIZE on build the IVF graph
+    original = config.clustering_ivf_min_size
+    config.clustering_ivf_min_size = 100
+    try:
+        ivf_labels = cluster_embeddings(vectors, eps=0.4, min_samples=2, mode="sparse")
+    finally:
+        config.clustering_ivf_min_size = original
+    assert np.array_equal(exact, ivf_labels)
+
+    print("=" * 60)
+    print("TEST CASE 3: Duplicate vectors stay neighbours")
+    print("=" * 60)
+
+    duplicates = np.vstack([vectors[:1], vectors[:1]])
+    labels = cluster_embeddings(duplicates, eps=0.4, min_samples=2, mode="sparse")
+    assert list(labels) == [0, 0]
+
+def test_split_oversized_groups():
+    """Test that oversized groups are split into coherent groups within budget"""
+
+    print("=" * 60)
+    print("TEST CASE 4: Member and weight budgets")
+    print("=" * 60)
+
+    vectors = _clustered_vectors(n_topics=4, per_topic=15)[:60]
+    everything = np.arange(60)
+    groups = split_oversized_groups(vectors, [everything, np.array([], dtype=np.int64)], max_members=20)
+    sizes = [len(g) for g in groups if len(g)]
+    print(f"Member-bounded group sizes: {sizes}")
+    assert max(sizes) <= 20
+    assert sorted(np.concatenate(groups).tolist()) == everything.tolist()
+    # k-means recovers the topics, so no group mixes two of them
+    assert all(len(set(g // 15)) == 1 for g in groups if len(g))
+
+    weights = np.full(60, 10.0)
+    weights[0] = 500.0
+    groups = split_oversized_groups(vectors, [everything], max_weight=100.0, weights=weights)
+    print(f"Weight-bounded groups: {len(groups)}")
+    assert all(weights[g].sum() <= 100.0 or len(g) == 1 for g in groups)
+
+    print("=" * 60)
+    print("TEST CASE 5: Identical vectors fall back to equal slices")
+    print("=" * 60)
+
+    identical = np.repeat(vectors[:1], 10, axis=0)
+    groups = split_oversized_groups(identical, [np.arange(10)], max_members=3)
+    assert [len(g) for g in groups] == [3, 3, 2, 2]
+
+if __name__ == "__main__":
+    test_clustering_modes()
+    test_split_oversized_groups()
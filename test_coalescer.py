@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script for micro-batched query embeddings
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from services.coalescer import EmbeddingCoalescer
+
+class _StubEncoder:
+    """Encodes "text <n>" as [n, batch size]; calls from the coalescer thread wait for release"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.release = threading.Event()
+        self.release.set()
+        self.batches = []
+
+    def __call__(self, texts):
+        if threading.current_thread().name == "embedding-coalescer":
+            self.release.wait()
+            self.batches.append(len(texts))
+        time.sleep(self.delay)
+        return np.array([[int(text.split()[1]), len(texts)] for text in texts], dtype=np.float32)
+
+def test_coalescer():
+    """Test that concurrent submits share batches and that a stalled batch falls back"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Concurrent submits are encoded together")
+    print("=" * 60)
+
+    encoder = _StubEncoder(delay=0.05)
+    coalescer = EmbeddingCoalescer(encoder, window_ms=50, max_batch_size=8)
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        vectors = list(pool.map(lambda i: coalescer.encode(f"text {i}"), range(20)))
+    stats = coalescer.stats()
+    print(f"Batches: {encoder.batches}, stats: {stats}")
+    # every caller gets its own vector back
+    assert [int(v[0]) for v in vectors] == list(range(20))
+    assert sum(encoder.batches) == 20 and max(encoder.batches) <= 8 and len(encoder.batches) < 20
+    assert stats["requests"] == 20 and stats["batches"] == len(encoder.batches) and stats["fallbacks"] == 0
+
+    print("=" * 60)
+    print("TEST CASE 2: A stalled batch falls back to a direct encode")
+    print("=" * 60)
+
+    encoder = _StubEncoder()
+    encoder.release.clear()
+    coalescer = EmbeddingCoalescer(encoder, window_ms=1, timeout_seconds=0.2)
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        stalled = pool.submit(coalescer.encode, "text 1")
+        time.sleep(0.05)
+        # queued behind the stalled batch, withdrawn once it times out
+        queued = pool.submit(coalescer.encode, "text 2")
+        results = [stalled.result(), queued.result()]
+    elapsed = time.time() - start_time
+    print(f"Fallback results {results} in {elapsed:.2f}s, stats: {coalescer.stats()}")
+    assert [r.tolist() for r in results] == [[1.0, 1.0], [2.0, 1.0]]
+    assert elapsed < 1.0 and coalescer.stats()["fallbacks"] == 2
+
+    encoder.release.set()
+    assert coalescer.encode("text 3").tolist() == [3.0, 1.0]
+    time.sleep(0.05)
+    # the withdrawn request was skipped, not encoded after its caller left
+    print(f"Batches after release: {encoder.batches}")
+    assert encoder.batches == [1, 1]
+    assert coalescer.stats()["fallbacks"] == 2
+
+if __name__ == "__main__":
+    test_coalescer()
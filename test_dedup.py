@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for duplicate control elimination
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import services.batch as batch
+from services.dedup import deduplicate_controls, normalize_text
+
+BASE = ("The organization manages information system accounts, including establishing, activating, "
+        "modifying, reviewing, disabling, and removing accounts on a defined schedule")
+
+def _control(control_id, description, framework="NIST"):
+    return {"framework": framework, "control_id": control_id, "name": control_id, "description": description}
+
+def test_dedup():
+    """Test exact and near-duplicate grouping and the batch pipeline mapping"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Exact duplicates after normalization")
+    print("=" * 60)
+
+    assert normalize_text("  Access\tCONTROL \n policy ") == "access control policy"
+    controls = [
+        _control("AC-2", BASE),
+        _control("A.9.2.1", "  " + BASE.upper() + "\n", framework="ISO"),
+        _control("AU-2", "Audit events are defined and logged"),
+        _control("AC-2(1)", BASE.replace("schedule", "schedule every quarter"))
+    ]
+    result = deduplicate_controls(controls, mode="exact")
+    print(f"Stats: {result['stats']}")
+    assert result["representatives"] == [0, 2, 3]
+    assert list(result["representative_of"]) == [0, 0, 1, 2]
+    assert result["stats"]["exact_duplicates"] == 1
+    assert result["stats"]["embeddings_saved"] == 1
+
+    print("=" * 60)
+    print("TEST CASE 2: Near duplicates with MinHash")
+    print("=" * 60)
+
+    result = deduplicate_controls(controls, mode="near", threshold=0.8)
+    print(f"Stats: {result['stats']}")
+    assert result["representatives"] == [0, 2]
+    assert result["stats"]["near_duplicates"] == 1
+    assert deduplicate_controls(controls, mode="off")["stats"]["unique_controls"] == 4
+
+    print("=" * 60)
+    print("TEST CASE 3: Duplicates are embedded once and mapped back")
+    print("=" * 60)
+
+    embedded = []
+
+    def fake_embeddings(texts):
+        embedded.extend(texts)
+        return np.eye(len(texts), 8, dtype=np.float32)
+
+    original = batch.get_embeddings
+    batch.get_embeddings = fake_embeddings
+    try:
+        result = batch.batch_harmonize_from_input(controls, fast_mode=True)
+    finally:
+        batch.get_embeddings = original
+    mapped = sorted(c["control_id"] for uc in result["unified_controls"] for c in uc["mapped_controls"])
+    print(f"Embedded {len(embedded)} texts for {len(controls)} controls; mapped {mapped}")
+    assert len(embedded) == 3
+    assert mapped == sorted(c["control_id"] for c in controls)
+    assert result["deduplication"]["embeddings_saved"] == 1
+
+    print("=" * 60)
+    print("TEST CASE 4: Identical cross-framework controls still form a cluster")
+    print("=" * 60)
+
+    from services.config import config
+    pair = [_control("AC-2", BASE), _control("A.9.2.1", BASE, framework="ISO")]
+    directions = {}
+
+    def text_embeddings(texts):
+        # one direction per distinct text, so identical descriptions embed identically
+        vectors = np.zeros((len(texts), 8), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row, directions.setdefault(text, len(directions))] = 1.0
+        return vectors
+
+    original = batch.get_embeddings, config.dedup_mode, config.clustering_mode
+    batch.get_embeddings = text_embeddings
+    try:
+        for dedup_mode in ("off", "exact", "near"):
+            for clustering_mode in ("exact", "sparse"):
+                config.dedup_mode, config.clustering_mode = dedup_mode, clustering_mode
+                unified = batch.batch_harmonize_from_input(pair, fast_mode=True)["unified_controls"]
+                print(f"dedup={dedup_mode} clustering={clustering_mode}: "
+                      f"{[(uc['unified_control_id'], uc['is_clustered']) for uc in unified]}")
+                assert [(uc["unified_control_id"], uc["is_clustered"]) for uc in unified] == [("UC-000", True)]
+                assert len(unified[0]["mapped_controls"]) == 2
+    finally:
+        batch.get_embeddings, config.dedup_mode, config.clustering_mode = original
+
+    print("All dedup tests passed")
+
+if __name__ == "__main__":
+    test_dedup()
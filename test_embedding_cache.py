@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded LRU embedding cache
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from services.cache import LRUCache
+
+def test_lru_cache():
+    """Test entry/byte bounds, LRU eviction order and counters"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Entry-bounded eviction")
+    print("=" * 60)
+
+    cache = LRUCache(max_entries=2)
+    cache.put("a", np.zeros(4, dtype=np.float32))
+    cache.put("b", np.zeros(4, dtype=np.float32))
+    cache.get("a")  # "a" becomes most recently used
+    cache.put("c", np.zeros(4, dtype=np.float32))
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    stats = cache.stats()
+    print(stats)
+    assert stats["evictions"] == 1
+    assert stats["resident_bytes"] == 32
+
+    print("=" * 60)
+    print("TEST CASE 2: Byte-bounded eviction")
+    print("=" * 60)
+
+    cache = LRUCache(max_entries=100, max_bytes=100)
+    for i in range(10):
+        cache.put(i, np.zeros(10, dtype=np.float32))  # 40 bytes each
+    stats = cache.stats()
+    print(stats)
+    assert stats["cache_size"] == 2
+    assert stats["resident_bytes"] <= 100
+    assert stats["evictions"] == 8
+
+    print("=" * 60)
+    print("TEST CASE 3: Hit/miss counters and clear")
+    print("=" * 60)
+
+    cache.get(9)
+    cache.get("missing")
+    cache.clear()
+    stats = cache.stats()
+    print(stats)
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["cache_size"] == 0 and stats["resident_bytes"] == 0
+
+    # 0 entries disables the cache; 0 bytes only lifts the byte limit
+    disabled = LRUCache(max_entries=0)
+    disabled.put("a", np.zeros(10, dtype=np.float32))
+    assert len(disabled) == 0 and disabled.get("a") is None
+    unlimited = LRUCache(max_entries=2, max_bytes=0)
+    unlimited.put("a", np.zeros(1 << 20, dtype=np.float32))
+    assert "a" in unlimited
+
+if __name__ == "__main__":
+    test_lru_cache()
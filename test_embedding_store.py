@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent SQLite embedding store
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+import numpy as np
+import services.embedding as embedding
+from services.config import config
+from services.embedding_store import EmbeddingStore
+
+encoded = []
+
+def _counting_encoder(texts):
+    encoded.extend(texts)
+    return np.array([[len(text), 1.0, 0.0] for text in texts], dtype=np.float32)
+
+def test_embedding_store():
+    """Test round-trips across store instances, model-key isolation and read-through embedding"""
+    path = os.path.join(tempfile.mkdtemp(), "embeddings.sqlite3")
+    vectors = {"a": np.array([0.6, 0.8], dtype=np.float32), "b": np.array([1.0, 0.0], dtype=np.float32)}
+
+    print("=" * 60)
+    print("TEST CASE 1: Round-trip through another store instance")
+    print("=" * 60)
+
+    store = EmbeddingStore(path)
+    store.put_many("model-a", vectors)
+    # a second instance on the same file, as another worker process would open it
+    found = EmbeddingStore(path).get_many("model-a", ["a", "b", "missing"])
+    assert sorted(found) == ["a", "b"]
+    assert all(np.array_equal(found[key], vectors[key]) and found[key].dtype == np.float32 for key in found)
+
+    # existing entries are kept
+    store.put_many("model-a", {"a": np.zeros(2, dtype=np.float32)})
+    assert np.array_equal(store.get_many("model-a", ["a"])["a"], vectors["a"])
+    stats = store.stats("model-a")
+    print(f"Stats: {stats}")
+    assert stats["entries"] == 2 and stats["reads"] == 1 and stats["hits"] == 1
+
+    print("=" * 60)
+    print("TEST CASE 2: Entries are isolated by model key")
+    print("=" * 60)
+
+    assert store.get_many("model-b", ["a", "b"]) == {}
+    store.put_many("model-b", {"a": np.array([0.0, 1.0], dtype=np.float32)})
+    assert np.array_equal(store.get_many("model-b", ["a"])["a"], [0.0, 1.0])
+    store.clear("model-a")
+    assert store.count("model-a") == 0 and store.count("model-b") == 1
+
+    print("=" * 60)
+    print("TEST CASE 3: get_embeddings reads through the store per model key")
+    print("=" * 60)
+
+    original = embedding._embedding_store, embedding.encode_texts, config.embedding_model
+    embedding._embedding_store, embedding.encode_texts = EmbeddingStore(path), _counting_encoder
+    try:
+        first = embedding.get_embeddings(["alpha", "beta", "alpha"])
+        assert encoded == ["alpha", "beta"]
+        second = embedding.get_embeddings(["beta", "alpha"])
+        assert encoded == ["alpha", "beta"] and np.array_equal(second, first[[1, 0]])
+
+        config.embedding_model = "another-model"
+        embedding.get_embeddings(["alpha"])
+        print(f"Encoded: {encoded}")
+        assert encoded == ["alpha", "beta", "alpha"]
+    finally:
+        embedding._embedding_store, embedding.encode_texts, config.embedding_model = original
+
+if __name__ == "__main__":
+    test_embedding_store()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-process encoding
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+import numpy as np
+from services.encoding_pool import get_encoding_pool, parallel_encode, shutdown_encoding_pool
+
+class _StubModel:
+    """Encodes a text as [text length, worker pid, texts in the chunk]"""
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True):
+        return np.array([[len(text), os.getpid(), len(texts)] for text in texts], dtype=np.float32)
+
+def _load_stub_model():
+    # runs in each worker process; records which workers loaded the model
+    with open(os.environ["STUB_MODEL_LOG"], "a") as f:
+        f.write(f"{os.getpid()}\n")
+    return _StubModel()
+
+def test_parallel_encode():
+    """Test that every worker loads the model up front and rows come back in input order"""
+    texts = [f"text {'x' * (i * 7 % 23)} {i}" for i in range(50)]
+    os.environ["STUB_MODEL_LOG"] = os.path.join(tempfile.mkdtemp(), "loads.txt")
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: Every worker has loaded the model when the pool is returned")
+        print("=" * 60)
+
+        get_encoding_pool(3, model_loader=_load_stub_model)
+        with open(os.environ["STUB_MODEL_LOG"]) as f:
+            loads = f.read().split()
+        print(f"Model loaded by workers {loads}")
+        assert len(set(loads)) == 3
+
+        print("=" * 60)
+        print("TEST CASE 2: Input order and chunk sizes")
+        print("=" * 60)
+
+        vectors = parallel_encode(texts, 3, workers=3, chunk_size=8, model_loader=_load_stub_model)
+        assert vectors.shape == (50, 3) and vectors.dtype == np.float32
+        assert vectors[:, 0].tolist() == [float(len(text)) for text in texts]
+        # 50 texts in chunks of 8: six full chunks and one of 2
+        assert sorted(vectors[:, 2].tolist()) == [2.0] * 2 + [8.0] * 48
+        # the two texts in the short chunk are the longest (chunks are length-sorted)
+        assert min(vectors[vectors[:, 2] == 2.0, 0]) >= max(vectors[vectors[:, 2] == 8.0, 0])
+        # the pool was reused, not restarted
+        with open(os.environ["STUB_MODEL_LOG"]) as f:
+            assert len(f.read().split()) == 3
+    finally:
+        shutdown_encoding_pool()
+        os.environ.pop("STUB_MODEL_LOG", None)
+
+if __name__ == "__main__":
+    test_parallel_encode()
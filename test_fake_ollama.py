@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process fake Ollama backend
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import time
+
+import services.summarizer as summarizer
+from fixtures import CONTROLS, fast_fake_ollama
+from services.config import config
+from services.llm_client import LLMClient, LLMError
+
+def test_fake_ollama():
+    """Test schema-valid replies, server parallelism, and simulated faults"""
+    original = summarizer.get_llm_client, summarizer._summary_cache
+    summarizer._summary_cache = None
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: LLM_BACKEND=fake answers single and packed prompts")
+        print("=" * 60)
+
+        client = LLMClient(backend="fake")
+        summarizer.get_llm_client = lambda: client
+        client.fake_server.latency_seconds = 0.0
+        client.fake_server.prompt_tokens_per_second = client.fake_server.tokens_per_second = 1e9
+        summary = summarizer.summarize_controls(CONTROLS)
+        print(f"Summary: {summary}")
+        assert summary["title"] == "Account Management Controls" and len(summary["implementation_steps"]) == 2
+
+        groups = {"UC-000": CONTROLS[:1], "UC-001": CONTROLS[1:]}
+        summaries = client.submit(summarizer.summarize_packed_async(groups)).result()
+        assert [summaries[g]["title"] for g in groups] == ["Account Management Controls", "User registration Controls"]
+        stats = client.stats()
+        print(f"Client stats: {stats}")
+        assert stats["backend"] == "fake" and stats["fake_server"]["requests"] == 2
+        client.close()
+
+        print("=" * 60)
+        print("TEST CASE 2: Requests beyond the server's parallelism queue")
+        print("=" * 60)
+
+        fake = fast_fake_ollama(latency_seconds=0.1, latency_sigma=0.0, parallel=2)
+        client = LLMClient(max_concurrency=8, transport=fake.transport())
+        start_time = time.time()
+        futures = [client.submit(client.generate(f"prompt {i}")) for i in range(4)]
+        bodies = [future.result() for future in futures]
+        elapsed = time.time() - start_time
+        print(f"4 requests in {elapsed:.2f}s")
+        assert 0.18 < elapsed < 0.5
+        assert all(body["done"] and body["eval_count"] > 0 for body in bodies)
+        client.close()
+
+        print("=" * 60)
+        print("TEST CASE 3: Malformed replies and server failures")
+        print("=" * 60)
+
+        fake = fast_fake_ollama(malformed_rate=1.0)
+        client = LLMClient(transport=fake.transport())
+        summarizer.get_llm_client = lambda: client
+        before = summarizer.get_structured_output_stats()["fallbacks"]
+        summarizer.summarize_controls(CONTROLS)
+        print(f"Fake server stats: {fake.stats()}")
+        assert fake.stats()["malformed"] == config.llm_json_retries + 1
+        assert summarizer.get_structured_output_stats()["fallbacks"] == before + 1
+        client.close()
+
+        fake = fast_fake_ollama(failure_rate=1.0)
+        client = LLMClient(transport=fake.transport())
+        try:
+            client.generate_sync("prompt")
+            raise AssertionError("simulated failure did not raise")
+        except LLMError as e:
+            print(f"Failure: {e}")
+        assert fake.stats()["failures"] == 1
+        client.close()
+    finally:
+        summarizer.get_llm_client, summarizer._summary_cache = original
+
+if __name__ == "__main__":
+    test_fake_ollama()
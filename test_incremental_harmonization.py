@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test script for adding controls to a persisted harmonization state
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+import services.batch as batch
+import services.harmonization_state as harmonization_state
+from fixtures import control, topic_embeddings
+from services.config import config
+
+summarized = []
+
+async def _recording_summary(group, org_context=None):
+    summarized.append([c["control_id"] for c in group])
+    return {"title": group[0]["name"], "description": "summary", "implementation_steps": []}
+
+def _mapped(result):
+    return {uc["unified_control_id"]: [c["control_id"] for c in uc["mapped_controls"]]
+            for uc in result["unified_controls"]}
+
+def test_incremental_harmonization():
+    """Test that only touched clusters are re-summarized, with dedup and size bounds applied"""
+    original = (batch.get_embeddings, harmonization_state.get_embeddings, batch.summarize_controls_async,
+                config.state_dir, config.max_cluster_members, config.enable_prompt_packing)
+    batch.get_embeddings = harmonization_state.get_embeddings = topic_embeddings
+    batch.summarize_controls_async = _recording_summary
+    config.enable_prompt_packing = False
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            config.state_dir = state_dir
+            result = batch.batch_harmonize_from_input([control(i, t) for i, t in enumerate([0, 0, 1, 1, 2])],
+                                                      persist_state=True)
+            state_id = result["state_id"]
+            assert _mapped(result) == {"UC-000": ["T-0", "T-1"], "UC-001": ["T-2", "T-3"], "UC-999": ["T-4"]}
+
+            print("=" * 60)
+            print("TEST CASE 1: A control and its duplicate join one cluster")
+            print("=" * 60)
+
+            summarized.clear()
+            duplicate = "topic 0 control 5"
+            result = harmonization_state.incremental_harmonize(state_id, [control(5, 0), control(6, 0, duplicate)])
+            print(f"Changed {result['changed_unified_control_ids']}, summarized {summarized}")
+            assert result["changed_unified_control_ids"] == ["UC-000"]
+            assert _mapped(result)["UC-000"] == ["T-0", "T-1", "T-5", "T-6"]
+            assert summarized == [["T-0", "T-1", "T-5"]]
+
+            print("=" * 60)
+            print("TEST CASE 2: A cluster grown past MAX_CLUSTER_MEMBERS is split")
+            print("=" * 60)
+
+            summarized.clear()
+            config.max_cluster_members = 3
+            result = harmonization_state.incremental_harmonize(state_id, [control(7, 1), control(8, 1)])
+            mapped = _mapped(result)
+            print(f"Changed {result['changed_unified_control_ids']}, mapped {mapped}")
+            assert result["changed_unified_control_ids"] == ["UC-001", "UC-002"]
+            assert sorted(mapped["UC-001"] + mapped["UC-002"]) == ["T-2", "T-3", "T-7", "T-8"]
+            assert mapped["UC-000"] == ["T-0", "T-1", "T-5", "T-6"]  # untouched: 3 distinct descriptions
+            assert sorted(len(group) for group in summarized) == [2, 2]
+
+            print("=" * 60)
+            print("TEST CASE 3: A new control clusters with a previous outlier")
+            print("=" * 60)
+
+            summarized.clear()
+            result = harmonization_state.incremental_harmonize(state_id, [control(9, 2)])
+            mapped = _mapped(result)
+            print(f"Changed {result['changed_unified_control_ids']}, mapped {mapped}")
+            assert result["changed_unified_control_ids"] == ["UC-003"]
+            assert mapped["UC-003"] == ["T-4", "T-9"] and "UC-999" not in mapped
+            assert summarized == [["T-4", "T-9"]]
+    finally:
+        (batch.get_embeddings, harmonization_state.get_embeddings, batch.summarize_controls_async,
+         config.state_dir, config.max_cluster_members, config.enable_prompt_packing) = original
+
+embedded = []
+
+def _recording_embeddings(texts):
+    embedded.extend(texts)
+    return topic_embeddings(texts)
+
+def _overlaps(result):
+    return [(o["existing"], o["control_id"]) for o in result["organization_analysis"]["overlaps"]]
+
+def test_incremental_org_analysis():
+    """Test that the stored organization analysis is extended with the new controls only"""
+    original = (batch.get_embeddings, harmonization_state.get_embeddings, config.state_dir, config.org_overlap_top_k)
+    # the analysis embeds through batch.get_embeddings; incremental assignment through its own
+    batch.get_embeddings, harmonization_state.get_embeddings = _recording_embeddings, topic_embeddings
+    config.org_overlap_top_k = 2
+    org_context = {"industry": "finance", "existing_controls": ["topic 0 existing", "topic 3 existing"]}
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            config.state_dir = state_dir
+            result = batch.batch_harmonize_from_input([control(i, t) for i, t in enumerate([0, 0, 1, 1, 2])],
+                                                      fast_mode=True, org_context=org_context, persist_state=True)
+            assert _overlaps(result) == [("topic 0 existing", "T-0"), ("topic 0 existing", "T-1")]
+
+            print("=" * 60)
+            print("TEST CASE 4: Only the new controls are compared with the existing ones")
+            print("=" * 60)
+
+            embedded.clear()
+            result = harmonization_state.incremental_harmonize(result["state_id"], [control(5, 3), control(6, 0)],
+                                                               fast_mode=True)
+            print(f"Embedded {embedded}, overlaps {_overlaps(result)}")
+            # the state's controls are not looked up again
+            assert embedded == org_context["existing_controls"]
+            # topic 0 keeps its two best (ties keep the earlier ones); topic 3 gains T-5
+            assert sorted(_overlaps(result)) == [("topic 0 existing", "T-0"), ("topic 0 existing", "T-1"),
+                                                 ("topic 3 existing", "T-5")]
+            assert result["organization_analysis"]["recommendations"] != []
+
+            print("=" * 60)
+            print("TEST CASE 5: A different context is analyzed over the whole state")
+            print("=" * 60)
+
+            result = harmonization_state.incremental_harmonize(
+                result["state_id"], [control(7, 4)], fast_mode=True,
+                org_context={"existing_controls": ["topic 1 existing"]})
+            print(f"Overlaps {_overlaps(result)}")
+            assert sorted(_overlaps(result)) == [("topic 1 existing", "T-2"), ("topic 1 existing", "T-3")]
+    finally:
+        (batch.get_embeddings, harmonization_state.get_embeddings, config.state_dir,
+         config.org_overlap_top_k) = original
+
+if __name__ == "__main__":
+    test_incremental_harmonization()
+    test_incremental_org_analysis()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for background batch harmonization jobs
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import socket
+import tempfile
+import time
+
+import services.batch as batch
+from fixtures import slow_summary, topic_controls, topic_embeddings
+from services.jobs import JobManager, JobStore, COMPLETED, CANCELLED, QUEUED, RUNNING
+
+def _wait(manager, job_id, statuses, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = manager.status(job_id)
+        if status["status"] in statuses:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not reach {statuses}")
+
+def test_jobs():
+    """Test job completion, progress, cancellation and recovery after a restart"""
+    original = batch.get_embeddings, batch.summarize_controls_async
+    batch.get_embeddings, batch.summarize_controls_async = topic_embeddings, slow_summary(0.2)
+    try:
+        _run_job_cases()
+    finally:
+        batch.get_embeddings, batch.summarize_controls_async = original
+
+def _run_job_cases():
+    store_path = os.path.join(tempfile.mkdtemp(), "jobs.sqlite3")
+
+    print("=" * 60)
+    print("TEST CASE 1: Completed job with progress and result")
+    print("=" * 60)
+
+    manager = JobManager(JobStore(store_path), max_workers=1)
+    job = manager.submit(topic_controls(), fast_mode=False)
+    status = _wait(manager, job["job_id"], (COMPLETED,))
+    print(f"Progress: {status['progress']}")
+    assert status["progress"]["clusters_done"] == status["progress"]["clusters_total"] == 6
+    assert "clustering" in status["progress"]["stage_timings"]
+    result = manager.result(job["job_id"])
+    # same shape as a /batch-harmonize response
+    assert result["total_clusters"] == 6 and result["org_context"] is None
+    assert result["performance"]["controls_processed"] == 12 and not result["performance"]["fast_mode"]
+    completed_job_id = job["job_id"]
+
+    print("=" * 60)
+    print("TEST CASE 2: Cancelling a running job")
+    print("=" * 60)
+
+    job = manager.submit(topic_controls(n_topics=12), fast_mode=False)
+    _wait(manager, job["job_id"], ("running",))
+    manager.cancel(job["job_id"])
+    status = _wait(manager, job["job_id"], (CANCELLED,))
+    print(f"Cancelled after {status['progress']['clusters_done']} of {status['progress']['clusters_total']} clusters")
+    assert status["progress"]["clusters_done"] < 12
+    try:
+        manager.result(job["job_id"])
+        assert False, "result of a cancelled job should not be available"
+    except ValueError:
+        pass
+    manager.shutdown()
+
+    print("=" * 60)
+    print("TEST CASE 3: Jobs of a dead process are re-queued by a new one")
+    print("=" * 60)
+
+    store = JobStore(store_path)
+    store.create("orphan", f"{socket.gethostname()}:999999999", {
+        "controls": topic_controls(n_topics=2), "fast_mode": True, "org_context": None, "persist_state": False
+    }, {"stage": QUEUED})
+    # a predecessor with this process's host and pid (a restarted container), left running
+    store.create("predecessor", f"{socket.gethostname()}:{os.getpid()}:0123456789ab", {
+        "controls": topic_controls(n_topics=3), "fast_mode": True, "org_context": None, "persist_state": False
+    }, {"stage": RUNNING})
+    store.update("predecessor", status=RUNNING)
+    restarted = JobManager(store, max_workers=1)
+    assert restarted.recover() == ["orphan", "predecessor"]
+    assert _wait(restarted, "orphan", (COMPLETED,))["progress"]["clusters_done"] == 2
+    assert _wait(restarted, "predecessor", (COMPLETED,))["progress"]["clusters_done"] == 3
+    # this process's own running jobs are not taken over
+    store.create("own", restarted.owner, {"controls": []}, {"stage": RUNNING})
+    store.update("own", status=RUNNING)
+    assert restarted.recover() == []
+    # results of the previous process are still available
+    assert restarted.result(completed_job_id)["total_clusters"] == 6
+    restarted.shutdown()
+
+    print("All job tests passed")
+
+if __name__ == "__main__":
+    test_jobs()
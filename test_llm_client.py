@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled asynchronous LLM client
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import json
+import time
+
+import httpx
+from services.llm_client import LLMClient, LLMError
+
+async def _slow_ollama(request):
+    payload = json.loads(request.content)
+    if payload["prompt"] == "fail":
+        return httpx.Response(500, json={"error": "model not found"})
+    await asyncio.sleep(2.0 if payload["prompt"] == "hang" else 0.2)
+    return httpx.Response(200, json={"model": payload["model"], "response": payload["prompt"].upper()})
+
+def test_llm_client():
+    """Test bounded concurrency from one thread, timeouts and error reporting"""
+    client = LLMClient(host="http://ollama.test", max_concurrency=4, timeout=0.5,
+                       transport=httpx.MockTransport(_slow_ollama))
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: Eight generations from one thread, four at a time")
+        print("=" * 60)
+
+        start_time = time.time()
+        futures = [client.submit(client.generate(f"prompt {i}", model="test")) for i in range(8)]
+        responses = [future.result()["response"] for future in futures]
+        elapsed = time.time() - start_time
+        stats = client.stats()
+        print(f"{len(responses)} responses in {elapsed:.2f}s, stats: {stats}")
+        assert responses == [f"PROMPT {i}" for i in range(8)]
+        # two waves of 0.2s, not eight sequential calls
+        assert 0.35 < elapsed < 1.0
+        assert stats["peak_in_flight"] == 4 and stats["in_flight"] == 0
+
+        print("=" * 60)
+        print("TEST CASE 2: Timeouts and server errors raise LLMError")
+        print("=" * 60)
+
+        for prompt in ("hang", "fail"):
+            try:
+                client.generate_sync(prompt)
+                raise AssertionError(f"{prompt} did not raise")
+            except LLMError as e:
+                print(f"{prompt}: {e}")
+        stats = client.stats()
+        assert stats["timeouts"] == 1 and stats["failures"] == 2 and stats["requests"] == 10
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    test_llm_client()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for catalog matching with duplicate descriptions
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import copy
+
+import numpy as np
+import services.embedding as embedding
+import services.matcher as matcher
+from services.catalog_index import CatalogIndex
+
+CATALOG = [
+    {"framework": "NIST", "control_id": "AC-2", "name": "Account Management", "description": "Manage accounts"},
+    {"framework": "ISO", "control_id": "A.9.2.1", "name": "User registration", "description": "Register users"},
+    {"framework": "SOC 2", "control_id": "CC6.2", "name": "Account Management", "description": "Manage accounts"}
+]
+VECTORS = {"Manage accounts": [1.0, 0.0], "Register users": [0.6, 0.8]}
+
+def _fake_embeddings(texts, use_cache=True):
+    return np.array([VECTORS[text] for text in texts], dtype=np.float32)
+
+def _fake_embedding(text, use_cache=True):
+    return _fake_embeddings([text])[0]
+
+def test_duplicate_descriptions():
+    """Test that entries sharing a description are all returned and the catalog is not mutated"""
+    index = CatalogIndex(copy.deepcopy(CATALOG), _fake_embeddings([c["description"] for c in CATALOG]),
+                         "0" * 64, "test-model")
+    original = embedding.get_embedding, embedding.get_embeddings, matcher.get_catalog_index
+    embedding.get_embedding, embedding.get_embeddings = _fake_embedding, _fake_embeddings
+    matcher.get_catalog_index = lambda: index
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: search_similar and find_most_similar keep both duplicates")
+        print("=" * 60)
+
+        matches = embedding.search_similar("Manage accounts", index.embeddings, top_n=2)
+        print(f"search_similar: {matches}")
+        assert sorted(i for i, _ in matches) == [0, 2]
+        assert all(abs(score - 1.0) < 1e-6 for _, score in matches)
+
+        texts = embedding.find_most_similar("Manage accounts", index.descriptions, top_n=3)
+        print(f"find_most_similar: {texts}")
+        assert [text for text, _ in texts] == ["Manage accounts", "Manage accounts", "Register users"]
+
+        print("=" * 60)
+        print("TEST CASE 2: match_control returns both ids and leaves the catalog unchanged")
+        print("=" * 60)
+
+        for exact in (False, True):
+            results = matcher.match_control("Manage accounts", top_n=2, exact=exact)
+            print(f"match_control(exact={exact}): {results}")
+            assert sorted(r["control_id"] for r in results) == ["AC-2", "CC6.2"]
+            assert all(r["match_score"] == 1.0 for r in results)
+            assert index.controls == CATALOG
+    finally:
+        embedding.get_embedding, embedding.get_embeddings, matcher.get_catalog_index = original
+
+if __name__ == "__main__":
+    test_duplicate_descriptions()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared embedding model registry
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import services.model_registry as model_registry
+from services.config import config
+
+class _StubModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.zeros((len(texts), 3), dtype=np.float32)
+
+loads = []
+loads_lock = threading.Lock()
+
+def _load_stub(model_name):
+    with loads_lock:
+        loads.append(model_name)
+    # slow enough for concurrent callers to race on the first load
+    time.sleep(0.05)
+    return _StubModel(model_name)
+
+def test_model_registry():
+    """Test the persisted-embedding model key, one shared load per model and the registry stats"""
+
+    print("=" * 60)
+    print("TEST CASE 1: The model key distinguishes backend variants")
+    print("=" * 60)
+
+    original_config = config.embedding_model, config.embedding_backend, config.onnx_quantize
+    try:
+        config.embedding_model = "all-MiniLM-L6-v2"
+        keys = []
+        for backend, quantize in (("torch", False), ("torch", True), ("onnx", False), ("onnx", True)):
+            config.embedding_backend, config.onnx_quantize = backend, quantize
+            keys.append(config.embedding_model_key)
+        print(f"Keys: {keys}")
+        # torch keeps the bare model name so existing stores stay valid
+        assert keys == ["all-MiniLM-L6-v2", "all-MiniLM-L6-v2",
+                        "all-MiniLM-L6-v2+onnx", "all-MiniLM-L6-v2+onnx-int8"]
+    finally:
+        config.embedding_model, config.embedding_backend, config.onnx_quantize = original_config
+
+    print("=" * 60)
+    print("TEST CASE 2: Concurrent callers share one load")
+    print("=" * 60)
+
+    original_registry = model_registry._load, dict(model_registry._models), dict(model_registry._load_info)
+    model_registry._load = _load_stub
+    model_registry._models.clear()
+    model_registry._load_info.clear()
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            models = list(pool.map(lambda _: model_registry.get_model("stub-a"), range(8)))
+        print(f"Loads: {loads}")
+        assert loads == ["stub-a"] and all(model is models[0] for model in models)
+        assert model_registry.get_model("stub-b") is not models[0] and loads == ["stub-a", "stub-b"]
+
+        print("=" * 60)
+        print("TEST CASE 3: Registry stats report each loaded model")
+        print("=" * 60)
+
+        model_registry.warm_up(["stub-a"])
+        assert models[0].encoded == ["warm-up"]
+        stats = model_registry.get_registry_stats()
+        print(f"Stats: {stats}")
+        assert stats["loaded_models"] == ["stub-a", "stub-b"]
+        assert stats["models"]["stub-a"]["backend"] == config.embedding_backend
+        assert stats["models"]["stub-a"]["load_time_seconds"] >= 0.05
+        assert "warm_up_seconds" in stats["models"]["stub-a"] and "warm_up_seconds" not in stats["models"]["stub-b"]
+        assert stats["process_rss_bytes"] > 0
+    finally:
+        model_registry._load = original_registry[0]
+        model_registry._models.clear()
+        model_registry._models.update(original_registry[1])
+        model_registry._load_info.clear()
+        model_registry._load_info.update(original_registry[2])
+
+if __name__ == "__main__":
+    test_model_registry()
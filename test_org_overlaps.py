@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for overlap detection against an organization's existing controls
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import services.batch as batch
+from services.config import config
+
+TOPICS = {"password": 0, "backup": 1, "audit": 2, "encryption": 3}
+
+def _fake_embeddings(texts):
+    # texts about the same topic word share a direction; the rest of the text adds a small offset
+    vectors = np.zeros((len(texts), 8), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word, axis in TOPICS.items():
+            if word in text.lower():
+                vectors[row, axis] = 1.0
+        vectors[row, 4 + len(text) % 4] = 0.3
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _control(control_id, description):
+    return {"framework": "TEST", "control_id": control_id, "name": control_id, "description": description}
+
+def test_org_overlaps():
+    """Test ranked embedding overlaps and that short words no longer match everything"""
+    original = batch.get_embeddings, config.org_overlap_top_k
+    batch.get_embeddings = _fake_embeddings
+    config.org_overlap_top_k = 2
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: Ranked overlaps with scores")
+        print("=" * 60)
+
+        controls = [
+            _control("C-1", "Enforce password complexity"),
+            _control("C-2", "Password rotation every 90 days"),
+            _control("C-3", "Run nightly backup jobs"),
+            _control("C-4", "Encryption at rest"),
+            _control("C-5", "Password reuse is prevented")
+        ]
+        org_context = {"industry": "finance", "existing_controls": ["We enforce a password policy", "a"]}
+        analysis = batch._analyze_org_context(controls, org_context)
+        for overlap in analysis["overlaps"]:
+            print(overlap)
+        # top 2 per existing control, all about passwords, best first
+        assert len(analysis["overlaps"]) == 2
+        assert all(o["control_id"] in ("C-1", "C-2", "C-5") for o in analysis["overlaps"])
+        scores = [o["score"] for o in analysis["overlaps"]]
+        assert scores == sorted(scores, reverse=True) and scores[-1] >= config.org_overlap_threshold
+        # the single-letter existing control "a" matches nothing
+        assert all(o["existing"] != "a" for o in analysis["overlaps"])
+
+        print("=" * 60)
+        print("TEST CASE 2: Batch embeddings are reused")
+        print("=" * 60)
+
+        embeddings = _fake_embeddings([c["description"] for c in controls])
+        reused = batch._analyze_org_context(controls, org_context, embeddings)
+        assert reused["overlaps"] == analysis["overlaps"]
+    finally:
+        batch.get_embeddings, config.org_overlap_top_k = original
+
+if __name__ == "__main__":
+    test_org_overlaps()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for packing several cluster summaries into one LLM prompt
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import services.batch as batch
+import services.summarizer as summarizer
+from fixtures import fast_fake_ollama, topic_controls, topic_embeddings
+from services.config import config
+from services.llm_client import LLMClient
+
+def _calls(fake):
+    """(packed, single) requests served so far"""
+    stats = fake.stats()
+    return stats["packed_requests"], stats["requests"] - stats["packed_requests"]
+
+def test_prompt_packing():
+    """Test pack planning, dropped-group fallback and packed batch harmonization"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Packs respect the token budget and group limit")
+    print("=" * 60)
+
+    small = [topic_controls(1)] * 5
+    large = [topic_controls(1) * 40]
+    packs = summarizer.plan_packs(small + large + small, max_tokens=2000, max_groups=4)
+    print(f"Packs: {packs}")
+    assert packs == [[0, 1, 2, 3], [5], [4, 6, 7, 8], [9, 10]]
+    assert summarizer.plan_packs(small, max_tokens=600, max_groups=8) == [[0], [1], [2], [3], [4]]
+
+    original = (summarizer.get_llm_client, batch.get_llm_client, summarizer._summary_cache,
+                batch.get_embeddings, config.enable_prompt_packing)
+    fake = fast_fake_ollama(drop_groups={"UC-002"})
+    client = LLMClient(transport=fake.transport())
+    summarizer.get_llm_client = batch.get_llm_client = lambda: client
+    summarizer._summary_cache = None
+    batch.get_embeddings = topic_embeddings
+    try:
+        print("=" * 60)
+        print("TEST CASE 2: Dropped groups are summarized alone")
+        print("=" * 60)
+
+        groups = {f"UC-00{t}": topic_controls(3)[2 * t:2 * t + 2] for t in range(3)}
+        summaries = client.submit(summarizer.summarize_packed_async(groups)).result()
+        print({group_id: summary["title"] for group_id, summary in summaries.items()})
+        assert [summaries[f"UC-00{t}"]["title"] for t in range(3)] == [f"Topic {t} Controls" for t in range(3)]
+        assert _calls(fake) == (1, 1)
+        assert summarizer.get_packing_stats()["packed_groups_dropped"] >= 1
+
+        print("=" * 60)
+        print("TEST CASE 3: Batch harmonization with packing enabled")
+        print("=" * 60)
+
+        fake.drop_groups = set()
+        config.enable_prompt_packing = True
+        result = batch.batch_harmonize_from_input(topic_controls())
+        titles = [uc["title"] for uc in result["unified_controls"]]
+        print(f"Titles: {titles}; (packed, single) calls {_calls(fake)}")
+        assert titles == [f"Topic {t} Controls" for t in range(6)]
+        assert _calls(fake) == (2, 1)
+    finally:
+        (summarizer.get_llm_client, batch.get_llm_client, summarizer._summary_cache,
+         batch.get_embeddings, config.enable_prompt_packing) = original
+        client.close()
+
+if __name__ == "__main__":
+    test_prompt_packing()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for compact (float16 / int8) embedding storage
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+import numpy as np
+import services.batch as batch
+from services.config import config
+from services.quantization import QuantizedEmbeddings, quantize, as_float32, quantization_report
+from services.vector_index import ExactIndex
+
+def _normalized(n, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_quantization():
+    """Test memory footprint, score drift and search over quantized matrices"""
+
+    embeddings = _normalized(500)
+    queries = _normalized(20, seed=1)
+
+    for dtype in ("float16", "int8"):
+        print("=" * 60)
+        print(f"TEST CASE: {dtype} storage")
+        print("=" * 60)
+
+        quantized = quantize(embeddings, dtype)
+        report = quantization_report(embeddings, queries, dtype)
+        print(report)
+
+        assert quantized.nbytes < embeddings.nbytes
+        assert report["score_drift_max"] < 0.01
+        assert np.allclose(as_float32(quantized), embeddings, atol=0.01)
+
+        # Search backends consume the quantized matrix directly
+        expected, _ = ExactIndex(embeddings).search(queries[0], 5)
+        found, _ = ExactIndex(quantized).search(queries[0], 5)
+        assert len(np.intersect1d(expected, found)) >= 4
+
+    # Single vectors (as stored in the embedding cache) round-trip too
+    single = quantize(embeddings[0], "int8")
+    assert as_float32(single).shape == embeddings[0].shape
+
+def test_quantized_batch():
+    """Test that batch harmonization clusters the same way with int8 storage"""
+    controls = [
+        {"framework": "TEST", "control_id": f"T-{i}", "name": f"Control {i}", "description": f"control {i}"}
+        for i in range(40)
+    ]
+    vectors = _normalized(8, seed=2)[np.arange(40) % 8] + 0.05 * _normalized(40, seed=3)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    by_text = {c["description"]: vector for c, vector in zip(controls, vectors)}
+    clustered = []
+
+    def fake_embeddings(texts):
+        return np.array([by_text[text] for text in texts], dtype=np.float32)
+
+    def recording_clustering(embeddings, **kwargs):
+        clustered.append(embeddings)
+        return original[1](embeddings, **kwargs)
+
+    original = batch.get_embeddings, batch.cluster_embeddings, config.embedding_storage_dtype, config.state_dir
+    batch.get_embeddings, batch.cluster_embeddings = fake_embeddings, recording_clustering
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            config.state_dir = state_dir
+            mapped = {}
+            for dtype in ("float32", "int8"):
+                print("=" * 60)
+                print(f"TEST CASE: batch harmonization with {dtype} storage")
+                print("=" * 60)
+
+                config.embedding_storage_dtype = dtype
+                result = batch.batch_harmonize_from_input(controls, fast_mode=True, persist_state=True,
+                                                          org_context={"existing_controls": ["control 3"]})
+                mapped[dtype] = [[c["control_id"] for c in uc["mapped_controls"]] for uc in result["unified_controls"]]
+                print(f"{len(mapped[dtype])} unified controls, state {result['state_id']}")
+                assert result["organization_analysis"]["overlaps"][0]["control_id"] == "T-3"
+                assert result["state_id"] is not None
+
+            assert isinstance(clustered[1], QuantizedEmbeddings) and clustered[1].dtype == "int8"
+            assert mapped["int8"] == mapped["float32"] and len(mapped["int8"]) == 8
+    finally:
+        batch.get_embeddings, batch.cluster_embeddings, config.embedding_storage_dtype, config.state_dir = original
+
+if __name__ == "__main__":
+    test_quantization()
+    test_quantized_batch()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script for schema-constrained summaries with bounded repair and retry
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+
+import services.summarizer as summarizer
+from fixtures import CONTROLS, fast_fake_ollama
+from services.config import config
+from services.llm_client import LLMClient
+
+VALID = {"title": "Account Lifecycle", "description": "Manage accounts.",
+         "implementation_steps": [{"step": "Inventory", "description": "List all accounts"}]}
+
+def _summarize(replies):
+    fake = fast_fake_ollama(scripted_replies=replies, record_payloads=True)
+    client = LLMClient(transport=fake.transport())
+    summarizer.get_llm_client = lambda: client
+    try:
+        return summarizer.summarize_controls(CONTROLS), fake
+    finally:
+        client.close()
+
+def test_structured_output():
+    """Test the schema request, repair of invalid replies, retries and the fallback"""
+    original = summarizer.get_llm_client, summarizer._summary_cache, config.llm_json_retries
+    summarizer._summary_cache = None
+    config.llm_json_retries = 1
+    try:
+        print("=" * 60)
+        print("TEST CASE 1: The schema is sent and a valid reply is used as is")
+        print("=" * 60)
+
+        before = summarizer.get_structured_output_stats()
+        summary, fake = _summarize([json.dumps(VALID)])
+        assert summary == VALID
+        assert fake.payloads[0]["format"] == summarizer.SUMMARY_SCHEMA
+
+        print("=" * 60)
+        print("TEST CASE 2: Wrapped JSON is recovered; invalid JSON is re-prompted once")
+        print("=" * 60)
+
+        summary, fake = _summarize(["Sure! ```json\n" + json.dumps(VALID) + "\n```"])
+        assert summary == VALID and len(fake.payloads) == 1
+
+        summary, fake = _summarize([json.dumps({"title": "", "description": "x", "implementation_steps": []}),
+                                    json.dumps(VALID)])
+        assert summary == VALID and len(fake.payloads) == 2
+        assert "'title' is missing or empty" in fake.payloads[1]["prompt"]
+        assert fake.payloads[1]["options"]["temperature"] == 0.0
+
+        print("=" * 60)
+        print("TEST CASE 3: Heuristic fallback once the retries are used up")
+        print("=" * 60)
+
+        summary, fake = _summarize(["not json", "still not json"])
+        assert len(fake.payloads) == 2 and summary["title"] != VALID["title"]
+
+        after = summarizer.get_structured_output_stats()
+        counts = {name: after[name] - before[name]
+                  for name in ("replies", "parsed", "repaired", "invalid_replies", "retries", "fallbacks")}
+        print(f"Counters: {counts}")
+        assert counts == {"replies": 6, "parsed": 2, "repaired": 1, "invalid_replies": 3, "retries": 2,
+                          "fallbacks": 1}
+    finally:
+        summarizer.get_llm_client, summarizer._summary_cache, config.llm_json_retries = original
+
+if __name__ == "__main__":
+    test_structured_output()
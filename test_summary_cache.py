@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent summary cache
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+import services.summarizer as summarizer
+from fixtures import CONTROLS, fast_fake_ollama
+from services.llm_client import LLMClient
+from services.summary_cache import SummaryCache, summary_key
+
+def test_summary_cache():
+    """Test key stability, hits across cache instances, and invalidation"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Content-addressed keys")
+    print("=" * 60)
+
+    key = summary_key(CONTROLS, {"industry": "finance", "risk_profile": "high"}, "llama2", "1")
+    assert key == summary_key(CONTROLS[::-1], {"risk_profile": "high", "industry": "finance"}, "llama2", "1")
+    assert key != summary_key(CONTROLS, {"industry": "healthcare", "risk_profile": "high"}, "llama2", "1")
+    assert key != summary_key(CONTROLS, {"industry": "finance", "risk_profile": "high"}, "llama2", "2")
+    assert key != summary_key(CONTROLS[:1], {"industry": "finance", "risk_profile": "high"}, "llama2", "1")
+
+    print("=" * 60)
+    print("TEST CASE 2: summarize_controls calls the LLM once per distinct request")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "summaries.sqlite3")
+    original = summarizer.get_llm_client, summarizer._summary_cache
+    fake = fast_fake_ollama()
+    client = LLMClient(transport=fake.transport())
+    summarizer.get_llm_client = lambda: client
+    summarizer._summary_cache = SummaryCache(path)
+    try:
+        first = summarizer.summarize_controls(CONTROLS, {"industry": "finance"})
+        # a new cache instance (another worker process) on the same file
+        summarizer._summary_cache = SummaryCache(path)
+        second = summarizer.summarize_controls(CONTROLS[::-1], {"industry": "finance"})
+        stats = summarizer.get_summary_cache_stats()
+        print(f"LLM calls: {fake.stats()['requests']}, stats: {stats}")
+        assert first == second and fake.stats()["requests"] == 1
+        assert stats["hits"] == 1 and stats["entries"] == 1
+
+        summarizer.summarize_controls(CONTROLS, {"industry": "healthcare"})
+        assert fake.stats()["requests"] == 2
+
+        print("=" * 60)
+        print("TEST CASE 3: Explicit invalidation")
+        print("=" * 60)
+
+        assert summarizer.clear_summary_cache() == 2
+        summarizer.summarize_controls(CONTROLS, {"industry": "finance"})
+        assert fake.stats()["requests"] == 3
+    finally:
+        summarizer.get_llm_client, summarizer._summary_cache = original
+        client.close()
+
+if __name__ == "__main__":
+    test_summary_cache()
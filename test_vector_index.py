@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script for partial top-k selection and the nearest-neighbour backends
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from services.vector_index import ExactIndex, IVFIndex, evaluate_search, top_k
+
+def _normalized(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_top_k():
+    """Test top_k against a full argsort, including ties and k beyond the size"""
+
+    print("=" * 60)
+    print("TEST CASE 1: Same result as a full sort")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    for n, k in ((1000, 1), (1000, 10), (1000, 999), (50, 50), (50, 80)):
+        scores = rng.standard_normal(n).astype(np.float32)
+        indices, top_scores = top_k(scores, k)
+        expected = np.argsort(-scores, kind="stable")[:k]
+        assert np.array_equal(indices, expected), (n, k)
+        assert np.array_equal(top_scores, scores[expected])
+
+    # Ties keep all tied items and an order consistent with the scores
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1], dtype=np.float32)
+    indices, top_scores = top_k(scores, 3)
+    print(f"Ties: {indices.tolist()} {top_scores.tolist()}")
+    assert sorted(indices[:2].tolist()) == [1, 3] and indices[2] in (0, 2)
+    assert top_scores.tolist() == sorted(top_scores.tolist(), reverse=True)
+
+    indices, top_scores = top_k(scores, 0)
+    assert len(indices) == 0 and len(top_scores) == 0
+
+    print("=" * 60)
+    print("TEST CASE 2: Exact and IVF search")
+    print("=" * 60)
+
+    embeddings = _normalized(2000)
+    queries = _normalized(20, seed=1)
+    found, scores = ExactIndex(embeddings).search(queries[0], 5)
+    assert np.array_equal(found, np.argsort(-(embeddings @ queries[0]), kind="stable")[:5])
+
+    report = evaluate_search(IVFIndex(embeddings, n_lists=16, n_probe=16), embeddings, queries, k=10)
+    print(report)
+    # Probing every list is exhaustive
+    assert report["recall_at_10"] == 1.0
+
+if __name__ == "__main__":
+    test_top_k()